@@ -0,0 +1,104 @@
+"""
+Executor throughput benchmark: runs Executor._run_remote against the local stand-in server and
+measures tasks per second, scheduling latency and scheduler RPCs per task
+
+    python -m benchmarks.executor --jobs 20 --tasks-per-job 3 -p 1 -p 4 -k 2 -k 8 --record
+
+With --no-events the stand-in has no event stream and the executor only polls, compare dispatch latency
+of both with a realistic polling interval, eg, -i 2 --chained
+"""
+import os
+import shutil
+import logging
+import tempfile
+import itertools
+from time import perf_counter
+import click
+from jtracker.execution import Executor
+from .harness import record, compare
+from .stand_in import StandInServer, ACCOUNT_ID, WORKFLOW_ID, WORKFLOW_VERSION
+
+
+def install_workflow(jt_home):
+    # pretend the workflow package is installed, the executor would otherwise download it from github
+    workflow_dir = os.path.join(jt_home, 'account.%s' % ACCOUNT_ID, 'node',
+                                'workflow.%s' % WORKFLOW_ID, WORKFLOW_VERSION)
+    os.makedirs(os.path.join(workflow_dir, 'workflow', 'tools'))
+    open(os.path.join(workflow_dir, 'workflow.installed'), 'a').close()
+
+
+def quantile(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))] if values else None
+
+
+def run_case(jobs, tasks_per_job, command, parallel_jobs, parallel_workers, polling_interval,
+             latency=0.0, failure_rate=0.0, chained=False, events=True):
+    jt_home = tempfile.mkdtemp(prefix='jt-bench-')
+    logger = logging.getLogger('jtracker.benchmark')
+    cwd = os.getcwd()
+    try:
+        install_workflow(jt_home)
+        with StandInServer(latency=latency, failure_rate=failure_rate, events=events) as server:
+            tasks = {}
+            for t in range(tasks_per_job):
+                tasks['task_%s' % t] = {'command': command,
+                                        'depends_on': ['task_%s' % (t - 1)] if chained and t else []}
+            server.add_queue('bench-queue', tasks=tasks)
+            server.add_jobs('bench-queue', jobs)
+
+            executor = Executor(jt_home=jt_home, jt_account='user1',
+                                ams_server=server.url, wrs_server=server.url, jess_server=server.url,
+                                queue_id='bench-queue', parallel_jobs=parallel_jobs,
+                                parallel_workers=parallel_workers, polling_interval=polling_interval,
+                                continuous_run=False, retries=0, logger=logger)
+            server.rpc_count.clear()
+
+            start = perf_counter()
+            executor.run()
+            elapsed = perf_counter() - start
+
+            done = sum(1 for j in server.jobs.values() for t in j['tasks'].values()
+                       if t['state'] in ('completed', 'failed'))
+            return {
+                'seconds': round(elapsed, 3),
+                'tasks_per_second': round(done / elapsed, 3),
+                'completed_tasks': done,
+                'rpc_per_task': round(sum(server.rpc_count.values()) / float(done or 1), 2),
+                'dispatch_latency_p50': round(quantile(server.dispatch_latency, 0.5) or 0, 4),
+                'dispatch_latency_p95': round(quantile(server.dispatch_latency, 0.95) or 0, 4),
+            }
+    finally:
+        os.chdir(cwd)  # workers chdir into task dirs
+        shutil.rmtree(jt_home, ignore_errors=True)
+
+
+@click.command()
+@click.option('-n', '--jobs', type=int, default=20, help='Number of jobs in the queue')
+@click.option('-t', '--tasks-per-job', type=int, default=3, help='Number of tasks per job')
+@click.option('--chained', is_flag=True, help='Each task depends on the previous one')
+@click.option('-c', '--command', default='true', help='Task command')
+@click.option('-p', '--parallel-jobs', type=int, multiple=True, help='Parallel jobs settings to run')
+@click.option('-k', '--parallel-workers', type=int, multiple=True, help='Parallel workers settings to run')
+@click.option('-i', '--polling-interval', type=float, default=0.05, help='Executor polling interval in seconds')
+@click.option('-l', '--latency', type=float, default=0.0, help='Server latency in seconds per request')
+@click.option('-f', '--failure-rate', type=float, default=0.0, help='Fraction of requests failing with 503')
+@click.option('--events/--no-events', default=True, help='Whether the server pushes events to the executor')
+@click.option('--record', 'record_results', is_flag=True, help='Record results in benchmarks/results')
+def main(jobs, tasks_per_job, chained, command, parallel_jobs, parallel_workers, polling_interval,
+         latency, failure_rate, events, record_results):
+    for p, k in itertools.product(parallel_jobs or (1, 4), parallel_workers or (2, 8)):
+        case = {'jobs': jobs, 'tasks_per_job': tasks_per_job, 'chained': chained, 'command': command,
+                'parallel_jobs': p, 'parallel_workers': k, 'polling_interval': polling_interval,
+                'latency': latency, 'failure_rate': failure_rate, 'events': events}
+        metrics = run_case(jobs, tasks_per_job, command, p, k, polling_interval,
+                           latency=latency, failure_rate=failure_rate, chained=chained, events=events)
+        line = 'parallel_jobs: %-3s parallel_workers: %-3s %s' % (
+            p, k, ', '.join('%s: %s' % i for i in sorted(metrics.items())))
+        if record_results:
+            line += '\n    ' + compare(metrics, record('executor', case, metrics))
+        click.echo(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Helpers shared by benchmarks: timing and recording results so they can be compared between versions
+"""
+import os
+import json
+import subprocess
+from time import time, perf_counter
+from jtracker import __version__
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def best_of(fn, repeat=3, min_time=0.0):
+    """
+    Time fn repeat times and return the shortest time per call in seconds and the last return value.
+    Fast functions are called in a loop until a single measurement takes at least min_time.
+    """
+    loops = 1
+    while True:
+        start = perf_counter()
+        for _ in range(loops):
+            rv = fn()
+        elapsed = perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / elapsed) if elapsed else loops * 10)
+
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = perf_counter()
+        for _ in range(loops):
+            rv = fn()
+        best = min(best, (perf_counter() - start) / loops)
+    return best, rv
+
+
+def load_results(benchmark):
+    path = os.path.join(RESULTS_DIR, '%s.jsonl' % benchmark)
+    try:
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def record(benchmark, case, metrics):
+    """
+    Append a result to results/{benchmark}.jsonl
+    :param case: dict of benchmark parameters identifying the case
+    :return: previous result of the same case recorded by a different version or revision, if any
+    """
+    revision = git_revision()
+    previous = None
+    for r in load_results(benchmark):
+        if r['case'] == case and (r['version'], r['revision']) != (__version__, revision):
+            previous = r
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, '%s.jsonl' % benchmark), 'a') as f:
+        f.write(json.dumps({'benchmark': benchmark, 'case': case, 'metrics': metrics,
+                            'version': __version__, 'revision': revision, 'time': int(time())},
+                           sort_keys=True) + '\n')
+    return previous
+
+
+def compare(metrics, previous):
+    """
+    Describe relative change of each metric against a previous result
+    """
+    if not previous:
+        return ''
+    changes = []
+    for k, v in sorted(metrics.items()):
+        old = previous['metrics'].get(k)
+        if isinstance(v, (int, float)) and isinstance(old, (int, float)) and old:
+            changes.append('%s %+.1f%%' % (k, (v - old) * 100.0 / old))
+    return 'vs %s@%s: %s' % (previous['version'], previous['revision'], ', '.join(changes))
+
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def load_baseline(name):
+    """
+    :return: baseline results, case => size => seconds
+    """
+    try:
+        with open(os.path.join(BASELINES_DIR, '%s.json' % name), 'r') as f:
+            return json.load(f).get('results', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(name, results):
+    os.makedirs(BASELINES_DIR, exist_ok=True)
+    with open(os.path.join(BASELINES_DIR, '%s.json' % name), 'w') as f:
+        json.dump({'version': __version__, 'revision': git_revision(), 'time': int(time()), 'results': results},
+                  f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def regressions(results, baseline, threshold=0.25):
+    """
+    :return: list of (case, size, seconds, baseline seconds) slower than baseline by more than threshold
+    """
+    slower = []
+    for case, sizes in sorted(results.items()):
+        for size, seconds in sorted(sizes.items(), key=lambda i: int(i[0])):
+            base = baseline.get(case, {}).get(size)
+            if base and seconds > base * (1 + threshold):
+                slower.append((case, size, seconds, base))
+    return slower
@@ -0,0 +1,34 @@
+"""
+Benchmark for bulk job enqueue (`jt job add -f`) against the local stand-in server
+
+    python -m benchmarks.job_add --jobs 10000 --latency 0.005
+"""
+import io
+import json
+from time import perf_counter
+import click
+from jtracker.cli.job.bulk import bulk_enqueue
+from .stand_in import StandInServer
+
+
+@click.command()
+@click.option('-n', '--jobs', type=int, default=10000, help='Number of jobs to enqueue')
+@click.option('-l', '--latency', type=float, default=0.005, help='Server latency in seconds per request')
+def main(jobs, latency):
+    ndjson = ''.join(json.dumps({'name': 'job_%s' % i, 'words': ['a', 'b', 'c']}) + '\n' for i in range(jobs))
+
+    click.echo('jobs: %s, server latency: %ss' % (jobs, latency))
+    for batch, concurrency, batch_size in [(False, 1, 1), (False, 8, 1), (False, 32, 1),
+                                           (True, 8, 100), (False, 8, 100)]:
+        with StandInServer(latency=latency, batch=batch) as server:
+            start = perf_counter()
+            enqueued, rejected = bulk_enqueue(server.url, 'user1', 'queue1', io.StringIO(ndjson),
+                                              concurrency=concurrency, batch_size=batch_size)
+            elapsed = perf_counter() - start
+            assert enqueued == jobs and not rejected
+            click.echo('batch endpoint: %-5s concurrency: %-3s batch size: %-4s %8.3fs %10.0f jobs/s %6s requests' %
+                       (batch, concurrency, batch_size, elapsed, jobs / elapsed, sum(server.rpc_count.values())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Micro-benchmarks for hot paths of workers and CLI, each case is run over a range of input sizes
+and compared against the JSON baseline in benchmarks/baselines/micro.json
+
+    python -m benchmarks.micro                    # run and check for regressions
+    python -m benchmarks.micro -k job_json_to_tsv -s 10000  # run selected cases and sizes
+    python -m benchmarks.micro --save-baseline    # record new baseline on this machine
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import tempfile
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import click
+from jtracker.cli.config import Config
+from jtracker.cli.job.utils import job_json_to_tsv
+from jtracker.execution.worker import Worker, download_file
+from .harness import best_of, load_baseline, save_baseline, regressions
+from .report import make_jobs
+
+
+SIZES = (1, 10, 100, 1000, 10000)
+BASELINE = 'micro'
+FILE_SIZE = 64 * 1024
+
+logger = logging.getLogger('jtracker.benchmark')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+
+class FileServer(object):
+    """
+    Serve files of a directory over HTTP for download benchmarks
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+        class Handler(SimpleHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), partial(Handler, directory=directory))
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self._httpd.server_address[:2]
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class Scheduler(object):
+    # just enough of JessScheduler for Worker to build paths and commands
+    executor_id = 'e0000000-0000-0000-0000-000000000001'
+    queue_id = 'bench-queue'
+    workflow_id = 'f0000000-0000-0000-0000-000000000001'
+    workflow_name = 'bench-workflow'
+    workflow_version = '0.1.0'
+
+
+def make_worker(jt_home, task_file):
+    worker = Worker(jt_home=jt_home, account_id='a0000000-0000-0000-0000-000000000001',
+                    scheduler=Scheduler(), node_id='node', node_ip='127.0.0.1', logger=logger)
+    worker._task = {'job.id': 'job-0', 'name': 'task_0', 'task_file': json.dumps(task_file)}
+    return worker
+
+
+def bench_command_builder(size, tmp_dir, file_server):
+    # size: number of input parameters referenced in the command, one of them a list
+    inputs = dict(('arg_%s' % i, 'value_%s' % i) for i in range(size))
+    inputs['files'] = ['file_%s.txt' % i for i in range(size)]
+    command = 'run.py %s --files ${sep=\',\' files}' % ' '.join('--arg-%s ${arg_%s}' % (i, i) for i in range(size))
+    task_file = {'task': 'task_0', 'command': command, 'input': inputs, 'runtime': {}}
+
+    def run():
+        return make_worker(tmp_dir, task_file)._task_command_builder()
+    return run
+
+
+def bench_stage_input_files(size, tmp_dir, file_server):
+    # size: number of input files, already provisioned in workflow data dir
+    names = ['in_%s.bin' % i for i in range(size)]
+    for n in names:
+        with open(os.path.join(file_server.directory, n), 'wb') as f:
+            f.write(b'x' * 16)
+    task_file = {'task': 'task_0', 'command': 'run.py', 'runtime': {},
+                 'input': {'files': ['[${_wf_data}/%s]%s/%s' % (n, file_server.url, n) for n in names]}}
+    make_worker(tmp_dir, task_file)._stage_input_files()  # provision once, measure the cached path
+
+    def run():
+        return make_worker(tmp_dir, task_file)._stage_input_files()
+    return run
+
+
+def bench_download_file(size, tmp_dir, file_server):
+    # size: number of files downloaded
+    with open(os.path.join(file_server.directory, 'file.bin'), 'wb') as f:
+        f.write(b'x' * FILE_SIZE)
+    url = '%s/file.bin' % file_server.url
+    counter = [0]
+
+    def run():
+        counter[0] += 1
+        target = os.path.join(tmp_dir, 'download.%s' % counter[0])
+        for i in range(size):
+            download_file(os.path.join(target, 'file_%s.bin' % i), url, logger)
+        shutil.rmtree(target)
+    return run
+
+
+def bench_job_json_to_tsv(size, tmp_dir, file_server):
+    # size: number of task rows
+    jobs = make_jobs(size)
+
+    def run():
+        return sum(len(job_json_to_tsv(j, with_task=True)) for j in jobs)
+    return run
+
+
+def bench_config_load(size, tmp_dir, file_server):
+    # size: number of entries in the config file
+    path = os.path.join(tmp_dir, 'config.yaml')
+    with open(path, 'w') as f:
+        f.write('jt_home: %s\njt_account: user1\njess_server: http://127.0.0.1/api/jt-jess/v0.1\n' % tmp_dir)
+        f.write('queues:\n')
+        for i in range(size):
+            f.write('  queue_%s: {parallel_jobs: 2, parallel_workers: 4, polling_interval: 10}\n' % i)
+
+    def run():
+        return Config(path).dict
+    return run
+
+
+CASES = {
+    'command_builder': (bench_command_builder, SIZES),
+    'stage_input_files': (bench_stage_input_files, SIZES),
+    'download_file': (bench_download_file, SIZES[:4]),
+    'job_json_to_tsv': (bench_job_json_to_tsv, SIZES),
+    'config_load': (bench_config_load, SIZES),
+}
+
+
+def run_case(name, size, repeat):
+    tmp_dir = tempfile.mkdtemp(prefix='jt-bench-')
+    files_dir = os.path.join(tmp_dir, 'files')
+    os.makedirs(files_dir)
+    cwd = os.getcwd()
+    try:
+        with FileServer(files_dir) as file_server:
+            fn = CASES[name][0](size, tmp_dir, file_server)
+            seconds, _ = best_of(fn, repeat=repeat, min_time=0.2)
+            return seconds
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@click.command()
+@click.option('-k', '--case', 'cases', multiple=True, type=click.Choice(sorted(CASES)),
+              help='Cases to run, all by default')
+@click.option('-s', '--size', 'sizes', multiple=True, type=int, help='Input sizes to run, all by default')
+@click.option('-r', '--repeat', type=int, default=5, help='Number of repeats, best time is reported')
+@click.option('-t', '--threshold', type=float, default=0.25,
+              help='Relative slowdown against baseline reported as regression')
+@click.option('--save-baseline', 'save', is_flag=True, help='Save results as new baseline')
+def main(cases, sizes, repeat, threshold, save):
+    baseline = load_baseline(BASELINE)
+    results = {}
+    for name in cases or sorted(CASES):
+        for size in CASES[name][1]:
+            if sizes and size not in sizes:
+                continue
+            seconds = run_case(name, size, repeat)
+            results.setdefault(name, {})[str(size)] = seconds
+            base = baseline.get(name, {}).get(str(size))
+            click.echo('%-18s %6s %12.6fs %s' % (name, size, seconds,
+                                                 '(baseline %.6fs, %+.1f%%)' % (base, (seconds - base) * 100 / base)
+                                                 if base else ''))
+
+    if save:
+        save_baseline(BASELINE, results)
+        click.echo('Baseline saved.')
+        return
+
+    # confirm apparent regressions with another run to rule out noise from other load on the machine
+    for name, size, seconds, base in regressions(results, baseline, threshold):
+        results[name][size] = min(seconds, run_case(name, int(size), repeat))
+
+    slower = regressions(results, baseline, threshold)
+    for name, size, seconds, base in slower:
+        click.echo('Regression: %s size %s took %.6fs, baseline %.6fs' % (name, size, seconds, base), err=True)
+    if slower:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
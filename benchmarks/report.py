@@ -0,0 +1,92 @@
+"""
+Benchmark for task level job reports (`jt job ls -t`)
+
+    python -m benchmarks.report --tasks 100000
+"""
+import io
+import json
+import random
+import datetime
+from time import perf_counter
+import click
+from jtracker.cli.job.utils import REPORT_COLUMNS, REPORT_FORMATS, ReportWriter, job_report_rows, parse_columns
+
+
+def make_jobs(n_tasks, tasks_per_job=10, output_size=2000, seed=0):
+    rnd = random.Random(seed)
+    jobs = []
+    for j in range(0, n_tasks, tasks_per_job):
+        tasks = {}
+        for t in range(min(tasks_per_job, n_tasks - j)):
+            start = 1500000000 + rnd.randint(0, 10000000)
+            runs = []
+            for n in range(rnd.randint(0, 3)):
+                runs.append({
+                    'result': 'x' * output_size,
+                    'counts': list(range(50)),
+                    '_jt_': {
+                        'executor_id': 'executor-%s' % rnd.randint(0, 100),
+                        'node_id': 'node-%s' % rnd.randint(0, 100),
+                        'node_ip': '10.0.0.%s' % rnd.randint(0, 255),
+                        'state': 'completed',
+                        'wall_time': {'start': start, 'end': start + rnd.randint(1, 3600)}
+                    }
+                })
+            task_file = {
+                'task': 'task_%s' % t,
+                'command': 'run.py ${input_file}',
+                'input': {'input_file': '[in.txt]https://example.com/%s/%s.txt' % (j, t)},
+                'runtime': {},
+                'output': runs
+            }
+            tasks['task_%s' % t] = {'state': 'completed' if runs else 'queued',
+                                    'task_file': json.dumps(task_file)}
+        jobs.append({'id': 'job-%s' % j, 'name': 'job_%s' % j, 'state': 'running', 'tasks': tasks})
+    return jobs
+
+
+def full_parse_rows(job_json):
+    # reference implementation that decodes every task_file in full
+    for task_name, task in job_json.get('tasks').items():
+        task_runs = json.loads(task.get('task_file')).get('output', [])
+        row = [job_json.get('id'), job_json.get('name'), job_json.get('state'), task_name, task.get('state')]
+        if task_runs:
+            jt = task_runs[-1]['_jt_']
+            row += [len(task_runs), datetime.datetime.utcfromtimestamp(jt['wall_time']['end']).isoformat(), jt['wall_time']['end'] - jt['wall_time']['start'],
+                    jt['executor_id'], jt['node_id'], jt.get('node_ip')]
+        else:
+            row += [None] * 6
+        yield tuple(row)
+
+
+def report(jobs, rows, fmt, columns):
+    out = io.StringIO()
+    writer = ReportWriter(out, fmt=fmt, columns=columns)
+    start = perf_counter()
+    for j in jobs:
+        writer.write(rows(j))
+    writer.close()
+    return perf_counter() - start, writer.rows
+
+
+@click.command()
+@click.option('-n', '--tasks', type=int, default=100000, help='Number of tasks in the report')
+@click.option('-c', '--columns', help='Comma separated report columns')
+@click.option('-r', '--repeat', type=int, default=3, help='Number of repeats, best time is reported')
+def main(tasks, columns, repeat):
+    columns = parse_columns(columns, with_task=True)
+    jobs = make_jobs(tasks)
+
+    click.echo('tasks: %s, columns: %s' % (tasks, ','.join(columns)))
+
+    cases = [('full-parse', 'tsv', lambda j: full_parse_rows(j))]
+    cases += [(fmt, fmt, lambda j: job_report_rows(j, columns=columns, with_task=True)) for fmt in REPORT_FORMATS]
+
+    for name, fmt, rows in cases:
+        best, n_rows = min(report(jobs, rows, fmt, REPORT_COLUMNS if name == 'full-parse' else columns)
+                           for _ in range(repeat))
+        click.echo('%-12s %8.3fs %10.0f rows/s' % (name, best, n_rows / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+"""
+In-process stand-in for the JTracker services (AMS, WRS and JESS), good enough for benchmarking
+the client side. It implements the endpoints called by the CLI and JessScheduler with a simple
+job and task state machine.
+"""
+import re
+import gzip
+import json
+import hashlib
+import inspect
+import random
+import threading
+from time import sleep, time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from uuid import uuid4
+
+
+ACCOUNT_ID = 'a0000000-0000-0000-0000-000000000001'
+WORKFLOW_ID = 'f0000000-0000-0000-0000-000000000001'
+WORKFLOW_VERSION = '0.1.0'
+
+
+KEEPALIVE_INTERVAL = 15  # seconds between comment lines on an idle event stream
+GZIP_MIN_SIZE = 1024  # responses of at least this many bytes are gzip'ed for clients accepting it
+
+
+def route(method, pattern, stream=False):
+    """
+    :param stream: the handler writes the response itself, it gets the request handler as 'handler'
+    """
+    def decorator(fn):
+        fn.route = (method, re.compile('^%s$' % pattern))
+        fn.stream = stream
+        return fn
+    return decorator
+
+
+class StandInServer(object):
+    """
+    :param latency: seconds added to every response
+    :param failure_rate: fraction of requests answered with HTTP 503
+    :param batch: whether the job batch endpoint is provided
+    :param etag: whether GET responses carry ETag and honor If-None-Match
+    :param events: whether the server-sent event stream of queue events is provided
+    :param gzip: whether gzip'ed request bodies are accepted, and large responses gzip'ed when asked for
+    """
+    def __init__(self, latency=0.0, failure_rate=0.0, batch=True, etag=True, events=True, gzip=True,
+                 host='127.0.0.1', port=0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.batch = batch
+        self.etag = etag
+        self.events = events
+        self.gzip = gzip
+        self.bytes_received = 0  # request bodies as sent over the wire
+        self.rpc_count = Counter()
+        self.jobs = {}
+        self.queues = {}
+        self.executors = {}
+        self.dispatch_latency = []  # seconds between a task becoming ready and being handed out
+        self._lock = threading.Lock()
+        self._event_log = []  # (queue_id, event type, data) of every event published
+        self._event_added = threading.Condition(self._lock)
+        self._closed = False
+        self._random = random.Random(seed)
+        self._routes = [fn.route + (getattr(self, name),) for name, fn in inspect.getmembers(type(self))
+                        if hasattr(fn, 'route')]
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._dispatch(self, 'GET')
+
+            def do_POST(self):
+                server._dispatch(self, 'POST')
+
+            def do_PUT(self):
+                server._dispatch(self, 'PUT')
+
+            def do_DELETE(self):
+                server._dispatch(self, 'DELETE')
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%s' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            self._closed = True
+            self._event_added.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _dispatch(self, handler, method):
+        path, _, query = handler.path.partition('?')
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        self.bytes_received += len(body)
+        if handler.headers.get('Content-Encoding') == 'gzip':
+            if not self.gzip:
+                return self._respond(handler, 415, {'error': 'unsupported content encoding'})
+            body = gzip.decompress(body)
+
+        for m, pattern, fn in self._routes:
+            match = pattern.match(path) if m == method else None
+            if not match:
+                continue
+
+            with self._lock:
+                self.rpc_count[fn.__name__] += 1
+                fail = self.failure_rate and self._random.random() < self.failure_rate
+            if self.latency:
+                sleep(self.latency)
+            if fail:
+                return self._respond(handler, 503, {'error': 'service unavailable'})
+
+            params = dict(p.split('=', 1) for p in query.split('&') if '=' in p)
+            kwargs = dict(match.groupdict(), handler=handler) if fn.stream else match.groupdict()
+            rv = fn(body=json.loads(body.decode()) if body else None, params=params, **kwargs)
+            if rv is None:
+                return  # streamed by the handler
+            status, rv = rv
+            return self._respond(handler, status, rv, etag=method == 'GET' and self.etag)
+
+        self._respond(handler, 404, {'error': 'not found'})
+
+    def _respond(self, handler, status, rv, etag=False):
+        data = json.dumps(rv).encode()
+        headers = {'Content-Type': 'application/json'}
+        if etag and status == 200:
+            headers['ETag'] = '"%s"' % hashlib.sha1(data).hexdigest()
+            if handler.headers.get('If-None-Match') == headers['ETag']:
+                status, data = 304, b''
+        if self.gzip and len(data) >= GZIP_MIN_SIZE and 'gzip' in handler.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            data = gzip.compress(data)
+
+        handler.send_response(status)
+        for k, v in headers.items():
+            handler.send_header(k, v)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    # state set up
+
+    def add_queue(self, queue_id, tasks=None):
+        """
+        :param tasks: workflow tasks in order, task name => {'command': ..., 'depends_on': [...], 'runtime': {...}}
+        """
+        self.queues[queue_id] = {
+            'id': queue_id,
+            'state': 'open',
+            'workflow.id': WORKFLOW_ID,
+            'workflow.name': 'bench-workflow',
+            'workflow.ver': WORKFLOW_VERSION,
+            'workflow_owner.name': 'user1',
+            'tasks': tasks or {}
+        }
+        return self.queues[queue_id]
+
+    def _add_job(self, queue_id, job):
+        job_id = str(uuid4())
+        now = time()
+        tasks = {}
+        for name, t in self.queues.get(queue_id, {}).get('tasks', {}).items():
+            tasks[name] = {
+                'state': 'queued',
+                'depends_on': t.get('depends_on', []),
+                'ready_at': now if not t.get('depends_on') else None,
+                'task_file': json.dumps({'task': name, 'command': t.get('command', 'true'),
+                                         'input': dict(job.get('input', {})),
+                                         'runtime': dict(t.get('runtime', {})), 'output': []})
+            }
+        with self._lock:
+            self.jobs[job_id] = {'id': job_id, 'queue_id': queue_id, 'name': job.get('name'),
+                                 'state': 'queued', 'job_file': job, 'tasks': tasks,
+                                 'executor_id': None, 'submitted_at': now, 'updated_at': now}
+            self._publish(queue_id, 'tasks_available', {'job_id': job_id})
+        return self.jobs[job_id]
+
+    def add_jobs(self, queue_id, n, inputs=None):
+        """
+        :param inputs: optional function of job number returning job input dict
+        """
+        return [self._add_job(queue_id, {'name': 'job_%s' % i, 'input': inputs(i) if inputs else {}})
+                for i in range(n)]
+
+    def _publish(self, queue_id, event, data):
+        # called with the lock held
+        self._event_log.append((queue_id, event, data))
+        self._event_added.notify_all()
+
+    def _set_job_state(self, job, state):
+        job['state'] = state
+        job['updated_at'] = time()
+        self._publish(job['queue_id'], 'job_state_changed', {'job_id': job['id'], 'state': state})
+
+    @staticmethod
+    def _public(job):
+        return dict(job, tasks=dict((n, {'state': t['state'], 'task_file': t['task_file']})
+                                    for n, t in job['tasks'].items()))
+
+    # AMS
+
+    @route('GET', '/accounts/(?P<name>[^/]+)')
+    def get_account(self, name, body, params):
+        return 200, {'id': ACCOUNT_ID, 'name': name}
+
+    # WRS
+
+    @route('GET', '/workflows/owner/(?P<owner>[^/]+)')
+    def list_workflows(self, owner, body, params):
+        return 200, [self.get_workflow(WORKFLOW_ID, WORKFLOW_VERSION, None, None)[1]]
+
+    @route('GET', '/workflows/id/(?P<workflow_id>[^/]+)/ver/(?P<ver>[^/]+)')
+    def get_workflow(self, workflow_id, ver, body, params):
+        return 200, {'id': workflow_id, 'name': 'bench-workflow', 'git_account': 'jtracker-io',
+                     'git_repo': 'bench', 'ver:%s' % ver: {'git_tag': ver, 'git_path': 'bench'}}
+
+    # JESS: queues
+
+    @route('GET', '/queues/owner/(?P<owner>[^/]+)')
+    def list_queues(self, owner, body, params):
+        return 200, [dict((k, v) for k, v in q.items() if k != 'tasks') for q in self.queues.values()]
+
+    @route('GET', '/queues/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)')
+    def get_queue(self, owner, queue_id, body, params):
+        q = self.queues.get(queue_id)
+        if not q:
+            return 404, {'error': 'queue not found'}
+        return 200, dict((k, v) for k, v in q.items() if k != 'tasks')
+
+    # JESS: executors
+
+    @route('POST', '/executors/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/node/(?P<node_id>[^/]+)')
+    def register_executor(self, owner, queue_id, node_id, body, params):
+        with self._lock:
+            for e in self.executors.values():
+                if e['job_queue_id'] == queue_id and e['node_id'] == node_id:
+                    return 200, e
+            executor_id = str(uuid4())
+            self.executors[executor_id] = dict(body or {}, id=executor_id, job_queue_id=queue_id, node_id=node_id)
+            return 200, self.executors[executor_id]
+
+    @route('PUT', '/executors/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/executor/(?P<executor_id>[^/]+)'
+                  '/action')
+    def update_executor(self, owner, queue_id, executor_id, body, params):
+        with self._lock:
+            self.executors.get(executor_id, {}).update(body or {})
+        return 202, {}
+
+    # JESS: jobs
+
+    @route('POST', '/jobs/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)')
+    def enqueue_job(self, owner, queue_id, body, params):
+        return 200, self._public(self._add_job(queue_id, body))
+
+    @route('POST', '/jobs/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/batch')
+    def enqueue_jobs(self, owner, queue_id, body, params):
+        if not self.batch:
+            return 404, {'error': 'not found'}
+        return 200, [self._public(self._add_job(queue_id, job)) for job in body]
+
+    @route('GET', '/jobs/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)')
+    def list_jobs(self, owner, queue_id, body, params):
+        state = params.get('state')
+        since = float(params.get('since', 0))
+        with self._lock:
+            return 200, [self._public(j) for j in self.jobs.values() if j['queue_id'] == queue_id and
+                         (not state or j['state'] == state) and j['updated_at'] >= since]
+
+    @route('GET', '/jobs/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/executor/(?P<executor_id>[^/]+)')
+    def executor_jobs(self, owner, queue_id, executor_id, body, params):
+        state = params.get('state')
+        with self._lock:
+            return 200, [self._public(j) for j in self.jobs.values() if j['executor_id'] == executor_id and
+                         (not state or j['state'] == state)]
+
+    @route('PUT', '/jobs/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/job/(?P<job_id>[^/]+)/action')
+    def job_action(self, owner, queue_id, job_id, body, params):
+        states = {'resume': 'resume', 'reset': 'queued', 'suspend': 'suspended', 'cancel': 'cancelled'}
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or body.get('action') not in states:
+                return 400, {'error': 'invalid job or action'}
+            self._set_job_state(job, states[body['action']])
+            if body['action'] in ('reset', 'resume'):
+                job['executor_id'] = None
+                for t in job['tasks'].values():
+                    if t['state'] != 'completed' or body['action'] == 'reset':
+                        t['state'] = 'queued'
+                self._publish(queue_id, 'tasks_available', {'job_id': job_id})
+            return 200, self._public(job)
+
+    @route('DELETE', '/jobs/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/job/(?P<job_id>[^/]+)')
+    def delete_job(self, owner, queue_id, job_id, body, params):
+        with self._lock:
+            job = self.jobs.pop(job_id, None)
+        return (200, self._public(job)) if job else (404, {'error': 'job not found'})
+
+    # JESS: tasks
+
+    @staticmethod
+    def _ready_tasks(job):
+        for name, t in job['tasks'].items():
+            if t['state'] == 'queued' and all(job['tasks'][d]['state'] == 'completed' for d in t['depends_on']):
+                yield name, t
+
+    @route('GET', '/tasks/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/executor/(?P<executor_id>[^/]+)'
+                  '/has_next_task')
+    def has_next_task(self, owner, queue_id, executor_id, body, params):
+        with self._lock:
+            return 200, any(t['state'] == 'queued' for j in self.jobs.values()
+                            if j['executor_id'] == executor_id and j['state'] == 'running'
+                            for t in j['tasks'].values())
+
+    @route('GET', '/tasks/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/executor/(?P<executor_id>[^/]+)'
+                  '/next_task')
+    def next_task(self, owner, queue_id, executor_id, body, params):
+        job_state = params.get('job_state', 'running')
+        with self._lock:
+            jobs = list(self.jobs.values())
+            if params.get('job_id') in self.jobs:  # preferred job is tried first
+                jobs.insert(0, self.jobs[params['job_id']])
+            for job in jobs:
+                if job['queue_id'] != queue_id:
+                    continue
+                if job_state == 'running' and (job['state'] != 'running' or job['executor_id'] != executor_id):
+                    continue
+                if job_state == 'queued' and job['state'] not in ('queued', 'resume'):
+                    continue
+                for name, t in self._ready_tasks(job):
+                    t['state'] = 'running'
+                    if t['ready_at'] is not None:
+                        self.dispatch_latency.append(time() - t['ready_at'])
+                    if job['state'] != 'running':
+                        self._set_job_state(job, 'running')
+                        job['executor_id'] = executor_id
+                    return 200, {'name': name, 'job.id': job['id'], 'task_file': t['task_file']}
+        return 200, {}
+
+    @route('PUT', '/tasks/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/executor/(?P<executor_id>[^/]+)'
+                  '/job/(?P<job_id>[^/]+)/task/(?P<task_name>[^/]+)/(?P<operation>task_completed|task_failed)')
+    def task_ended(self, owner, queue_id, executor_id, job_id, task_name, operation, body, params):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if not job or task_name not in job['tasks']:
+                return 400, {'error': 'task not found'}
+            task = job['tasks'][task_name]
+            task_file = json.loads(task['task_file'])
+            task_file['output'].append(body)
+            task['task_file'] = json.dumps(task_file)
+            task['state'] = 'completed' if operation == 'task_completed' else 'failed'
+
+            if task['state'] == 'failed':
+                self._set_job_state(job, 'failed')
+            elif all(t['state'] == 'completed' for t in job['tasks'].values()):
+                self._set_job_state(job, 'completed')
+            else:
+                now = time()
+                for name, t in self._ready_tasks(job):
+                    if t['ready_at'] is None:
+                        t['ready_at'] = now
+                self._publish(queue_id, 'tasks_available', {'job_id': job_id})
+            return 200, {}
+
+    # JESS: events
+
+    @route('GET', '/events/owner/(?P<owner>[^/]+)/queue/(?P<queue_id>[^/]+)/executor/(?P<executor_id>[^/]+)',
+           stream=True)
+    def event_stream(self, owner, queue_id, executor_id, body, params, handler=None):
+        if not self.events:
+            return 404, {'error': 'not found'}
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+
+        with self._lock:
+            seen = len(self._event_log)
+        try:
+            while True:
+                with self._event_added:
+                    self._event_added.wait_for(lambda: self._closed or len(self._event_log) > seen,
+                                               timeout=KEEPALIVE_INTERVAL)
+                    if self._closed:
+                        return None
+                    events = [e for e in self._event_log[seen:] if e[0] == queue_id]
+                    seen = len(self._event_log)
+                data = ''.join('event: %s\ndata: %s\n\n' % (e, json.dumps(d)) for _, e, d in events)
+                handler.wfile.write((data or ': keepalive\n\n').encode())
+                handler.wfile.flush()
+        except OSError:
+            return None  # client went away
@@ -0,0 +1,80 @@
+"""
+Executor startup benchmark: times Executor construction against the local stand-in server, on a cold node
+(empty jt_home) and on a warm one (started before), with server latency and a slow node IP lookup
+
+    python -m benchmarks.startup -q 1 -q 4 -l 0.05 --node-ip-delay 2 --record
+"""
+import shutil
+import logging
+import tempfile
+from time import sleep, perf_counter
+import click
+from jtracker.execution import Executor
+from jtracker.execution import executor as executor_module
+from .executor import install_workflow
+from .harness import record, compare
+from .stand_in import StandInServer
+
+
+def start_executor(server, jt_home, queue_ids):
+    executor = Executor(jt_home=jt_home, jt_account='user1',
+                        ams_server=server.url, wrs_server=server.url, jess_server=server.url,
+                        queue_id=queue_ids, continuous_run=False, force_restart=True,
+                        logger=logging.getLogger('jtracker.benchmark'))
+    executor.metrics.shutdown()
+
+
+def run_case(queues, latency, node_ip_delay, starts=3):
+    jt_home = tempfile.mkdtemp(prefix='jt-bench-')
+    get_node_ip = executor_module.get_node_ip
+
+    def slow_get_node_ip():
+        sleep(node_ip_delay)  # stands for a DNS lookup timing out
+        return get_node_ip()
+
+    executor_module.get_node_ip = slow_get_node_ip
+    try:
+        install_workflow(jt_home)
+        with StandInServer(latency=latency) as server:
+            queue_ids = ['queue-%s' % i for i in range(queues)]
+            for q in queue_ids:
+                server.add_queue(q)
+
+            times, rpcs = [], []
+            for _ in range(starts):
+                server.rpc_count.clear()
+                start = perf_counter()
+                start_executor(server, jt_home, queue_ids)
+                times.append(perf_counter() - start)
+                rpcs.append(sum(server.rpc_count.values()))
+
+            return {
+                'cold_seconds': round(times[0], 3),
+                'warm_seconds': round(min(times[1:]), 3),
+                'cold_rpcs': rpcs[0],
+                'warm_rpcs': min(rpcs[1:]),
+            }
+    finally:
+        executor_module.get_node_ip = get_node_ip
+        shutil.rmtree(jt_home, ignore_errors=True)
+
+
+@click.command()
+@click.option('-q', '--queues', type=int, multiple=True, help='Number of queues served by the executor')
+@click.option('-l', '--latency', type=float, default=0.05, help='Server latency in seconds per request')
+@click.option('--node-ip-delay', type=float, default=1.0, help='Seconds the node IP lookup takes')
+@click.option('--record', 'record_results', is_flag=True, help='Record results in benchmarks/results')
+def main(queues, latency, node_ip_delay, record_results):
+    logging.getLogger('jtracker.benchmark').addHandler(logging.NullHandler())
+    logging.getLogger('jtracker.benchmark').propagate = False
+    for q in queues or (1, 4):
+        case = {'queues': q, 'latency': latency, 'node_ip_delay': node_ip_delay}
+        metrics = run_case(q, latency, node_ip_delay)
+        line = 'queues: %-3s %s' % (q, ', '.join('%s: %s' % i for i in sorted(metrics.items())))
+        if record_results:
+            line += '\n    ' + compare(metrics, record('startup', case, metrics))
+        click.echo(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import os
+import json
+import errno
+import hashlib
+from time import time
+import requests
+
+
+# default time to live (in seconds) of cached responses per endpoint
+DEFAULT_TTLS = {
+    'accounts': 24 * 3600,
+    'workflows': 3600,
+    'queues': 300,
+}
+DEFAULT_MAX_SIZE = 20 * 1024 * 1024  # in bytes
+
+
+class CachedResponse(object):
+    """
+    Minimal stand-in for requests.Response served from the cache
+    """
+    def __init__(self, entry, from_cache=True):
+        self.url = entry.get('url')
+        self.status_code = entry.get('status_code')
+        self.text = entry.get('text')
+        self.headers = {'ETag': entry['etag']} if entry.get('etag') else {}
+        self.from_cache = from_cache
+
+
+class ResponseCache(object):
+    """
+    On-disk cache for GET responses of read-mostly endpoints.
+
+    Each response is kept in its own file named after the endpoint and a hash of the URL.
+    Fresh entries (younger than the endpoint TTL) are served without contacting the server,
+    stale entries with an ETag are revalidated with If-None-Match. Only 200 responses are
+    cached, least recently used entries are evicted when the cache grows beyond max_size.
+    """
+    def __init__(self, cache_dir, ttls=None, max_size=DEFAULT_MAX_SIZE, session=None):
+        self._cache_dir = cache_dir
+        self._ttls = dict(DEFAULT_TTLS)
+        self._ttls.update(ttls or {})
+        self._max_size = max_size
+        self._session = session if session else requests
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def get(self, url, endpoint):
+        path = self._entry_path(url, endpoint)
+        entry = self._load(path)
+        headers = {}
+
+        if entry:
+            if time() - entry.get('fetched_at', 0) < self._ttls.get(endpoint, 0):
+                self._touch(path)
+                return CachedResponse(entry)
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+
+        r = self._session.get(url, headers=headers)
+
+        if r.status_code == 304 and entry:
+            entry['fetched_at'] = time()
+            self._store(path, entry)
+            return CachedResponse(entry)
+
+        if r.status_code == 200:
+            self._store(path, {
+                'url': url,
+                'fetched_at': time(),
+                'etag': r.headers.get('ETag'),
+                'status_code': r.status_code,
+                'text': r.text
+            })
+
+        return r
+
+    def invalidate(self, endpoint=None):
+        """
+        Remove cached responses of the endpoint, or all cached responses when endpoint is not given
+        """
+        for f in self._entries():
+            if endpoint is None or f.name.startswith('%s.' % endpoint):
+                self._remove(f.path)
+
+    def _entry_path(self, url, endpoint):
+        return os.path.join(self.cache_dir, '%s.%s.json' % (endpoint, hashlib.sha1(url.encode()).hexdigest()))
+
+    def _entries(self):
+        try:
+            return [f for f in os.scandir(self.cache_dir) if f.name.endswith('.json')]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, path, entry):
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError as e:  # Guard against race condition
+            if e.errno != errno.EEXIST:
+                return
+
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            self._remove(tmp_path)
+            return
+
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for f in self._entries():
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f.path))
+
+        total = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total <= self._max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def cache_from_config(jt_config, no_cache=False):
+    """
+    Create response cache under jt_home as configured in JTracker config, eg,
+
+        cache:
+          max_size_mb: 20
+          ttl:
+            queues: 60
+
+    :return: ResponseCache, or None when caching is disabled
+    """
+    conf = jt_config.get('cache') or {}
+    if no_cache or conf.get('enabled') is False:
+        return None
+
+    return ResponseCache(os.path.join(jt_config.get('jt_home'), 'cache'),
+                         ttls=conf.get('ttl'),
+                         max_size=int(conf.get('max_size_mb', DEFAULT_MAX_SIZE / 1024 / 1024) * 1024 * 1024))
@@ -4,6 +4,8 @@ import yaml
 import click
 import click_log
 from jtracker import __version__ as ver
+from jtracker.cache import cache_from_config
+from jtracker.retry import retry_policy_from_config
 from .user import commands as user_commands
 from .org import commands as org_commands
 from .wf import commands as wf_commands
@@ -64,9 +66,10 @@ def setup(ctx, param, value):
               help='Show JTracker version', is_eager=True)
 @click.option('--setup', '-s', is_flag=True, callback=setup, expose_value=False,
               help='Complete JTracker CLI configuration', is_eager=True)
+@click.option('--no-cache', is_flag=True, help='Do not use cached server responses')
 @click.pass_context
 @click_log.simple_verbosity_option(logger, '--verbosity', '-V')
-def main(ctx, config_file, write_out):
+def main(ctx, config_file, write_out, no_cache):
     # initialize configuration from config_file
     if config_file is None:
         config_file = os.path.join(os.getenv("HOME"), '.jtconfig')
@@ -83,6 +86,8 @@ def main(ctx, config_file, write_out):
         'JT_WRITE_OUT': write_out,
         'JT_CONFIG_FILE': config_file,
         'JT_CONFIG': jt_config,
+        'JT_CACHE': cache_from_config(jt_config, no_cache=no_cache),
+        'JT_RETRY_POLICY': retry_policy_from_config(jt_config),
         'LOGGER': logger
     }
 
@@ -155,6 +160,7 @@ def queue(ctx):
 # queue subcommands
 queue.add_command(queue_commands.ls)
 queue.add_command(queue_commands.add)
+queue.add_command(queue_commands.stats)
 queue.add_command(queue_commands.pause)
 queue.add_command(queue_commands.close)
 queue.add_command(queue_commands.open)
@@ -171,6 +177,7 @@ def job(ctx):
 
 # job subcommands
 job.add_command(job_commands.ls)
+job.add_command(job_commands.watch)
 job.add_command(job_commands.get)
 job.add_command(job_commands.delete)
 job.add_command(job_commands.resume)
@@ -205,6 +212,8 @@ def exec(ctx):
 exec.add_command(exec_commands.run)
 exec.add_command(exec_commands.ls)
 exec.add_command(exec_commands.selector)
+exec.add_command(exec_commands.profile)
+exec.add_command(exec_commands.invalidate)
 
 
 if __name__ == '__main__':
@@ -1,15 +1,62 @@
+import os
+import glob
 import click
 import json
 import requests
+from time import time
 from jtracker.execution import Executor
+from jtracker.execution.reclaimer import GC_ACTIONS
+from jtracker.utils import parse_duration
+from jtracker.compression import DEFAULT_MIN_SIZE
+from jtracker.execution.memo import MemoCache, MEMO_DIR
+from jtracker.execution.tracing import TRACE_FILE, iter_spans, summarize
+
+
+def parse_queues(queue_ids):
+    """
+    Parse queue IDs given as {queue_id}[:{weight}], a queue given more than once is served once
+    :return: list of queue IDs and dict of queue weights
+    """
+    queues, weights = [], {}
+    for q in queue_ids:
+        queue_id, _, weight = q.partition(':')
+        if weight:
+            try:
+                weight = float(weight)
+            except ValueError:
+                weight = 0
+            if weight <= 0:
+                raise click.BadParameter("weight of queue '%s' must be a positive number" % queue_id,
+                                         param_hint="'-q' / '--queue-id'")
+        else:
+            weight = None
+
+        if queue_id in queues:
+            if weights.get(queue_id, 1) != (1 if weight is None else weight):
+                raise click.BadParameter("queue '%s' is given with different weights" % queue_id,
+                                         param_hint="'-q' / '--queue-id'")
+            continue
+
+        queues.append(queue_id)
+        if weight is not None:
+            weights[queue_id] = weight
+    return queues, weights
 
 
 @click.command()
-@click.option('-q', '--queue-id', help='Job queue ID')
+@click.option('-q', '--queue-id', multiple=True,
+              help='Job queue ID, may be given multiple times to serve several queues, '
+                   'optionally with weight as {queue_id}:{weight}')
+@click.option('-s', '--queue-policy', type=click.Choice(['fair', 'priority']), default='fair',
+              help='How worker slots are shared by multiple queues: weighted fair share, '
+                   'or priority in the order queues are given')
 @click.option('-k', '--parallel-workers', type=int, default=2, help='Max number of parallel workers')
 @click.option('-p', '--parallel-jobs', type=int, default=1, help='Max number of parallel running jobs')
 @click.option('-m', '--max-jobs', type=int, default=0, help='Max number of jobs to be run by the executor')
 @click.option('-d', '--min-disk', type=int, default=0, help='Min required free disk space (in GB)')
+@click.option('--job-disk', type=int, default=0,
+              help='Expected disk space (in GB) used by a job, reserved on the node when the job starts, '
+                   'defaults to min disk')
 @click.option('-b', '--job-selector', help='Execute jobs matching specified selectors, use comma to separate selectors')
 @click.option('-j', '--job-file', type=click.Path(exists=True), help='Execute local job file')
 @click.option('-w', '--workflow-name', help='Specify registered workflow name in format: [{owner}/]{workflow}:{ver}')
@@ -17,13 +64,47 @@ from jtracker.execution import Executor
 @click.option('-f', '--force-restart', is_flag=True, help='Force executor restart, set previous running jobs to cancelled')
 @click.option('-r', '--resume-job', is_flag=True, help='Force executor restart, set previous running jobs to resume')
 @click.option('-i', '--polling-interval', type=int, default=10, help='Time interval the executor checks for new task')
+@click.option('--locality-candidates', type=int, default=20,
+              help='Number of queued jobs ranked by inputs already cached on the node, 0 to disable')
+@click.option('--gc', 'gc_action', type=click.Choice(GC_ACTIONS), default='keep',
+              help='What to do with dirs of finished jobs, done in background at low priority')
+@click.option('--keep-completed-days', type=int, default=1, help='Days to keep completed job dirs before gc')
+@click.option('--keep-failed-days', type=int, default=7, help='Days to keep failed job dirs before gc')
+@click.option('--task-timeout',
+              help="Max run time of a task, eg, 12h, unless set by 'timeout' in task runtime")
+@click.option('--idle-timeout',
+              help="Stop a task after this long without output or CPU use, eg, 30m, "
+                   "unless set by 'idle_timeout' in task runtime")
+@click.option('--memo', is_flag=True,
+              help='Complete tasks with results of identical earlier runs on this node, '
+                   "tasks opt out with 'memo: false' in runtime")
+@click.option('--shutdown-grace', type=int, default=30,
+              help='Seconds running tasks have to exit after SIGTERM at shutdown before they are killed')
+@click.option('--log-interval', type=int, default=60,
+              help='Seconds before the same status line is logged again, 0 to log it at every check')
+@click.option('--server-events/--no-server-events', default=True,
+              help='Wake up on events pushed by the server instead of waiting for the next poll, '
+                   'polling only when the server has no event stream')
+@click.option('--gzip-min-size', type=int, default=DEFAULT_MIN_SIZE,
+              help='Task outputs of at least this many bytes are sent to the server gzip compressed, 0 for never')
+@click.option('--metrics-port', type=int, help='Expose executor metrics in Prometheus format on local HTTP port')
+@click.option('--metrics-textfile', type=click.Path(dir_okay=False),
+              help='Write executor metrics to file for node exporter textfile collector')
 @click.pass_context
-def run(ctx, job_file, job_selector, queue_id, force_restart, resume_job,
-             workflow_name, parallel_jobs, max_jobs, min_disk, parallel_workers, retries,
-             polling_interval):
+def run(ctx, job_file, job_selector, queue_id, queue_policy, force_restart, resume_job,
+             workflow_name, parallel_jobs, max_jobs, min_disk, job_disk, parallel_workers, retries,
+             polling_interval, locality_candidates, gc_action, keep_completed_days, keep_failed_days,
+             task_timeout, idle_timeout, memo, shutdown_grace, log_interval, server_events,
+             gzip_min_size, metrics_port, metrics_textfile):
     """
     Launch JTracker executor
     """
+    queue_ids, queue_weights = parse_queues(queue_id)
+    try:
+        task_timeout, idle_timeout = parse_duration(task_timeout), parse_duration(idle_timeout)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--task-timeout' / '--idle-timeout'")
+
     jt_executor = None
     try:
         jt_executor = Executor(jt_home=ctx.obj['JT_CONFIG'].get('jt_home'),
@@ -33,16 +114,34 @@ def run(ctx, job_file, job_selector, queue_id, force_restart, resume_job,
                                jess_server=ctx.obj['JT_CONFIG'].get('jess_server'),
                                job_file=job_file,
                                job_selector=job_selector,
-                               queue_id=queue_id,
+                               queue_id=queue_ids if len(queue_ids) > 1 else (queue_ids[0] if queue_ids else None),
+                               queue_weights=queue_weights,
+                               queue_policy=queue_policy,
+                               locality_candidates=locality_candidates,
+                               gc_action=gc_action,
+                               keep_completed_days=keep_completed_days,
+                               keep_failed_days=keep_failed_days,
+                               shutdown_grace=shutdown_grace,
+                               task_timeout=task_timeout,
+                               idle_timeout=idle_timeout,
+                               memo=memo,
+                               status_log_interval=log_interval,
+                               server_events=server_events,
+                               gzip_min_size=gzip_min_size,
                                workflow_name=workflow_name,
                                parallel_jobs=parallel_jobs,
                                max_jobs=max_jobs,
                                min_disk=min_disk * 1000000000,
+                               job_disk=job_disk * 1000000000,
                                parallel_workers=parallel_workers,
                                retries=retries,
                                force_restart=force_restart,
                                resume_job=resume_job,
                                polling_interval=polling_interval,
+                               response_cache=ctx.obj.get('JT_CACHE'),
+                               retry_policy=ctx.obj.get('JT_RETRY_POLICY'),
+                               metrics_port=metrics_port,
+                               metrics_textfile=metrics_textfile,
                                logger=ctx.obj.get('LOGGER')
                                )
     except Exception as e:
@@ -114,3 +213,70 @@ def selector(ctx, queue_id, executor_id, job_selector):
         click.echo('Set job selector to executor failed: %s' % r.text)
     else:
         click.echo(r.text)
+
+
+@click.command()
+@click.option('-q', '--queue-id', help='Job queue ID')
+@click.option('-x', '--executor-id', help='Executor ID')
+@click.option('-f', '--trace-file', type=click.Path(exists=True, dir_okay=False), multiple=True,
+              help='Trace file to summarize, may be specified multiple times')
+@click.option('-t', '--by-task', is_flag=True, help='Break down by task name')
+@click.pass_context
+def profile(ctx, queue_id, executor_id, trace_file, by_task):
+    """
+    Summarize where task wall time goes from executor traces on this node
+    """
+    paths = list(trace_file)
+    if not paths:
+        # {jt_home}/account.{id}/node/workflow.{id}/{ver}/queue.{id}/executor.{id}/trace.jsonl
+        paths = glob.glob(os.path.join(ctx.obj['JT_CONFIG'].get('jt_home'), 'account.*', 'node', 'workflow.*', '*',
+                                       'queue.%s' % (queue_id if queue_id else '*'),
+                                       'executor.%s' % (executor_id if executor_id else '*'),
+                                       TRACE_FILE))
+    if not paths:
+        click.echo('No executor trace found')
+        return
+
+    summary = summarize(iter_spans(paths), by_task=by_task)
+    if ctx.obj.get('JT_WRITE_OUT') == 'json':
+        summary['phases'] = [dict(v, task_name=k[0], phase=k[1]) if by_task else dict(v, phase=k)
+                             for k, v in summary['phases'].items()]
+        click.echo(json.dumps(summary))
+        return
+
+    click.echo('tasks: %s, jobs: %s, task wall time: %.1f seconds' %
+               (summary['tasks'], summary['jobs'], summary['wall_time']))
+
+    header = ['phase', 'count', 'total', 'share', 'mean', 'max']
+    click.echo('\t'.join(['task_name'] + header if by_task else header))
+    for key, p in sorted(summary['phases'].items(), key=lambda i: (str(i[0][0]), -i[1]['total']) if by_task
+                         else -i[1]['total']):
+        row = list(key) if by_task else [key]
+        row += [str(p['count']), '%.1f' % p['total'], '_null_' if p['share'] is None else '%.1f%%' % (p['share'] * 100),
+                '%.2f' % p['mean'], '%.2f' % p['max']]
+        click.echo('\t'.join(str(v) for v in row))
+
+
+@click.command()
+@click.option('-k', '--key', multiple=True, help='Memo key as in _jt_.memo of task output, may be given multiple times')
+@click.option('-n', '--task-name', help='Only results of this task')
+@click.option('-j', '--job-id', help='Only results stored by this job')
+@click.option('-d', '--older-than', type=int, help='Only results stored more than this many days ago')
+@click.option('-a', '--all', 'all_', is_flag=True, help='All results')
+@click.pass_context
+def invalidate(ctx, key, task_name, job_id, older_than, all_):
+    """
+    Remove memoized task results on this node
+    """
+    if not (key or task_name or job_id or older_than is not None or all_):
+        click.echo('Specify results to remove with -k, -n, -j, -d or -a, see: jt exec invalidate --help')
+        ctx.abort()
+
+    before = time() - older_than * 86400 if older_than is not None else None
+    removed = 0
+    # {jt_home}/account.{id}/node/workflow.{id}/{ver}/memo
+    for memo_dir in glob.glob(os.path.join(ctx.obj['JT_CONFIG'].get('jt_home'), 'account.*', 'node', 'workflow.*', '*',
+                                           MEMO_DIR)):
+        removed += MemoCache(memo_dir).invalidate(keys=key, task_name=task_name, job_id=job_id, before=before)
+
+    click.echo('Removed %s memoized task %s' % (removed, 'result' if removed == 1 else 'results'))
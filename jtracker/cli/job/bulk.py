@@ -0,0 +1,253 @@
+import json
+import threading
+from time import sleep, monotonic
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def make_session(concurrency=8):
+    """
+    Create a requests session whose connection pool can serve `concurrency` threads
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(concurrency, 1))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def iter_ndjson(stream):
+    """
+    Read newline delimited JSON from a text stream
+    :return: generator of (line_no, object, error), error is None when the line is a valid JSON object
+    """
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield line_no, line, 'Invalid JSON: %s' % e
+            continue
+        if not isinstance(obj, dict):
+            yield line_no, obj, 'Job must be a JSON object'
+        else:
+            yield line_no, obj, None
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_bounded(fn, items, concurrency=8):
+    """
+    Call fn on each item using a pool of `concurrency` threads. Items are pulled from the
+    iterable lazily, at most 2 * concurrency of them are in flight at any time.
+    :return: generator of (item, result, exception) in completion order
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = {}
+
+        def drain(return_when):
+            done, _ = wait(list(pending), return_when=return_when)
+            for f in done:
+                item = pending.pop(f)
+                err = f.exception()
+                yield item, None if err else f.result(), err
+
+        for item in items:
+            if len(pending) >= concurrency * 2:
+                for rv in drain(FIRST_COMPLETED):
+                    yield rv
+            pending[pool.submit(fn, item)] = item
+
+        while pending:
+            for rv in drain(FIRST_COMPLETED):
+                yield rv
+
+
+class BulkEnqueuer(object):
+    """
+    Enqueue jobs to a queue through JESS. Jobs are sent in batches to the batch endpoint,
+    falling back to one POST per job when the server does not provide the batch endpoint.
+    A batch request failing in any other way is not resent job by job, as the server may have
+    enqueued the batch already, all its jobs are reported as rejected instead.
+    """
+    def __init__(self, jess_url, queue_owner, queue_id, session=None, batch_size=100):
+        self._url = "%s/jobs/owner/%s/queue/%s" % (jess_url, queue_owner, queue_id)
+        self._session = session if session else make_session()
+        self._batch_size = batch_size
+        self._batch_supported = batch_size > 1
+        self._lock = threading.Lock()
+
+    @property
+    def batch_supported(self):
+        return self._batch_supported
+
+    def enqueue(self, batch):
+        """
+        Enqueue a batch of (line_no, job) items
+        :return: list of (line_no, job, error), error is None for enqueued job
+        """
+        if self._batch_supported and len(batch) > 1:
+            rv = self._enqueue_batch(batch)
+            if rv is not None:
+                return rv
+
+        return [self._enqueue_one(line_no, job) for line_no, job in batch]
+
+    def _enqueue_one(self, line_no, job):
+        try:
+            r = self._session.post(url=self._url, json=job)
+        except requests.RequestException as e:
+            return line_no, job, str(e)
+
+        if r.status_code != 200:
+            return line_no, job, r.text or 'HTTP %s' % r.status_code
+        return line_no, job, None
+
+    def _enqueue_batch(self, batch):
+        # POST /jobs/owner/{owner_name}/queue/{queue_id}/batch with a list of jobs, the server
+        # responds with a list of per job results in the same order, failed ones carry 'error'
+        # only when the endpoint is not there None is returned, for jobs to be sent one by one
+        def failed(reason):
+            error = 'Batch request failed, jobs in it may have been enqueued: %s' % reason
+            return [(line_no, job, error) for line_no, job in batch]
+
+        try:
+            r = self._session.post(url=self._url + '/batch', json=[job for _, job in batch])
+        except requests.RequestException as e:
+            return failed(e)
+
+        if r.status_code in (404, 405, 501):
+            with self._lock:
+                self._batch_supported = False
+            return None
+        elif r.status_code != 200:
+            return failed('%s %s' % (r.status_code, r.text))
+
+        try:
+            results = json.loads(r.text)
+        except ValueError:
+            return failed('invalid response: %s' % r.text[:200])
+
+        if not isinstance(results, list) or len(results) != len(batch):
+            return failed('response does not have one result per job')
+
+        return [(line_no, job, res.get('error') if isinstance(res, dict) else None)
+                for (line_no, job), res in zip(batch, results)]
+
+
+def bulk_enqueue(jess_url, queue_owner, queue_id, stream, concurrency=8, batch_size=100, reject=None):
+    """
+    Stream jobs from NDJSON text stream into the queue
+    :param reject: text stream to write rejected jobs into, one JSON object per line
+    :return: (number of enqueued jobs, number of rejected jobs)
+    """
+    enqueuer = BulkEnqueuer(jess_url, queue_owner, queue_id,
+                            session=make_session(concurrency), batch_size=batch_size)
+    counts = {'enqueued': 0, 'rejected': 0}
+
+    def rejected(line_no, job, error):
+        counts['rejected'] += 1
+        if reject:
+            reject.write(json.dumps({'line': line_no, 'error': error, 'job': job}) + '\n')
+
+    def valid_jobs():
+        for line_no, job, error in iter_ndjson(stream):
+            if error:
+                rejected(line_no, job, error)
+            else:
+                yield line_no, job
+
+    for batch, results, err in run_bounded(enqueuer.enqueue,
+                                           iter_batches(valid_jobs(), max(batch_size, 1)),
+                                           concurrency=concurrency):
+        if err:
+            results = [(line_no, job, str(err)) for line_no, job in batch]
+
+        for line_no, job, error in results:
+            if error:
+                rejected(line_no, job, error)
+            else:
+                counts['enqueued'] += 1
+
+    return counts['enqueued'], counts['rejected']
+
+
+class RateLimiter(object):
+    """
+    Token bucket shared by threads, allows `rate` calls per second on average with bursts of up to `burst`
+    """
+    def __init__(self, rate, burst=None):
+        self._rate = float(rate)
+        self._burst = float(burst if burst else max(rate, 1))
+        self._tokens = self._burst
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self._rate
+            sleep(wait_time)
+
+
+def iter_job_ids(stream):
+    """
+    Read job IDs from a text stream, one per line, blank lines and lines starting with '#' are skipped
+    """
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def bulk_job_action(jess_url, queue_owner, queue_id, job_ids, action, concurrency=8, rate=None, progress=None):
+    """
+    Perform action ('resume', 'reset', 'suspend' or 'delete') on many jobs
+    :param rate: max number of requests per second, no limit when not set
+    :param progress: callable called with (done, failed) counts as requests complete
+    :return: (number of succeeded jobs, list of (job_id, error) for failed jobs)
+    """
+    session = make_session(concurrency)
+    limiter = RateLimiter(rate) if rate else None
+
+    def act(job_id):
+        if limiter:
+            limiter.acquire()
+
+        url = "%s/jobs/owner/%s/queue/%s/job/%s" % (jess_url, queue_owner, queue_id, job_id)
+        if action == 'delete':
+            r = session.delete(url)
+        else:
+            r = session.put(url + '/action', json={'action': action})
+
+        if r.status_code != 200:
+            raise Exception(r.text)
+
+    succeeded, failed = 0, []
+    for job_id, _, err in run_bounded(act, job_ids, concurrency=concurrency):
+        if err:
+            failed.append((job_id, str(err)))
+        else:
+            succeeded += 1
+        if progress:
+            progress(succeeded + len(failed), len(failed))
+
+    return succeeded, failed
@@ -1,7 +1,12 @@
 import click
 import json
+import datetime
 import requests
-from .utils import job_json_to_tsv
+from time import sleep
+from jtracker.compression import ACCEPT_ENCODING, TransferStats, record_received
+from .bulk import bulk_enqueue, bulk_job_action, iter_job_ids
+from .watch import JobWatcher
+from .utils import REPORT_COLUMNS, REPORT_FORMATS, ReportWriter, job_report_rows, parse_columns
 
 
 @click.command()
@@ -10,34 +15,48 @@ from .utils import job_json_to_tsv
 @click.option('-t', '--with-task', is_flag=True, help='Report at task level')
 @click.option('-s', '--status', help='Job status',type=click.Choice(
     ['running', 'queued', 'completed', 'failed', 'suspended', 'cancelled', 'submitted', 'retry', 'resume']))
+@click.option('-f', '--format', 'fmt', type=click.Choice(REPORT_FORMATS), default='tsv',
+              help='Report format for simple write-out')
+@click.option('-c', '--columns', help='Comma separated report columns, available columns: %s' %
+                                      ', '.join(REPORT_COLUMNS))
+@click.option('--header', is_flag=True, help='Include header line in TSV report')
 @click.pass_context
-def ls(ctx, queue_id, status, owner, with_task):
+def ls(ctx, queue_id, status, owner, with_task, fmt, columns, header):
     """
     Listing workflow jobs in specified queue
     """
     jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
     owner = owner if owner else ctx.obj.get('JT_CONFIG').get('jt_account')
 
+    try:
+        columns = parse_columns(columns, with_task=with_task)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="'-c' / '--columns'")
+
     url = "%s/jobs/owner/%s/queue/%s" % (jess_url, owner, queue_id)
 
     if status:
         url = url + '?state=%s' % status
 
-    r = requests.get(url)
+    r = requests.get(url, headers={'Accept-Encoding': ACCEPT_ENCODING})
 
     if r.status_code != 200:
         click.echo('List job for: %s failed: %s' % (owner, r.text))
     else:
+        stats = TransferStats()
+        record_received(r, stats)
+        ctx.obj.get('LOGGER').debug('Job listing received, %s' % stats.summary())
         try:
             rv = json.loads(r.text)
             if isinstance(rv, (list, tuple)):
-                for j in rv:
-                    if ctx.obj.get('JT_WRITE_OUT') == 'simple':
-                        #click.echo("job_id: %s, status: %s" % (j.get('id'), j.get('state')))
-                        report_list = job_json_to_tsv(j, with_task=with_task)
-                        for l in report_list:
-                            click.echo('\t'.join([v if isinstance(v, str) else str(v) for v in l]))
-                    elif ctx.obj.get('JT_WRITE_OUT') == 'json':
+                if ctx.obj.get('JT_WRITE_OUT') == 'simple':
+                    writer = ReportWriter(click.get_text_stream('stdout'), fmt=fmt, columns=columns,
+                                          header=header or fmt == 'csv')
+                    for j in rv:
+                        writer.write(job_report_rows(j, columns=columns, with_task=with_task))
+                    writer.close()
+                elif ctx.obj.get('JT_WRITE_OUT') == 'json':
+                    for j in rv:
                         click.echo(json.dumps(j))
             else:
                 click.echo(rv)
@@ -45,6 +64,48 @@ def ls(ctx, queue_id, status, owner, with_task):
             click.echo("Error: %s" % err)
 
 
+@click.command()
+@click.option('-q', '--queue-id', required=True, help='Job queue ID')
+@click.option('-o', '--owner', help='Queue owner account name')
+@click.option('-i', '--interval', type=float, default=10, help='Time interval (in seconds) between refreshes')
+@click.option('-n', '--count', type=int, default=0, help='Number of refreshes, 0 to watch until interrupted')
+@click.pass_context
+def watch(ctx, queue_id, owner, interval, count):
+    """
+    Watch job state changes in specified queue
+    """
+    jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
+    owner = owner if owner else ctx.obj.get('JT_CONFIG').get('jt_account')
+
+    watcher = JobWatcher(jess_url, owner, queue_id)
+
+    n = 0
+    while True:
+        try:
+            transitions = watcher.poll()
+        except Exception as err:
+            click.echo("Error: %s" % err, err=True)
+            transitions = []
+
+        now = datetime.datetime.now().strftime('%H:%M:%S')
+        if ctx.obj.get('JT_WRITE_OUT') == 'json':
+            for job_id, job_name, old, new in transitions:
+                click.echo(json.dumps({'time': now, 'id': job_id, 'name': job_name, 'from': old, 'to': new}))
+        elif n > 0:  # the first listing is summarized by counters only
+            for job_id, job_name, old, new in transitions:
+                click.echo('%s\t%s\t%s\t%s -> %s' % (now, job_id, job_name, old or '_new_', new or '_removed_'))
+
+        if transitions or n == 0:
+            counters = watcher.counters()
+            click.echo('%s\ttotal: %s, %s' % (now, sum(counters.values()),
+                                              ', '.join('%s: %s' % (k, counters[k]) for k in sorted(counters))))
+
+        n += 1
+        if count and n >= count:
+            break
+        sleep(interval)
+
+
 @click.command()
 @click.option('-q', '--queue-id', required=True, help='Job queue ID')
 @click.option('-j', '--job-id', required=True, help='Job ID')
@@ -72,109 +133,149 @@ def get(ctx, queue_id, status, job_id, queue_owner):
         click.echo(r.text)
 
 
-@click.command()
-@click.option('-q', '--queue-id', required=True, help='Job queue ID')
-@click.option('-j', '--job-id', required=True, help='Job ID')
-@click.option('-o', '--queue-owner', help='Queue owner account name')
-@click.pass_context
-def delete(ctx, queue_id, job_id, queue_owner):
+def job_selector_options(fn):
     """
-    Delete workflow job that is 'queued' in specified queue with specified job_id
+    Options selecting jobs for bulk actions
+    """
+    options = [
+        click.option('-q', '--queue-id', required=True, help='Job queue ID'),
+        click.option('-j', '--job-id', multiple=True, help='Job ID, may be specified multiple times'),
+        click.option('-f', '--from-file', type=click.File('r'),
+                     help='File with one job ID per line, use - for stdin'),
+        click.option('-s', '--status', help='Select all jobs in the queue with the status', type=click.Choice(
+            ['running', 'queued', 'completed', 'failed', 'suspended', 'cancelled', 'submitted', 'retry', 'resume'])),
+        click.option('-o', '--queue-owner', help='Queue owner account name'),
+        click.option('-n', '--concurrency', type=click.IntRange(1, 64), default=8,
+                     help='Max number of concurrent requests'),
+        click.option('--rate', type=float, default=20, help='Max number of requests per second, 0 for no limit'),
+    ]
+    for option in reversed(options):
+        fn = option(fn)
+    return fn
+
+
+def select_job_ids(jess_url, queue_owner, queue_id, job_id, from_file, status):
     """
+    Generate job IDs selected by -j, -f and -s options, each job ID once even when selected more than once
+    """
+    seen = set()
+    for j in _selected_job_ids(jess_url, queue_owner, queue_id, job_id, from_file, status):
+        if j not in seen:
+            seen.add(j)
+            yield j
+
+
+def _selected_job_ids(jess_url, queue_owner, queue_id, job_id, from_file, status):
+    for j in job_id:
+        yield j
+
+    if from_file:
+        for j in iter_job_ids(from_file):
+            yield j
+
+    if status:
+        url = "%s/jobs/owner/%s/queue/%s?state=%s" % (jess_url, queue_owner, queue_id, status)
+        r = requests.get(url)
+        if r.status_code != 200:
+            click.echo('List job for: %s failed: %s' % (queue_owner, r.text), err=True)
+            return
+
+        for j in json.loads(r.text):
+            yield j.get('id')
+
 
+def job_action(ctx, action, queue_id, job_id, from_file, status, queue_owner, concurrency, rate):
     jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
     queue_owner = queue_owner if queue_owner else ctx.obj.get('JT_CONFIG').get('jt_account')
 
-    url = "%s/jobs/owner/%s/queue/%s/job/%s" % (jess_url, queue_owner, queue_id, job_id)
+    if not (job_id or from_file or status):
+        click.echo('Please select jobs with "-j", "-f" or "-s"')
+        ctx.exit()
 
-    r = requests.delete(url)
-    if r.status_code != 200:
-        click.echo('Failed: %s' % r.text)
-    else:
-        click.echo(r.text)
+    if len(set(job_id)) == 1 and not (from_file or status):  # single job, keep it simple
+        url = "%s/jobs/owner/%s/queue/%s/job/%s" % (jess_url, queue_owner, queue_id, job_id[0])
+        if action == 'delete':
+            r = requests.delete(url)
+        else:
+            r = requests.put(url + '/action', json={'action': action})
+
+        if r.status_code != 200:
+            click.echo('Failed: %s' % r.text)
+        else:
+            click.echo(r.text)
+        return
+
+    def progress(done, failed):
+        if done % 100 == 0:
+            click.echo('%s: %s jobs processed, %s failed' % (action, done, failed), err=True)
+
+    job_ids = select_job_ids(jess_url, queue_owner, queue_id, job_id, from_file, status)
+    succeeded, failed = bulk_job_action(jess_url, queue_owner, queue_id, job_ids, action,
+                                        concurrency=concurrency, rate=rate, progress=progress)
+
+    for j, err in failed:
+        click.echo('Failed: %s\t%s' % (j, err))
+    click.echo('%s: %s jobs processed, succeeded: %s, failed: %s' %
+               (action, succeeded + len(failed), succeeded, len(failed)))
 
 
 @click.command()
-@click.option('-q', '--queue-id', required=True, help='Job queue ID')
-@click.option('-j', '--job-id', required=True, help='Job ID')
-@click.option('-o', '--queue-owner', help='Queue owner account name')
+@job_selector_options
 @click.pass_context
-def resume(ctx, queue_id, job_id, queue_owner):
+def delete(ctx, **kwargs):
     """
-    Resume workflow job that is 'failed/cancelled/suspended' in specified queue with specified job_id
+    Delete workflow job that is 'queued' in specified queue with specified job_id
     """
+    # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/job/{job_id}
+    job_action(ctx, 'delete', **kwargs)
 
-    jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
-    queue_owner = queue_owner if queue_owner else ctx.obj.get('JT_CONFIG').get('jt_account')
-
-    url = "%s/jobs/owner/%s/queue/%s/job/%s/action" % (jess_url, queue_owner, queue_id, job_id)
-    request_body = {
-        'action': 'resume'
-    }
 
-    r = requests.put(url, json=request_body)
-    if r.status_code != 200:
-        click.echo('Failed: %s' % r.text)
-    else:
-        click.echo(r.text)
+@click.command()
+@job_selector_options
+@click.pass_context
+def resume(ctx, **kwargs):
+    """
+    Resume workflow job that is 'failed/cancelled/suspended' in specified queue with specified job_id
+    """
+    # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/job/{job_id}/action
+    job_action(ctx, 'resume', **kwargs)
 
 
 @click.command()
-@click.option('-q', '--queue-id', required=True, help='Job queue ID')
-@click.option('-j', '--job-id', required=True, help='Job ID')
-@click.option('-o', '--queue-owner', help='Queue owner account name')
+@job_selector_options
 @click.pass_context
-def reset(ctx, queue_id, job_id, queue_owner):
+def reset(ctx, **kwargs):
     """
     Reset workflow job that is 'failed/cancelled/suspended' in specified queue with specified job_id
     """
-
-    jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
-    queue_owner = queue_owner if queue_owner else ctx.obj.get('JT_CONFIG').get('jt_account')
-
-    url = "%s/jobs/owner/%s/queue/%s/job/%s/action" % (jess_url, queue_owner, queue_id, job_id)
-    request_body = {
-        'action': 'reset'
-    }
-
-    r = requests.put(url, json=request_body)
-    if r.status_code != 200:
-        click.echo('Failed: %s' % r.text)
-    else:
-        click.echo(r.text)
+    # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/job/{job_id}/action
+    job_action(ctx, 'reset', **kwargs)
 
 
 @click.command()
-@click.option('-q', '--queue-id', required=True, help='Job queue ID')
-@click.option('-j', '--job-id', required=True, help='Job ID')
-@click.option('-o', '--queue-owner', help='Queue owner account name')
+@job_selector_options
 @click.pass_context
-def suspend(ctx, queue_id, job_id, queue_owner):
+def suspend(ctx, **kwargs):
     """
     Suspend a queued job
     """
     # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/job/{job_id}/action
-    jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
-    queue_owner = queue_owner if queue_owner else ctx.obj.get('JT_CONFIG').get('jt_account')
-
-    url = "%s/jobs/owner/%s/queue/%s/job/%s/action" % (jess_url, queue_owner, queue_id, job_id)
-    request_body = {
-        'action': 'suspend'
-    }
-
-    r = requests.put(url, json=request_body)
-    if r.status_code != 200:
-        click.echo('Failed: %s' % r.text)
-    else:
-        click.echo(r.text)
+    job_action(ctx, 'suspend', **kwargs)
 
 
 @click.command()
 @click.option('-q', '--queue-id', required=True, help='Job queue ID')
-@click.option('-j', '--job-json', required=True, help='Job JSON string or file')
+@click.option('-j', '--job-json', help='Job JSON string or file')
+@click.option('-f', '--from-file', type=click.File('r'),
+              help='Newline delimited JSON file with one job per line, use - for stdin')
+@click.option('-n', '--concurrency', type=click.IntRange(1, 64), default=8,
+              help='Max number of concurrent requests when enqueuing from file')
+@click.option('-b', '--batch-size', type=click.IntRange(1, 1000), default=100,
+              help='Number of jobs per batch request when enqueuing from file')
+@click.option('-r', '--reject-file', type=click.File('w'), help='File to record jobs failed to enqueue')
 @click.option('-o', '--queue-owner', help='Queue owner account name')
 @click.pass_context
-def add(ctx, queue_id, job_json, queue_owner):
+def add(ctx, queue_id, job_json, from_file, concurrency, batch_size, reject_file, queue_owner):
     """
     Enqueue new job to specified queue
     """
@@ -182,6 +283,22 @@ def add(ctx, queue_id, job_json, queue_owner):
     jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
     queue_owner = queue_owner if queue_owner else ctx.obj.get('JT_CONFIG').get('jt_account')
 
+    if (job_json is None) == (from_file is None):
+        click.echo('Please specify either "-j" or "-f"')
+        ctx.exit()
+
+    if from_file:
+        enqueued, rejected = bulk_enqueue(jess_url, queue_owner, queue_id, from_file,
+                                          concurrency=concurrency, batch_size=batch_size,
+                                          reject=reject_file or click.get_text_stream('stderr'))
+        click.echo('Enqueue jobs for: %s into queue: %s, succeeded: %s, failed: %s' %
+                   (queue_owner, queue_id, enqueued, rejected))
+        if rejected:
+            if reject_file:
+                click.echo('Failed jobs are recorded in: %s' % reject_file.name)
+            ctx.exit(1)
+        return
+
     url = "%s/jobs/owner/%s/queue/%s" % (jess_url, queue_owner, queue_id)
 
     try:  # try to decode as JSON first
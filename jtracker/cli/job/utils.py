@@ -1,39 +1,209 @@
+import io
+import re
+import csv
 import json
 import datetime
 
 
+# report columns in default order, job level columns come first
+REPORT_COLUMNS = ('job_id', 'job_name', 'job_state', 'task_name', 'task_state', 'task_run_num',
+                  'task_end_at', 'task_len', 'executor_id', 'node_id', 'node_ip')
+JOB_COLUMNS = REPORT_COLUMNS[:3]
+REPORT_FORMATS = ('tsv', 'csv', 'ndjson')
+
+# columns whose values come from the runs recorded in task_file
+_RUN_COLUMNS = frozenset(['task_run_num', 'task_end_at', 'task_len', 'executor_id', 'node_id', 'node_ip'])
+
+_JT_KEY = '"_jt_"'
+_JT_VALUE = re.compile(r'\s*:\s*')
+_RUN_END = re.compile(r'\s*}\s*(?:,\s*{|\])')  # a run is followed by the next run or the end of the list
+_decoder = json.JSONDecoder()
+
+
+def parse_columns(columns, with_task=False):
+    """
+    Turn comma separated column names into a tuple of report columns
+    :param columns: (string) eg, 'job_id,task_name,task_len', None for default columns
+    :param with_task: (bool) whether task level columns are reported
+    :return: tuple of column names
+    """
+    if not columns:
+        return REPORT_COLUMNS if with_task else JOB_COLUMNS
+
+    selected = tuple(c.strip() for c in columns.split(',') if c.strip())
+    unknown = [c for c in selected if c not in REPORT_COLUMNS]
+    if unknown:
+        raise ValueError("Unknown column(s): %s, available columns: %s" %
+                         (', '.join(unknown), ', '.join(REPORT_COLUMNS)))
+    if not with_task and [c for c in selected if c not in JOB_COLUMNS]:
+        raise ValueError("Task level columns require reporting at task level")
+
+    return selected
+
+
+def last_task_run(task_file, count_runs=True):
+    """
+    Extract number of runs and the '_jt_' block of the last run from task_file JSON string
+
+    Only the last '_jt_' block is decoded, the rest of task_file is scanned but not parsed. Every run in
+    the 'output' list ends with the '_jt_' block the worker adds after the task's own output, and a
+    '"_jt_"' counts only when it is a key: in a string its quotes are escaped, so strings in task input
+    or output that happen to contain '"_jt_"' do not count as runs.
+    :param count_runs: (bool) whether runs are counted, run_num is 1 otherwise
+    :return: (run_num, _jt_ dict), (0, None) when the task has not run
+    """
+    if not task_file:
+        return 0, None
+
+    jt = None
+    pos = task_file.rfind(_JT_KEY)
+    while pos != -1 and jt is None:
+        value = _jt_value(task_file, pos)
+        if value is not None:
+            jt = _run_jt_block(task_file, value)
+        pos = task_file.rfind(_JT_KEY, 0, pos)
+
+    if jt is None:
+        return 0, None
+    if not count_runs:
+        return 1, jt
+
+    run_num = 1
+    while pos != -1:
+        if _jt_value(task_file, pos) is not None:
+            run_num += 1
+        pos = task_file.rfind(_JT_KEY, 0, pos)
+    return run_num, jt
+
+
+def _jt_value(task_file, pos):
+    """
+    :return: position of the value when the '"_jt_"' at pos is a key, None otherwise, eg, when it is the
+             end of a string ending with '\\"_jt_'
+    """
+    i = pos - 1
+    while i >= 0 and task_file[i] in ' \t\r\n':
+        i -= 1
+    if i < 0 or task_file[i] not in '{,':
+        return None
+
+    m = _JT_VALUE.match(task_file, pos + len(_JT_KEY))
+    return m.end() if m else None
+
+
+def _run_jt_block(task_file, pos):
+    # the '_jt_' block at pos, None when it is not the last member of an object in a list as in a run
+    try:
+        block, end = _decoder.raw_decode(task_file, pos)
+    except ValueError:
+        return None
+    if not isinstance(block, dict) or not _RUN_END.match(task_file, end):
+        return None
+    return block
+
+
+def job_report_rows(job_json, columns=JOB_COLUMNS, with_task=False):
+    """
+    Generate report rows for a job, each row is a tuple of values in the order of columns,
+    None is used for values not available
+    """
+    job_values = {
+        'job_id': job_json.get('id'),
+        'job_name': job_json.get('name'),
+        'job_state': job_json.get('state')
+    }
+
+    if not with_task:
+        yield tuple(job_values.get(c) for c in columns)
+        return
+
+    run_columns = _RUN_COLUMNS.intersection(columns)
+    count_runs = 'task_run_num' in run_columns
+
+    for task_name, task in (job_json.get('tasks') or {}).items():
+        values = dict(job_values)
+        values['task_name'] = task_name
+        values['task_state'] = task.get('state')
+
+        if run_columns:
+            run_num, jt = last_task_run(task.get('task_file'), count_runs=count_runs)
+            if jt:
+                values['task_run_num'] = run_num
+                values['executor_id'] = jt.get('executor_id')
+                values['node_id'] = jt.get('node_id')
+                values['node_ip'] = jt.get('node_ip')
+                wall_time = jt.get('wall_time') or {}
+                if wall_time.get('end') is not None:  # not there while the task runs
+                    if 'task_end_at' in run_columns:
+                        values['task_end_at'] = datetime.datetime.utcfromtimestamp(wall_time['end']).isoformat()
+                    if wall_time.get('start') is not None:
+                        values['task_len'] = wall_time['end'] - wall_time['start']
+
+        yield tuple(values.get(c) for c in columns)
+
+
+class ReportWriter(object):
+    """
+    Write report rows to a text stream in TSV, CSV or NDJSON format, rows are buffered
+    and written out in batches
+    """
+    def __init__(self, out, fmt='tsv', columns=JOB_COLUMNS, batch_size=1000, header=False):
+        if fmt not in REPORT_FORMATS:
+            raise ValueError("Unsupported report format: %s" % fmt)
+
+        self._out = out
+        self._fmt = fmt
+        self._columns = tuple(columns)
+        self._batch_size = batch_size
+        self._buffer = io.StringIO()
+        self._buffered = 0
+        self._rows = 0
+
+        if fmt == 'csv':
+            self._csv = csv.writer(self._buffer, lineterminator='\n')
+            if header:
+                self._csv.writerow(self._columns)
+        elif fmt == 'tsv' and header:
+            self._buffer.write('\t'.join(self._columns) + '\n')
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def write(self, rows):
+        fmt = self._fmt
+        buf = self._buffer
+        for row in rows:
+            if fmt == 'tsv':
+                buf.write('\t'.join(['_null_' if v is None else v if isinstance(v, str) else str(v)
+                                     for v in row]))
+                buf.write('\n')
+            elif fmt == 'csv':
+                self._csv.writerow(['_null_' if v is None else v for v in row])
+            else:
+                buf.write(json.dumps(dict(zip(self._columns, row))))
+                buf.write('\n')
+
+            self._rows += 1
+            self._buffered += 1
+            if self._buffered >= self._batch_size:
+                self.flush()
+
+    def flush(self):
+        if self._buffer.tell():
+            self._out.write(self._buffer.getvalue())
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        self._buffered = 0
+        self._out.flush()
+
+    def close(self):
+        self.flush()
+
+
 def job_json_to_tsv(job_json, with_task=False):
-    ret = []
     # convert job json to list of fields
     # TSV fields: job_id, job_name, job_state, task_name, task_state, task_run_num, task_end_at, task_len executor_id, node_id
-    job_id = job_json.get('id')
-    job_name = job_json.get('name')
-    job_state = job_json.get('state')
-    if with_task:
-        for t in job_json.get('tasks'):
-            task_name = t
-            task = job_json.get('tasks').get(t)
-            task_state = task.get('state')
-            task_file = json.loads(task.get('task_file'))
-            executor_id = '_null_'
-            node_id = '_null_'
-            node_ip = '_null_'
-            task_run_num = '_null_'
-            task_end_at = '_null_'
-            task_len = '_null_'
-            task_runs = task_file.get('output', [])
-            if task_runs:
-                task_run_num = len(task_runs)
-                executor_id = task_runs[-1]['_jt_']['executor_id']
-                node_id = task_runs[-1]['_jt_']['node_id']
-                node_ip = task_runs[-1]['_jt_'].get('node_ip', '_null_')
-                seconds_since_epoch = task_runs[-1]['_jt_']['wall_time']['end']
-                task_end_at = datetime.datetime.utcfromtimestamp(seconds_since_epoch).isoformat()
-                task_len = task_runs[-1]['_jt_']['wall_time']['end'] - task_runs[-1]['_jt_']['wall_time']['start']
-            ret.append([job_id, job_name, job_state, task_name, task_state,
-                        task_run_num, task_end_at, task_len, executor_id, node_id, node_ip])
-
-    else:
-        ret.append([job_id, job_name, job_state])
-
-    return ret
+    columns = REPORT_COLUMNS if with_task else JOB_COLUMNS
+    return [['_null_' if v is None else v for v in row]
+            for row in job_report_rows(job_json, columns=columns, with_task=with_task)]
@@ -0,0 +1,92 @@
+import json
+from time import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+import requests
+
+
+class JobWatcher(object):
+    """
+    Keep a snapshot of job states in a queue and poll JESS for changes.
+
+    When the server tags job listings with ETag, every poll is a conditional request with
+    If-None-Match, an unchanged queue costs a 304 response. Otherwise, once a snapshot exists,
+    only jobs changed since the last poll are asked for with the 'since' parameter. A server
+    ignoring 'since' returns the full listing, which is handled the same way. Removed jobs can only
+    be seen in full listings, so a full listing is requested every `full_every` polls.
+    """
+    def __init__(self, jess_url, queue_owner, queue_id, session=None, full_every=30):
+        self._url = "%s/jobs/owner/%s/queue/%s" % (jess_url, queue_owner, queue_id)
+        self._session = session if session else requests.Session()
+        self._full_every = full_every
+        self._snapshot = {}  # job_id => (job_name, job_state)
+        self._etag = None
+        self._since = None
+        self._since_supported = True
+        self._polls = 0
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def counters(self):
+        return Counter(state for _, state in self._snapshot.values())
+
+    def poll(self):
+        """
+        :return: list of (job_id, job_name, old_state, new_state), old_state is None for new job,
+                 new_state is None for removed job. Empty list when nothing changed.
+        """
+        full = not self._snapshot or self._etag or not self._since_supported or \
+            self._polls % self._full_every == 0
+        self._polls += 1
+
+        params = {} if full else {'since': self._since}
+        headers = {'If-None-Match': self._etag} if self._etag else {}
+
+        started_at = time()
+        r = self._session.get(self._url, params=params, headers=headers)
+
+        if r.status_code == 400 and params:  # server does not take 'since'
+            self._since_supported = False
+            return self.poll()
+        elif r.status_code == 304:
+            return []
+        elif r.status_code != 200:
+            raise Exception('List job failed: %s' % r.text)
+
+        self._since = self._server_time(r, started_at)
+        if full:
+            self._etag = r.headers.get('ETag')
+
+        jobs = json.loads(r.text) if r.text else []
+        if not isinstance(jobs, list):
+            raise Exception('Unexpected job listing: %s' % r.text)
+
+        return self._update(jobs, full)
+
+    def _update(self, jobs, full):
+        transitions = []
+        seen = set()
+        for j in jobs:
+            job_id, job_name, state = j.get('id'), j.get('name'), j.get('state')
+            seen.add(job_id)
+            old = self._snapshot.get(job_id)
+            if old is None or old[1] != state:
+                transitions.append((job_id, job_name, old[1] if old else None, state))
+                self._snapshot[job_id] = (job_name, state)
+
+        if full:
+            for job_id in [j for j in self._snapshot if j not in seen]:
+                job_name, state = self._snapshot.pop(job_id)
+                transitions.append((job_id, job_name, state, None))
+
+        return transitions
+
+    @staticmethod
+    def _server_time(r, default):
+        # use server clock when available so that 'since' is not affected by clock skew
+        try:
+            return int(parsedate_to_datetime(r.headers['Date']).timestamp()) - 1
+        except (KeyError, TypeError, ValueError):
+            return int(default) - 1
@@ -1,5 +1,8 @@
 import click
+import json
 import requests
+from jtracker.utils import iter_json_array
+from .stats import QueueStats
 
 
 @click.command()
@@ -18,7 +21,8 @@ def ls(ctx, owner, queue_id):
     if queue_id:
         url += '/queue/%s' % queue_id
 
-    r = requests.get(url)
+    cache = ctx.obj.get('JT_CACHE')
+    r = cache.get(url, 'queues') if cache else requests.get(url)
 
     if r.status_code != 200:
         click.echo('List job queue for: %s failed: %s' % (owner, r.text))
@@ -26,6 +30,59 @@ def ls(ctx, owner, queue_id):
         click.echo(r.text)
 
 
+@click.command()
+@click.option('-q', '--queue-id', required=True, help='Job queue ID')
+@click.option('-o', '--owner', help='Queue owner account name')
+@click.pass_context
+def stats(ctx, queue_id, owner):
+    """
+    Report throughput, task duration and failure statistics of a queue
+    """
+    jess_url = ctx.obj.get('JT_CONFIG').get('jess_server')
+    owner = owner if owner else ctx.obj.get('JT_CONFIG').get('jt_account')
+
+    url = "%s/jobs/owner/%s/queue/%s" % (jess_url, owner, queue_id)
+
+    r = requests.get(url, stream=True)
+    if r.status_code != 200:
+        click.echo('List job for: %s failed: %s' % (owner, r.text))
+        return
+
+    queue_stats = QueueStats()
+    try:
+        for job in iter_json_array(r.iter_content(chunk_size=65536)):
+            queue_stats.add(job)
+    except Exception as err:
+        click.echo("Error: %s" % err)
+        return
+
+    summary = queue_stats.summary()
+    if ctx.obj.get('JT_WRITE_OUT') == 'json':
+        click.echo(json.dumps(summary))
+        return
+
+    def fmt(v, f='%.1f'):
+        return '_null_' if v is None else f % v
+
+    click.echo('jobs: %s (%s)' % (summary['jobs'], ', '.join('%s: %s' % (k, v)
+                                                              for k, v in sorted(summary['job_states'].items()))))
+    click.echo('completed jobs per hour: %s' % fmt(summary['jobs_per_hour']))
+    wait = summary['queue_wait']
+    click.echo('queue wait (s): %s' % ('_null_' if not wait else
+                                       'p50: %s, p95: %s, p99: %s' % (fmt(wait['p50']), fmt(wait['p95']),
+                                                                      fmt(wait['p99']))))
+    click.echo()
+    click.echo('\t'.join(['task_name', 'count', 'failure_rate', 'reruns', 'mean', 'p50', 'p95', 'p99']))
+    for name, t in summary['tasks'].items():
+        click.echo('\t'.join([name, str(t['count']), fmt(t['failure_rate'], '%.3f'), str(t['reruns']),
+                              fmt(t['mean']), fmt(t['p50']), fmt(t['p95']), fmt(t['p99'])]))
+    click.echo()
+    click.echo('\t'.join(['node_id', 'tasks', 'failure_rate', 'busy_hours', 'tasks_per_hour']))
+    for node, n in summary['nodes'].items():
+        click.echo('\t'.join([str(node), str(n['tasks']), fmt(n['failure_rate'], '%.3f'),
+                              fmt(n['busy_hours'], '%.2f'), fmt(n['tasks_per_hour'])]))
+
+
 @click.command()
 @click.option('-n', '--wf-name', required=True, help='Workflow name')
 @click.option('-v', '--wf-version', required=True, help='Workflow version')
@@ -45,6 +102,8 @@ def add(ctx, wf_name, wf_version, wf_owner):
     if r.status_code != 200:
         click.echo('Queue creation for: %s failed: %s' % (wf_owner, r.text))
     else:
+        if ctx.obj.get('JT_CACHE'):
+            ctx.obj.get('JT_CACHE').invalidate('queues')
         click.echo("Queue registration succeeded, details as below")
         click.echo(r.text)
 
@@ -102,4 +161,8 @@ def update_queue_state(ctx, queue_id, action):
         'action': action
     }
 
-    return requests.put(url, json=request_body)
+    r = requests.put(url, json=request_body)
+    if r.status_code == 200 and ctx.obj.get('JT_CACHE'):
+        ctx.obj.get('JT_CACHE').invalidate('queues')
+
+    return r
@@ -0,0 +1,159 @@
+import math
+import datetime
+from collections import defaultdict
+from jtracker.cli.job.utils import last_task_run
+
+
+class QuantileSketch(object):
+    """
+    Streaming quantile sketch with relative accuracy (log-bucketed histogram).
+
+    Values are counted in buckets whose bounds grow geometrically, so any quantile is reported
+    within `relative_accuracy` of the true value. Memory is bounded by `max_buckets`, when
+    exceeded the lowest buckets are merged, which only affects accuracy of the lowest quantiles.
+    """
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._max_buckets = max_buckets
+        self._buckets = defaultdict(int)
+        self._zeros = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        if value <= 0:
+            self._zeros += 1
+            return
+
+        self._buckets[int(math.ceil(math.log(value) / self._log_gamma))] += 1
+        if len(self._buckets) > self._max_buckets:
+            keys = sorted(self._buckets)
+            self._buckets[keys[1]] += self._buckets.pop(keys[0])
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0
+        for k in sorted(self._buckets):
+            seen += self._buckets[k]
+            if rank < seen:
+                value = 2 * self._gamma ** k / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+def _timestamp(value):
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class QueueStats(object):
+    """
+    Aggregate throughput, latency and failure statistics over jobs in a queue, jobs are
+    added one at a time and only aggregates are kept
+    """
+    # job fields that may carry the time a job was enqueued
+    SUBMITTED_AT_FIELDS = ('submitted_at', 'created_at', 'queued_at')
+
+    def __init__(self):
+        self.jobs = 0
+        self.job_states = defaultdict(int)
+        self.tasks = defaultdict(lambda: {'completed': 0, 'failed': 0, 'runs': 0,
+                                          'duration': QuantileSketch()})
+        self.nodes = defaultdict(lambda: {'completed': 0, 'failed': 0, 'busy': 0, 'first': None, 'last': None})
+        self.queue_wait = QuantileSketch()
+        self.first_start = None
+        self.last_end = None
+        self.completed_jobs = 0
+
+    def add(self, job):
+        self.jobs += 1
+        self.job_states[job.get('state')] += 1
+        if job.get('state') == 'completed':
+            self.completed_jobs += 1
+
+        job_start = None
+        for task_name, task in (job.get('tasks') or {}).items():
+            run_num, jt = last_task_run(task.get('task_file'))
+            if not jt:
+                continue
+
+            wall_time = jt.get('wall_time') or {}
+            start, end = wall_time.get('start'), wall_time.get('end')
+            if start is None or end is None:
+                continue  # still running, or ended without timing recorded
+            failed = jt.get('state') == 'failed' or task.get('state') == 'failed'
+
+            t = self.tasks[task_name]
+            t['runs'] += run_num
+            t['failed' if failed else 'completed'] += 1
+            t['duration'].add(end - start)
+
+            n = self.nodes[jt.get('node_id')]
+            n['failed' if failed else 'completed'] += 1
+            n['busy'] += end - start
+            n['first'] = start if n['first'] is None else min(n['first'], start)
+            n['last'] = end if n['last'] is None else max(n['last'], end)
+
+            job_start = start if job_start is None else min(job_start, start)
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+        submitted_at = None
+        for f in self.SUBMITTED_AT_FIELDS:
+            if job.get(f) is not None:
+                submitted_at = _timestamp(job.get(f))
+                break
+        if job_start is not None and submitted_at is not None:
+            self.queue_wait.add(max(job_start - submitted_at, 0))
+
+    @property
+    def span_hours(self):
+        if self.first_start is None or self.last_end <= self.first_start:
+            return None
+        return (self.last_end - self.first_start) / 3600
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        def q(sketch):
+            return dict(('p%s' % int(round(x * 100)), sketch.quantile(x)) for x in quantiles)
+
+        span = self.span_hours
+        return {
+            'jobs': self.jobs,
+            'job_states': dict(self.job_states),
+            'jobs_per_hour': self.completed_jobs / span if span else None,
+            'queue_wait': dict(q(self.queue_wait), count=self.queue_wait.count) if self.queue_wait.count else None,
+            'tasks': dict((name, dict(q(t['duration']),
+                                      count=t['completed'] + t['failed'],
+                                      mean=t['duration'].mean,
+                                      reruns=t['runs'] - t['completed'] - t['failed'],
+                                      failure_rate=t['failed'] / (t['completed'] + t['failed'])))
+                          for name, t in sorted(self.tasks.items())),
+            'nodes': dict((node, {
+                'tasks': n['completed'] + n['failed'],
+                'failure_rate': n['failed'] / (n['completed'] + n['failed']),
+                'busy_hours': n['busy'] / 3600,
+                'tasks_per_hour': (n['completed'] + n['failed']) * 3600 / (n['last'] - n['first'])
+                if n['last'] > n['first'] else None
+            }) for node, n in sorted(self.nodes.items(), key=lambda i: str(i[0])))
+        }
@@ -15,7 +15,8 @@ def ls(ctx, owner):
 
     url = "%s/workflows/owner/%s" % (wrs_url, owner)
 
-    r = requests.get(url)
+    cache = ctx.obj.get('JT_CACHE')
+    r = cache.get(url, 'workflows') if cache else requests.get(url)
     if r.status_code != 200:
         click.echo('Workflow for: %s not found: %s' % (owner, r.text))
     else:
@@ -57,5 +58,7 @@ def register(ctx, git_server, git_account, git_repo, git_path, git_tag, wf_name,
     if r.status_code != 200:
         click.echo('Workflow registration failed: %s' % r.text)
     else:
+        if ctx.obj.get('JT_CACHE'):
+            ctx.obj.get('JT_CACHE').invalidate('workflows')
         click.echo("Workflow registration succeeded, details as below")
         click.echo(r.text)
@@ -0,0 +1,82 @@
+import gzip
+import json
+from urllib.parse import urlsplit
+import requests
+
+
+ACCEPT_ENCODING = 'gzip'  # asked for explicitly on responses that can be large, eg, job listings
+DEFAULT_MIN_SIZE = 16 * 1024  # in bytes, smaller request bodies are sent uncompressed
+
+_rejecting_servers = set()  # servers that answered a gzip request body with 415, sent uncompressed since
+
+
+def _server(url):
+    parts = urlsplit(url)
+    return '%s://%s' % (parts.scheme, parts.netloc)
+
+
+class TransferStats(object):
+    """
+    Bytes of request and response bodies before and after compression, optionally also counted in
+    metrics as payload_bytes_total and payload_bytes_saved_total by direction
+    """
+    def __init__(self, metrics=None):
+        self._metrics = metrics
+        self._bytes = {'sent': [0, 0], 'received': [0, 0]}  # direction => [uncompressed, on the wire]
+
+    def record(self, direction, size, wire_size):
+        self._bytes[direction][0] += size
+        self._bytes[direction][1] += wire_size
+        if self._metrics is not None:
+            self._metrics.inc('payload_bytes_total', wire_size, direction=direction)
+            self._metrics.inc('payload_bytes_saved_total', max(0, size - wire_size), direction=direction)
+
+    def saved(self, direction=None):
+        directions = [direction] if direction else list(self._bytes)
+        return sum(max(0, self._bytes[d][0] - self._bytes[d][1]) for d in directions)
+
+    def summary(self):
+        return ', '.join('%s: %s bytes (%s uncompressed)' % (d, b[1], b[0])
+                         for d, b in sorted(self._bytes.items()) if b[0])
+
+
+def send_json(method, url, obj, min_size=DEFAULT_MIN_SIZE, stats=None, **kwargs):
+    """
+    Send obj as JSON request body, gzip'ed when it is at least min_size bytes (0 to never compress).
+    A server answering the compressed body with 415 Unsupported Media Type gets it again uncompressed,
+    and all later bodies uncompressed.
+    :return: requests.Response
+    """
+    data = json.dumps(obj).encode()
+    headers = dict(kwargs.pop('headers', None) or {}, **{'Content-Type': 'application/json'})
+
+    if min_size and len(data) >= min_size and _server(url) not in _rejecting_servers:
+        body = gzip.compress(data, compresslevel=6)
+        r = requests.request(method, url, data=body,
+                             headers=dict(headers, **{'Content-Encoding': 'gzip'}), **kwargs)
+        if r.status_code != 415:
+            if stats:
+                stats.record('sent', len(data), len(body))
+            return r
+        _rejecting_servers.add(_server(url))
+
+    r = requests.request(method, url, data=data, headers=headers, **kwargs)
+    if stats:
+        stats.record('sent', len(data), len(data))
+    return r
+
+
+def record_received(r, stats, size=None):
+    """
+    Count body of response r in stats, after its content is read
+    :param size: uncompressed size, when the body was streamed instead of read into r.content
+    """
+    if not stats:
+        return
+    if size is None:
+        size = len(r.content)
+    try:
+        wire_size = r.raw.tell()  # bytes read from the connection, compressed when Content-Encoding says so
+    except (AttributeError, OSError, ValueError):
+        wire_size = size
+    stats.record('received', size, wire_size or size)
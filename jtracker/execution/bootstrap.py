@@ -0,0 +1,54 @@
+import os
+import glob
+import json
+from time import time
+
+
+BOOTSTRAP_FILE = 'bootstrap.json'  # in node dir
+BOOTSTRAP_TTL = 24 * 3600  # seconds cached queue to workflow mapping is used before it is looked up again
+
+
+def load_bootstrap(jt_home, jt_account, ams_server, jess_server):
+    """
+    Look up results of the last executor start on this node for the account: account ID and the workflow of
+    each queue, so they need not be asked from the servers again
+    :return: dict with 'account_id' and 'queues' (queue_id => workflow info), empty when nothing is cached
+    """
+    for path in glob.glob(os.path.join(jt_home, 'account.*', 'node', BOOTSTRAP_FILE)):
+        try:
+            with open(path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        if (cached.get('account_name'), cached.get('ams_server'), cached.get('jess_server')) != \
+                (jt_account, ams_server, jess_server):
+            continue
+
+        queues = dict((q, info) for q, info in (cached.get('queues') or {}).items()
+                      if time() - info.get('cached_at', 0) < BOOTSTRAP_TTL)
+        return {'account_id': cached.get('account_id'), 'queues': queues}
+    return {}
+
+
+def save_bootstrap(node_dir, jt_account, ams_server, jess_server, account_id, schedulers, cached_queues=()):
+    """
+    Keep account ID and workflows of the queues of the schedulers for the next executor start
+    :param cached_queues: queues whose workflow came from the cache, their entries are kept as they are
+    """
+    path = os.path.join(node_dir, BOOTSTRAP_FILE)
+    try:
+        with open(path, 'r') as f:
+            queues = json.load(f).get('queues') or {}
+    except (OSError, ValueError):
+        queues = {}
+
+    for scheduler in schedulers:
+        if scheduler.queue_id not in cached_queues or scheduler.queue_id not in queues:
+            queues[scheduler.queue_id] = dict(scheduler.workflow_info, cached_at=time())
+
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump({'account_name': jt_account, 'ams_server': ams_server, 'jess_server': jess_server,
+                   'account_id': account_id, 'queues': queues}, f)
+    os.replace(tmp_path, path)
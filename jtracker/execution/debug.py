@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import errno
+import signal
+import threading
+import traceback
+import faulthandler
+from time import time, sleep
+from collections import Counter
+
+
+DEBUG_DIR = '_debug'
+
+
+def _debug_dir(executor_dir):
+    path = os.path.join(executor_dir, DEBUG_DIR)
+    try:
+        os.makedirs(path)
+    except OSError as e:  # Guard against race condition
+        if e.errno != errno.EEXIST:
+            raise
+    return path
+
+
+def thread_stacks():
+    """
+    :return: dict, thread name => formatted stack of every thread in the current process
+    """
+    names = dict((t.ident, t.name) for t in threading.enumerate())
+    return dict(('%s (%s)' % (names.get(ident, 'unknown'), ident), ''.join(traceback.format_stack(frame)))
+                for ident, frame in sys._current_frames().items())
+
+
+def register_stack_dump(executor_dir, signum=signal.SIGUSR1):
+    """
+    Called in worker processes: dump stacks of all threads to _debug/stacks.{pid}.txt in executor
+    dir when signum is received. faulthandler writes from the signal handler itself, so it works
+    even when the worker is blocked in a system call.
+    """
+    f = open(os.path.join(_debug_dir(executor_dir), 'stacks.%s.txt' % os.getpid()), 'a')
+    faulthandler.register(signum, file=f, all_threads=True, chain=False)
+    return f
+
+
+class SamplingProfiler(object):
+    """
+    Statistical profiler: a background thread samples stacks of all other threads every interval
+    seconds and counts them, results are written in folded format, one stack per line followed by
+    its sample count, as consumed by flamegraph.pl and speedscope
+    """
+    def __init__(self, interval=0.01):
+        self._interval = interval
+        self._samples = Counter()
+        self._running = False
+        self._thread = None
+        self._started_at = None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def samples(self):
+        return self._samples
+
+    def start(self):
+        self._samples = Counter()
+        self._running = True
+        self._started_at = time()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        return time() - self._started_at
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {}
+        while self._running:
+            frames = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = dict((t.ident, t.name) for t in threading.enumerate())
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame:
+                    code = frame.f_code
+                    stack.append('%s (%s:%s)' % (code.co_name, os.path.basename(code.co_filename),
+                                                 code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._samples[';'.join(reversed(stack))] += 1
+            sleep(self._interval)
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self._samples.most_common():
+                f.write('%s %s\n' % (stack, count))
+
+
+class DebugSignalHandler(object):
+    """
+    Inspect a running executor without stopping it:
+
+        kill -USR1 <executor pid>   write snapshot of executor state and stacks of all threads, and
+                                    ask worker processes to dump their stacks
+        kill -USR2 <executor pid>   start sampling profiler, send again to stop it and write profile
+
+    All output goes to _debug dir in the executor dir. The signal handlers only flag the request, a
+    background thread picks it up within CHECK_INTERVAL seconds: taking locks or logging in a handler
+    may deadlock when the signal lands while the main thread holds the same lock. Being a thread of its
+    own, it also answers while the executor is stuck, eg, in a server call.
+    """
+    CHECK_INTERVAL = 0.2
+
+    def __init__(self, executor, logger, interval=0.01):
+        self.executor = executor
+        self.logger = logger
+        self.profiler = SamplingProfiler(interval=interval)
+        self._dump_requested = False
+        self._toggle_requested = False
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name='debug-signals', daemon=True)
+        self._thread.start()
+        signal.signal(signal.SIGUSR1, self.request_dump)
+        signal.signal(signal.SIGUSR2, self.request_profiler_toggle)
+
+    def request_dump(self, signum, frame):
+        self._dump_requested = True
+
+    def request_profiler_toggle(self, signum, frame):
+        self._toggle_requested = True
+
+    def stop(self):
+        self._running = False
+        if self.profiler.running:
+            self.profiler.stop()
+
+    def _serve(self):
+        while self._running:
+            sleep(self.CHECK_INTERVAL)
+            try:
+                if self._dump_requested:
+                    self._dump_requested = False
+                    self.dump()
+                if self._toggle_requested:
+                    self._toggle_requested = False
+                    self.toggle_profiler()
+            except Exception as e:
+                self.logger.warning('Unable to write debug output: %s' % e)
+
+    def dump(self):
+        debug_dir = _debug_dir(self.executor.executor_dir)
+        path = os.path.join(debug_dir, 'snapshot.%s.json' % int(time()))
+        snapshot = self.executor.snapshot()
+        snapshot['threads'] = thread_stacks()
+
+        tmp_path = '%s.tmp' % path
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+
+        for pid in snapshot['worker_pids']:
+            try:
+                os.kill(pid, signal.SIGUSR1)  # worker dumps its stacks to stacks.{pid}.txt
+            except OSError:
+                pass
+
+        self.logger.info('Executor snapshot written to: %s' % path)
+
+    def toggle_profiler(self):
+        if not self.profiler.running:
+            self.profiler.start()
+            self.logger.info('Sampling profiler started, send SIGUSR2 again to stop it.')
+            return
+
+        duration = self.profiler.stop()
+        path = os.path.join(_debug_dir(self.executor.executor_dir), 'profile.%s.folded' % int(time()))
+        self.profiler.write(path)
+        self.logger.info('Sampling profiler stopped after %.1f seconds, %s samples written to: %s' %
+                         (duration, sum(self.profiler.samples.values()), path))
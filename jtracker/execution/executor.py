@@ -11,12 +11,35 @@ import yaml
 import click
 import signal
 import socket
+import json
+import sqlite3
+import threading
 import multiprocessing
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 from uuid import uuid4
+from jtracker.retry import RetryPolicy
+from jtracker.compression import DEFAULT_MIN_SIZE
 from .scheduler import JessScheduler
 from .scheduler import LocalScheduler
 from .worker import Worker
+from .metrics import executor_metrics
+from .debug import DebugSignalHandler, register_stack_dump
+from .ledger import DiskLedger
+from .history import history_of, PeakDirSize
+from .locality import CacheManifest, rank_jobs
+from .reclaimer import Reclaimer, mark_job_finished, JOB_FINISHED_FILE
+from .markers import read_task_state, write_task_state
+from .logs import LogPipeline
+from .bootstrap import load_bootstrap, save_bootstrap
+from .worker import STAGED_FIELDS, task_output
+
+
+EVENT_POLL_INTERVAL = 60  # seconds between polls while following server events, to catch anything missed
+WAKE_CHECK_INTERVAL = 0.5  # seconds between checks for exited workers while waiting
+
+
+INTERRUPTED_FILE = '_interrupted.json'  # in executor dir, tasks stopped at shutdown before they were reported
 
 
 def get_node_ip():
@@ -38,12 +61,24 @@ class GracefulKiller:
         signal.signal(signal.SIGTERM, self.exit_gracefully)
 
     def exit_gracefully(self, signum, frame):
-        self.logger.info('Interruption signal received, will exit when the current running job finishes.')
+        # only flag it, logging from a signal handler may deadlock on the lock of the log queue,
+        # the executor loop logs when it sees the flag
         self.kill_now = True
 
 
 def work(worker, logger):
     proc_name = multiprocessing.current_process().name
+    try:
+        os.setpgid(0, 0)  # worker and everything its task starts are stopped together by the executor
+    except OSError:
+        pass
+    signal.signal(signal.SIGTERM, worker.interrupt)
+    signal.signal(signal.SIGUSR2, signal.SIG_IGN)  # profiler toggle is for the executor process only
+    try:
+        stack_dump_file = register_stack_dump(worker.executor_dir)  # kept open for the life of the worker
+    except OSError:
+        pass
+
     try:
         rv = worker.run()
         logger.info('Finish task: {} by worker: {}'.format(proc_name, worker.id))
@@ -62,21 +97,73 @@ class Executor(object):
                  job_file=None,  # when job_file is provided, it's local mode, no tracking from the server side
                  job_selector=None,  # can optionally specify which job to run, not applicable when job_file specified
                  min_disk=None, # minimally require disk space (in bytes) for launching task execution
+                 job_disk=None,  # expected disk footprint (in bytes) of a job reserved when it starts, min_disk by default
                  parallel_jobs=1, parallel_workers=1, polling_interval=10, max_jobs=0,
                  continuous_run=True, retries=2,
-                 force_restart=False, resume_job=False, logger=None):
+                 force_restart=False, resume_job=False, response_cache=None,
+                 retry_policy=None,  # retries and circuit breakers of server calls, shared by all queues
+                 gzip_min_size=DEFAULT_MIN_SIZE,  # task outputs of at least this many bytes are sent gzip'ed, 0 for never
+                 metrics_port=None, metrics_textfile=None,
+                 queue_weights=None,  # queue_id => weight of the queue in fair share of worker slots
+                 queue_policy='fair',  # 'fair' for weighted fair share, or 'priority' to favor queues in given order
+                 locality_candidates=20,  # queued jobs ranked by cached inputs when server does not, 0 to disable
+                 gc_action='keep',  # what to do with dirs of finished jobs: 'keep', 'delete' or 'compress'
+                 keep_completed_days=1, keep_failed_days=7, gc_interval=300,
+                 shutdown_grace=30,  # seconds tasks have to exit on SIGTERM at shutdown before SIGKILL
+                 task_timeout=None,  # seconds a task may run, unless set by 'timeout' in task runtime
+                 idle_timeout=None,  # seconds a task may go without output or CPU use, or by 'idle_timeout' in runtime
+                 memo=False,  # complete tasks with results of identical earlier runs on this node
+                 status_log_interval=60,  # seconds the same status line is not logged again, 0 to log every time
+                 server_events=True,  # wake up on events pushed by the server, polling when it has no event stream
+                 logger=None):
 
         self._killer = GracefulKiller(logger)
 
+        self._metrics = executor_metrics()
+        self._metrics_textfile = metrics_textfile
+        self._metrics.start_collector(textfile=metrics_textfile)
+        if metrics_port:
+            self._metrics.serve(metrics_port)
+
         # TODO: will need to verify jt_account
 
         self._jt_home = jt_home
         self._account_id = None
-        self._queue_id = queue_id
+        # one executor may serve multiple queues sharing the same pool of job and worker slots
+        if isinstance(queue_id, (list, tuple)):
+            self._queue_ids = list(dict.fromkeys(queue_id))  # each queue once, in the order given
+        else:
+            self._queue_ids = [queue_id] if queue_id else []
+        self._queue_id = self._queue_ids[0] if self._queue_ids else None
+        self._queue_weights = dict(queue_weights or {})
+        self._queue_policy = queue_policy
+        self._job_queues = {}  # job_id => queue_id
 
         self._parallel_jobs = parallel_jobs
         self._max_jobs = max_jobs
         self._min_disk = min_disk
+        self._job_disk = job_disk
+        self._disk_ledger = None
+        self._disk_reservations = {}  # job_id => reservation key in node disk ledger
+        self._histories = {}  # queue_id => TaskHistory
+        self._job_dirs = {}  # job_id => job dir, for jobs started by the executor not yet seen finished
+        self._job_peaks = {}  # job_id => PeakDirSize sampling the job dir while the job runs
+        self._predicted_wall_time = {}  # worker process => predicted wall time of its task
+        self._locality_candidates = locality_candidates
+        self._cache_manifests = {}  # queue_id => CacheManifest of its workflow data dir
+        self._reclaimer = Reclaimer([], action=gc_action, keep_completed_days=keep_completed_days,
+                                    keep_failed_days=keep_failed_days, logger=logger)
+        self._gc_interval = gc_interval
+        self._shutdown_grace = shutdown_grace
+        self._task_timeout = task_timeout
+        self._idle_timeout = idle_timeout
+        self._memo = memo
+        self._log_pipeline = LogPipeline(logger, rate_limit=status_log_interval)
+        self._server_events = server_events
+        self._wake = threading.Event()  # set by schedulers on server events
+        self._polling_queues = set()  # queues whose server has no event stream, logged once
+        self._workers = {}  # worker process => Worker
+        self._resumed_jobs = {}  # queue_id => IDs of jobs with tasks interrupted at last shutdown, picked up first
         self._parallel_workers = parallel_workers
         self._polling_interval = polling_interval
         self._ran_jobs = 0
@@ -88,56 +175,92 @@ class Executor(object):
         self._running_jobs = []
         self._worker_processes = {}
         self._logger = logger
-        self._node_ip = get_node_ip()
+        self._node_ip = None
 
         # params for server mode
         if self.queue_id and job_file is None:
             # the logic is a bit bad here, we need to get account_id for init jthome, and get node_id
-            self._scheduler = JessScheduler(jess_server=jess_server,
-                                            wrs_server=wrs_server,
-                                            ams_server=ams_server,
-                                            jt_account=jt_account,
-                                            queue_id=queue_id,
-                                            )
-
-            self._account_id = self.scheduler.account_id
-            self._jt_account = jt_account
-
-            # init jt_home dir
-            self._init_jt_home()
-
-            self._id = self.scheduler.register_executor(self.node_id, self.node_ip)  # reset executor ID to what server side return
-
-            # update job selector if supplied
-            if job_selector is not None:
-                self.scheduler.update_executor(action={
-                    'job_selector': job_selector
-                })
+            retry_policy = retry_policy if retry_policy else RetryPolicy()
+            # account ID and workflows of the queues are stable, known from the last start on this node if any
+            cached = load_bootstrap(jt_home, jt_account, ams_server, jess_server)
+            cached_queues = cached.get('queues', {})
+
+            with ThreadPoolExecutor(max_workers=len(self.queue_ids) + 1) as pool:
+                # node IP is needed for a new node dir only, looking it up may hang on DNS
+                node_ip = None
+                if not (cached.get('account_id') and
+                        os.path.isfile(os.path.join(self._node_dir(cached['account_id']), 'info.yaml'))):
+                    node_ip = pool.submit(get_node_ip)
+
+                self._schedulers = list(pool.map(lambda q: JessScheduler(jess_server=jess_server,
+                                                                         wrs_server=wrs_server,
+                                                                         ams_server=ams_server,
+                                                                         jt_account=jt_account,
+                                                                         queue_id=q,
+                                                                         response_cache=response_cache,
+                                                                         metrics=self.metrics,
+                                                                         retry_policy=retry_policy,
+                                                                         gzip_min_size=gzip_min_size,
+                                                                         account_id=cached.get('account_id'),
+                                                                         workflow_info=cached_queues.get(q)
+                                                                         ), self.queue_ids))
+                self._scheduler = self.schedulers[0]
+
+                self._account_id = self.scheduler.account_id
+                self._jt_account = jt_account
+
+                # init jt_home dir
+                self._init_jt_home(node_ip)
+                self._disk_ledger = DiskLedger(self.node_dir)
+
+                # the executor is registered with every queue, executor ID of the first queue is used as its own ID
+                list(pool.map(lambda s: self._register(s, job_selector), self.schedulers))
+
+            self._id = self.scheduler.executor_id  # reset executor ID to what server side return
+            try:
+                save_bootstrap(self.node_dir, jt_account, ams_server, jess_server, self.account_id, self.schedulers,
+                               cached_queues=cached_queues)
+            except OSError:
+                pass  # looked up again next time
 
         # local mode if supplied, local mode does NOT work
         elif job_file and self.queue_id is None:
             self._scheduler = LocalScheduler(job_file=job_file,
                                              workflow_name=workflow_name,
                                              executor_id=self.id)
+            self._schedulers = [self._scheduler]
 
             self._id = str(uuid4())  # self-assigned executor ID for local mode
+            self._node_ip = get_node_ip()
 
         else:
             raise Exception('Please specify either queue_id for executing jobs on remote job queue or '
                             'job_file to run local job.')
 
-        # init workflow dir
-        self._init_workflow_dir()
+        # init workflow dirs, queues of the same workflow share one
+        workflow_dirs = {}
+        for scheduler in self.schedulers:
+            workflow_dirs.setdefault(self._workflow_dir(scheduler), scheduler)
+        with ThreadPoolExecutor(max_workers=len(workflow_dirs)) as pool:
+            list(pool.map(self._init_workflow_dir, workflow_dirs.values()))
+
+        for scheduler in self.schedulers:
+            # init queue dir
+            self._init_queue_dir(scheduler)
 
-        # init queue dir
-        self._init_queue_dir()
+            # init executor dir
+            self._init_executor_dir(scheduler)
 
-        # init executor dir
-        self._init_executor_dir()
+            self._histories[scheduler.queue_id] = history_of(self._queue_dir(scheduler), scheduler)
+            self._cache_manifests[scheduler.queue_id] = CacheManifest(os.path.join(self._workflow_dir(scheduler),
+                                                                                   'data'))
+            self._reclaimer.executor_dirs.append(self._executor_dir(scheduler))
 
         # clean up any jobs left in `running` state on the server
         self._clean_up_running_jobs()
 
+        self._debug = DebugSignalHandler(self, logger)
+
         logger.info("Executor: %s started." % self.id)
 
     @property
@@ -160,6 +283,14 @@ class Executor(object):
     def scheduler(self):
         return self._scheduler
 
+    @property
+    def schedulers(self):
+        return self._schedulers
+
+    @property
+    def metrics(self):
+        return self._metrics
+
     @property
     def jt_home(self):
         return self._jt_home
@@ -180,23 +311,46 @@ class Executor(object):
     def queue_id(self):
         return self._queue_id
 
+    @property
+    def queue_ids(self):
+        return self._queue_ids
+
+    @property
+    def queue_policy(self):
+        return self._queue_policy
+
+    def queue_weight(self, queue_id):
+        return self._queue_weights.get(queue_id, 1)
+
     @property
     def node_dir(self):
-        return os.path.join(self.jt_home, 'account.%s' % self.account_id, 'node')
+        return self._node_dir(self.account_id)
+
+    def _node_dir(self, account_id):
+        return os.path.join(self.jt_home, 'account.%s' % account_id, 'node')
 
     @property
     def workflow_dir(self):
-        return os.path.join(self.node_dir,
-                            'workflow.%s' % self.scheduler.workflow_id,
-                            self.scheduler.workflow_version)
+        return self._workflow_dir(self.scheduler)
 
     @property
     def queue_dir(self):
-        return os.path.join(self.workflow_dir, 'queue.%s' % self.scheduler.queue_id)
+        return self._queue_dir(self.scheduler)
 
     @property
     def executor_dir(self):
-        return os.path.join(self.queue_dir, 'executor.%s' % self.scheduler.executor_id)
+        return self._executor_dir(self.scheduler)
+
+    def _workflow_dir(self, scheduler):
+        return os.path.join(self.node_dir,
+                            'workflow.%s' % scheduler.workflow_id,
+                            scheduler.workflow_version)
+
+    def _queue_dir(self, scheduler):
+        return os.path.join(self._workflow_dir(scheduler), 'queue.%s' % scheduler.queue_id)
+
+    def _executor_dir(self, scheduler):
+        return os.path.join(self._queue_dir(scheduler), 'executor.%s' % scheduler.executor_id)
 
     @property
     def polling_interval(self):
@@ -214,6 +368,10 @@ class Executor(object):
     def min_disk(self):
         return self._min_disk
 
+    @property
+    def job_disk(self):
+        return self._job_disk
+
     @property
     def parallel_workers(self):
         return self._parallel_workers
@@ -246,17 +404,73 @@ class Executor(object):
     def worker_processes(self):
         return self._worker_processes
 
+    def snapshot(self):
+        """
+        State of the executor from its own bookkeeping, no call is made to the server
+        """
+        workers = {}
+        for job_id, processes in self.worker_processes.items():
+            workers[job_id] = [{'name': p.name, 'pid': p.pid, 'alive': p.is_alive(), 'exitcode': p.exitcode}
+                               for p in processes]
+
+        return {
+            'time': time(),
+            'pid': os.getpid(),
+            'executor_id': self.id,
+            'node_id': self.node_id,
+            'node_ip': self.node_ip,
+            'queue_policy': self.queue_policy,
+            'schedulers': [{
+                'mode': s.mode,
+                'queue_id': s.queue_id,
+                'queue_weight': self.queue_weight(s.queue_id),
+                'executor_id': s.executor_id,
+                'workflow_id': s.workflow_id,
+                'workflow_name': s.workflow_name,
+                'workflow_version': s.workflow_version,
+                'running_tasks': self._running_tasks_by_queue().get(s.queue_id, 0)
+            } for s in self.schedulers],
+            'settings': {
+                'parallel_jobs': self.parallel_jobs,
+                'parallel_workers': self.parallel_workers,
+                'polling_interval': self.polling_interval,
+                'max_jobs': self.max_jobs,
+                'min_disk': self.min_disk,
+                'continuous_run': self.continuous_run
+            },
+            'shutting_down': self.killer.kill_now,
+            'ran_jobs': self.ran_jobs,
+            'running_jobs': self.running_jobs,
+            'disk_reservations': self._disk_reservations,
+            'workers': workers,
+            'worker_pids': [w['pid'] for ws in workers.values() for w in ws if w['alive']],
+            'metrics': self.metrics.render()
+        }
+
     def run(self):
-        if self.scheduler.mode == 'local':
-            self._run_local()
-        else:
-            self._run_remote()
+        # records of the executor and its workers are written by a listener thread while running
+        with self._log_pipeline:
+            if self.scheduler.mode == 'local':
+                self._run_local()
+            else:
+                self._run_remote()
 
     def _run_local(self):
         # TODO: local run is more complicated, let's worry about it later
         click.echo('Run local job not implemented yet.')
 
     def _run_remote(self):
+        reclaimer = None
+        if self._reclaimer.action != 'keep':
+            # separate process at low CPU and I/O priority so it does not compete with running tasks
+            reclaimer = multiprocessing.Process(target=self._reclaimer.run_forever, args=(self._gc_interval,),
+                                                name='reclaimer', daemon=True)
+            reclaimer.start()
+
+        if self._server_events:
+            for scheduler in self.schedulers:
+                scheduler.subscribe(self._wake)
+
         while True:
             if self.killer.kill_now:
                 self.logger.info('Received interruption signal, will not pick up new job. Exit after finishing current '
@@ -270,7 +484,7 @@ class Executor(object):
                 if self.continuous_run:
                     self.logger.info('No enough disk space, will start new job when enough space is available.')
                     self.logger.info("Current running jobs: %s, running tasks: %s" % (running_jobs, running_workers))
-                    sleep(self.polling_interval)  # TODO: may want to have a smarter wait intervals
+                    self._wait()  # TODO: may want to have a smarter wait intervals
                     continue
                 else:
                     self.logger.info('No enough disk space, exit after finishing current running job (if any) ...')
@@ -293,18 +507,20 @@ class Executor(object):
                 self.logger.info('Reached limit for parallel running jobs, will start new job after completing a current job.')
                 self.logger.info("Current running jobs: %s, running tasks: %s" % (running_jobs, running_workers))
 
-                sleep(self.polling_interval)
+                self._wait()
                 continue
 
-            worker = Worker(jt_home=self.jt_home, account_id=self.account_id, retries=self.retries,
-                            scheduler=self.scheduler, node_id=self.node_id, node_ip=self.node_ip, logger=self.logger)
-
             # get a task from a new job, break if no task returned, which suggests there is no more job
-            if not worker.next_task(job_state='queued'):
+            worker = self._next_job()
+            if worker is False:  # space was taken by another job starting on this node meanwhile
+                self.logger.info('No enough disk space, will start new job when enough space is available.')
+                self._wait()
+                continue
+            if not worker:
                 if self.continuous_run:
                     self.logger.info('No job in the queue, will start new job as it arrives.')
                     self.logger.info("Current running jobs: %s, running tasks: %s" % self._get_run_status())
-                    sleep(self.polling_interval)  # TODO: may want to have a smarter wait intervals
+                    self._wait()  # TODO: may want to have a smarter wait intervals
                     continue
                 else:
                     self.logger.info('No job in the queue. Exit after finishing current running job (if any) ...')
@@ -312,13 +528,7 @@ class Executor(object):
                     break
 
             # start the task
-            p = multiprocessing.Process(target=work,
-                                        name='task:%s job:%s' % (worker.task.get('name'), worker.task.get('job.id')),
-                                        args=(worker, self.logger)
-                                        )
-
-            self._worker_processes[worker.task.get('job.id')] = [p]
-            p.start()
+            self._start_worker(worker)
 
             # this is the first task of a new job
             self._ran_jobs += 1
@@ -326,8 +536,8 @@ class Executor(object):
 
             shutdown = False
             # stay in this loop when there are tasks to be run related to current running jobs
-            while self.scheduler.has_next_task():
-                sleep(self.polling_interval)
+            while self._has_next_task():
+                self._wait()
                 if self.killer.kill_now:
                     self.logger.info(
                         'Received interruption signal, will not pick up new task. Exit when current running task(s) '
@@ -342,14 +552,11 @@ class Executor(object):
                 if not running_workers < self.parallel_workers:
                     continue
 
-                worker = Worker(jt_home=self.jt_home, account_id=self.account_id, retries=self.retries,
-                                scheduler=self.scheduler, node_id=self.node_id, node_ip=self.node_ip, logger=self.logger)
+                worker = self._next_task(job_state='running')  # get next task in the current running jobs
 
-                task = worker.next_task(job_state='running')  # get next task in the current running jobs
-
-                if not task:  # if no task, try to start task for next job if it's appropriate to do so
+                if not worker:  # if no task, try to start task for next job if it's appropriate to do so
                     if (self.max_jobs and self.ran_jobs >= self.max_jobs) or \
-                            len(self.scheduler.running_jobs()) >= self.parallel_jobs:
+                            len(self._server_running_jobs(stale_ok=True)) >= self.parallel_jobs:
                         # no free slot, so not to start any new job
                         continue
 
@@ -360,72 +567,392 @@ class Executor(object):
                         # on enough space, not to start any new job, will continue with remaining tasks of running jobs
                         continue
 
-                    task = worker.next_task(job_state='queued')
-                    if task:
+                    worker = self._next_job()
+                    if worker:
                         self._ran_jobs += 1
                         self.logger.info('Executor: %s starts no. %s job' % (self.id, self.ran_jobs))
 
-                if task:
-                    p = multiprocessing.Process(target=work,
-                                            name='task:%s job:%s' % (worker.task.get('name'), worker.task.get('job.id')),
-                                            args=(worker, self.logger)
-                                            )
-                    if not self.worker_processes.get(worker.task.get('job.id')):
-                        self._worker_processes[worker.task.get('job.id')] = [p]
-                    else:
-                        self._worker_processes[worker.task.get('job.id')].append(p)
-                    p.start()
+                if worker:
+                    self._start_worker(worker)
 
             if shutdown:
                 break
 
-        while not self.killer.kill_now and len(self.scheduler.running_jobs()): # no cancel, then wait until all running tasks finish
+        while not self.killer.kill_now and len(self._server_running_jobs()): # no cancel, then wait until all running tasks finish
             self.logger.info("Current running jobs: %s, running tasks: %s" % self._get_run_status())
-            sleep(self.polling_interval)
+            self._wait()
             continue
 
-        for j in self.worker_processes:
-            for p in self.worker_processes.get(j):
-                if p.is_alive():
-                    self.logger.debug('Killing subprocess: %s' % p)
-                    os.kill(p.pid, signal.SIGKILL)  # there is no point to wait for worker process
+        self._get_run_status()  # to account for jobs finished since last check
+        for job_id in list(self._job_peaks):
+            self._job_peaks.pop(job_id).stop()
+
+        self._stop_workers()
 
         # call server to mark this executor terminated
         if self.killer.kill_now:
-            for j in self.scheduler.running_jobs():
+            self.logger.info('Received interruption signal, cancelling running jobs (if any) ...')
+            for scheduler, j in self._server_running_jobs():
                 self.logger.info('Cancelling job: %s' % j.get('id'))
-                self.scheduler.cancel_job(job_id=j.get('id'))
+                scheduler.cancel_job(job_id=j.get('id'))
 
-        try:
-            os.remove(os.path.join(self.executor_dir, '_state.running'))
-        except OSError:
-            pass
+        for job_id in list(self._disk_reservations):
+            self._disk_ledger.release(self._disk_reservations.pop(job_id))
+
+        for scheduler in self.schedulers:
+            try:
+                os.remove(os.path.join(self._executor_dir(scheduler), '_state.running'))
+            except OSError:
+                pass
 
         # report summary about completed jobs and running jobs if any
         self.logger.info('Executed %s %s.' % (self.ran_jobs, 'job' if self.ran_jobs <= 1 else 'jobs'))
 
+        for scheduler in self.schedulers:
+            scheduler.unsubscribe()
+
+        if reclaimer and reclaimer.is_alive():
+            reclaimer.terminate()
+
+        self._debug.stop()
+
+        self.metrics.collect(timeout=0)
+        if self._metrics_textfile:
+            self.metrics.write_textfile(self._metrics_textfile)
+        self.metrics.shutdown()
+
+    def _new_worker(self, scheduler):
+        return Worker(jt_home=self.jt_home, account_id=self.account_id, retries=self.retries,
+                      scheduler=scheduler, node_id=self.node_id, node_ip=self.node_ip,
+                      task_timeout=self._task_timeout, idle_timeout=self._idle_timeout, memo=self._memo,
+                      metrics=self.metrics, logger=self.logger)
+
+    def _queue_order(self):
+        """
+        Schedulers in the order they are offered a free worker slot. With 'priority' policy queues are
+        offered in the order given, so a queue gets slots only when queues before it have no task to run.
+        With 'fair' policy the queue with the least running work relative to its weight goes first.
+        """
+        if self.queue_policy == 'priority' or len(self.schedulers) == 1:
+            return self.schedulers
+
+        load = self._queue_load()
+        return sorted(self.schedulers,
+                      key=lambda s: load.get(s.queue_id, 0) / float(self.queue_weight(s.queue_id)))
+
+    def _queue_load(self):
+        """
+        Running work per queue: predicted wall time of running tasks from task history, tasks without
+        prediction count as the median prediction, or as one when nothing can be predicted
+        """
+        running = [(self._job_queues.get(job_id), self._predicted_wall_time.get(p))
+                   for job_id, processes in self.worker_processes.items() for p in processes if p.is_alive()]
+        known = sorted(t for _, t in running if t is not None)
+        default = known[len(known) // 2] if known else 1
+
+        load = {}
+        for queue_id, wall_time in running:
+            load[queue_id] = load.get(queue_id, 0) + (default if wall_time is None else wall_time)
+        return load
+
+    def _running_tasks_by_queue(self):
+        running = {}
+        for job_id, processes in self.worker_processes.items():
+            alive = len([p for p in processes if p.is_alive()])
+            if alive:
+                queue_id = self._job_queues.get(job_id)
+                running[queue_id] = running.get(queue_id, 0) + alive
+        return running
+
+    def _next_task(self, job_state):
+        """
+        :return: worker holding the next task from the queues served, or None when there is no task
+        """
+        for scheduler in self._queue_order():
+            worker = self._new_worker(scheduler)
+            job_id, cache_manifest = self._locality_hint(scheduler) if job_state == 'queued' else (None, None)
+            resumed = self._resumed_jobs.get(scheduler.queue_id) if job_state == 'queued' else None
+            if resumed:
+                job_id = resumed[0]
+            if worker.next_task(job_state=job_state, job_id=job_id, cache_manifest=cache_manifest):
+                if resumed:  # asked for first until a task comes back, the server may not have had one ready
+                    for j in (job_id, worker.task.get('job.id')):
+                        if j in resumed:
+                            resumed.remove(j)
+                return worker
+        return None
+
+    def _locality_hint(self, scheduler):
+        """
+        Favor new jobs whose inputs are already in workflow data dir on this node: the manifest of cached
+        inputs is sent along with the request, and unless the server reports it picks jobs by the manifest,
+        the executor ranks a few queued jobs by cached inputs itself and asks for the best one
+        :return: preferred job ID or None, and encoded cache manifest or None when nothing is cached
+        """
+        if not self._locality_candidates or scheduler.mode == 'local':
+            return None, None
+
+        manifest = self._cache_manifests[scheduler.queue_id]
+        if not manifest.urls():
+            return None, None
+
+        if scheduler.locality_applied:
+            return None, manifest.bloom()
+        return rank_jobs(scheduler.queued_jobs(limit=self._locality_candidates), manifest), manifest.bloom()
+
+    def _next_job(self):
+        """
+        Reserve disk space for a new job and get its first task
+        :return: worker holding the task, None when there is no job to start, False when there is not enough disk
+        """
+        nbytes = self.job_disk or self._predicted_job_disk() or self.min_disk
+        reservation = None
+        if nbytes and self._disk_ledger:
+            reservation = self._disk_ledger.reserve(nbytes, self._free_disk, min_free=self.min_disk or 0,
+                                                    executor_id=self.id)
+            if not reservation:
+                return False
+
+        worker = self._next_task(job_state='queued')
+        if reservation:
+            if worker:
+                job_id = worker.task.get('job.id')
+                self._disk_reservations[job_id] = reservation
+                info = {}
+                if not self.job_disk and self._predicted_job_disk(worker.queue_id):
+                    info['bytes'] = self._predicted_job_disk(worker.queue_id)  # footprint of the queue it came from
+                self._disk_ledger.update(reservation, job_id=job_id, queue_id=worker.queue_id,
+                                         job_dir=os.path.join(self._executor_dir(worker.scheduler), 'job.%s' % job_id),
+                                         **info)
+            else:
+                self._disk_ledger.release(reservation)
+        return worker
+
+    def _predicted_job_disk(self, queue_id=None):
+        """
+        :return: disk footprint of a job predicted from history of the queue, or the largest of all queues
+                 served when queue_id is not given, None when there is not enough history
+        """
+        histories = [self._histories[queue_id]] if queue_id else self._histories.values()
+        predictions = [p for p in (h.predict_job_disk() for h in histories) if p is not None]
+        return max(predictions) if predictions else None
+
+    def _wait(self):
+        """
+        Wait for the polling interval, or less when the server pushes an event or a worker exits. While
+        every scheduler follows server events, polls are spaced out to EVENT_POLL_INTERVAL.
+        """
+        interval = self.polling_interval
+        if self._server_events:
+            for scheduler in self.schedulers:
+                if getattr(scheduler, 'events_supported', None) is False and \
+                        scheduler.queue_id not in self._polling_queues:
+                    self._polling_queues.add(scheduler.queue_id)
+                    self.logger.info('Server provides no event stream for queue: %s, polling every %s seconds' %
+                                     (scheduler.queue_id, self.polling_interval))
+            if all(s.events_connected for s in self.schedulers):
+                interval = max(interval, EVENT_POLL_INTERVAL)
+
+        running = [p for p in self._workers if p.is_alive()]
+        deadline = time() + interval
+        while not self.killer.kill_now:
+            remaining = deadline - time()
+            if remaining <= 0 or self._wake.wait(min(remaining, WAKE_CHECK_INTERVAL)):
+                break
+            if any(not p.is_alive() for p in running):
+                break  # a worker slot is free
+        self._wake.clear()
+
+    def _has_next_task(self):
+        return any(s.has_next_task() for s in self.schedulers)
+
+    def _server_running_jobs(self, stale_ok=False):
+        """
+        :param stale_ok: whether the jobs last returned may be used while the server is not reachable, only for
+                         capacity decisions, not for cleaning up or cancelling jobs
+        :return: list of (scheduler, job) for jobs the server has as running by this executor
+        """
+        if len(self.schedulers) == 1:
+            return [(self.scheduler, j) for j in self.scheduler.running_jobs(stale_ok=stale_ok)]
+
+        with ThreadPoolExecutor(max_workers=len(self.schedulers)) as pool:
+            jobs = list(pool.map(lambda s: s.running_jobs(stale_ok=stale_ok), self.schedulers))
+        return [(s, j) for s, running in zip(self.schedulers, jobs) for j in running]
+
+    def _start_worker(self, worker):
+        job_id = worker.task.get('job.id')
+        p = multiprocessing.Process(target=work,
+                                    name='task:%s job:%s' % (worker.task.get('name'), job_id),
+                                    args=(worker, self.logger)
+                                    )
+        self._worker_processes.setdefault(job_id, []).append(p)
+        self._job_queues[job_id] = worker.queue_id
+        self._workers[p] = worker
+        if job_id not in self._job_dirs:
+            self._job_dirs[job_id] = worker.job_dir
+            self._job_peaks[job_id] = PeakDirSize(worker.job_dir).start()
+            try:
+                os.remove(os.path.join(worker.job_dir, JOB_FINISHED_FILE))  # job dir is in use again, eg, resumed job
+            except OSError:
+                pass
+
+        prediction = self._histories[worker.queue_id].predict_task(worker.task.get('name'))
+        self._predicted_wall_time[p] = prediction.get('wall_time')
+        if prediction.get('wall_time') is not None:
+            self.logger.debug('Task: %s predicted to run %.0f seconds, using %s bytes of disk' %
+                              (worker.task.get('name'), prediction['wall_time'], prediction['disk_bytes']))
+        p.start()
+        try:
+            os.setpgid(p.pid, p.pid)  # also set here so the group exists as soon as the worker is started
+        except OSError:
+            pass  # worker has set it already, or has exited
+        self.metrics.inc('tasks_started_total', queue=worker.queue_id)
+
+    def _signal_group(self, p, sig):
+        """
+        Signal the process group of a worker, and the process group of the command it runs
+        """
+        try:
+            os.killpg(p.pid, sig)
+        except ProcessLookupError:
+            pass  # nothing left in the group
+        except PermissionError:
+            if p.is_alive():
+                os.kill(p.pid, sig)
+
+        worker = self._workers.get(p)
+        if worker and worker.command_pgid:
+            try:
+                os.killpg(worker.command_pgid, sig)
+            except OSError:
+                pass
+
+    def _stop_workers(self):
+        """
+        Stop workers still alive along with all processes their tasks started: SIGTERM to the process group
+        of each worker first, SIGKILL to what is left after the shutdown grace period. Tasks stopped before
+        reporting to the server are recorded for a resumed executor to restart them.
+        """
+        alive = [p for processes in self.worker_processes.values() for p in processes if p.is_alive()]
+        if not alive:
+            return
+
+        for p in alive:
+            self.logger.debug('Terminating subprocess: %s' % p)
+            self._signal_group(p, signal.SIGTERM)
+
+        deadline = time() + self._shutdown_grace
+        for p in alive:
+            p.join(max(deadline - time(), 0))
+
+        for p in alive:
+            if p.is_alive():
+                self.logger.info('Killing subprocess: %s, not exited in %s seconds' % (p, self._shutdown_grace))
+            self._signal_group(p, signal.SIGKILL)  # also processes left in the group after the worker exited
+            p.join(1)
+
+        self._record_interrupted(alive)
+
+    def _record_interrupted(self, processes):
+        interrupted = {}  # executor dir => tasks
+        for p in processes:
+            worker = self._workers.get(p)
+            if not worker:
+                continue
+            state = read_task_state(worker.task_dir)
+            if state and state.get('phase') == 'reported':
+                continue  # outcome known to the server already
+
+            interrupted.setdefault(self._executor_dir(worker.scheduler), []).append({
+                'job_id': worker.task.get('job.id'),
+                'task_name': worker.task.get('name'),
+                'task_dir': worker.task_dir,
+                'interrupted_at': time()
+            })
+
+        for executor_dir, tasks in interrupted.items():
+            path = os.path.join(executor_dir, INTERRUPTED_FILE)
+            try:
+                with open(path, 'r') as f:
+                    tasks = json.load(f) + tasks  # not yet picked up by a resumed executor
+            except (OSError, ValueError):
+                pass
+            with open(path + '.tmp', 'w') as f:
+                json.dump(tasks, f, indent=2)
+            os.replace(path + '.tmp', path)
+            self.logger.info('Recorded %s interrupted task(s) in: %s' % (len(tasks), path))
+
+    def _mark_job_finished(self, job_id, job_dir):
+        """
+        Mark job dir for reclaiming, the job is taken as completed only when all its tasks ran here
+        completed and were reported
+        :return: 'completed' or 'failed', None when the job dir could not be marked
+        """
+        states = []
+        try:
+            for e in os.scandir(job_dir):
+                if e.name.startswith('task.') and e.is_dir():
+                    states.append(read_task_state(e.path) or {})
+            state = 'completed' if states and all(
+                s.get('phase') == 'reported' and s.get('state') == 'completed' for s in states) else 'failed'
+            mark_job_finished(job_dir, job_id, state)
+            return state
+        except OSError as e:
+            self.logger.debug('Unable to mark job: %s finished, error: %s' % (job_id, e))
+
     def _get_run_status(self):
         running_workers = 0
         running_jobs = 0
-        for j in self.scheduler.running_jobs():
+        self._running_jobs = []
+        for _, j in self._server_running_jobs():
             self.logger.info('Running job: %s' % j.get('id'))
+            self._running_jobs.append(j.get('id'))
             running_jobs += 1
             for p in self.worker_processes.get(j.get('id'), []):
                 if p.is_alive():
                     self.logger.info('Running task: %s' % p.name)
                     running_workers += 1
                     p.join(timeout=0.1)
+
+        # record peak footprint of completed jobs and release disk reserved for jobs that are no longer running,
+        # failed and cancelled jobs may have stopped short of their footprint so are left out of the history
+        for job_id in list(self._job_dirs):
+            if job_id in self._running_jobs or any(p.is_alive() for p in self.worker_processes.get(job_id, [])):
+                continue
+            job_dir = self._job_dirs.pop(job_id)
+            peak = self._job_peaks.pop(job_id).stop() if job_id in self._job_peaks else None
+            if self._mark_job_finished(job_id, job_dir) == 'completed' and peak is not None:
+                try:
+                    self._histories[self._job_queues[job_id]].record_job(job_id, peak)
+                except sqlite3.Error as e:
+                    self.logger.debug('Unable to record job history: %s' % e)
+            if job_id in self._disk_reservations:
+                self._disk_ledger.release(self._disk_reservations.pop(job_id))
+
+        for p in list(self._predicted_wall_time):
+            if not p.is_alive():
+                del self._predicted_wall_time[p]
+        for p in list(self._workers):
+            if not p.is_alive():
+                del self._workers[p]
+
+        self.metrics.set('executor_running_jobs', running_jobs)
+        self.metrics.set('executor_running_tasks', running_workers)
         return running_jobs, running_workers
 
-    def _init_jt_home(self):
+    def _init_jt_home(self, node_ip=None):
+        """
+        :param node_ip: future of node IP lookup started earlier, looked up here when needed otherwise
+        """
         # initial it if needed
         node_info_file = os.path.join(self.node_dir,'info.yaml')
 
         if os.path.isfile(node_info_file):  # if info.yaml exists, use everything in it
             with open(node_info_file, 'r') as f:
-                node_info = yaml.load(f)
+                node_info = yaml.safe_load(f)
         else:  # not exist
-            node_info = {'id': str(uuid4()), 'node_ip': self.node_ip}  # may need to add other information
+            node_info = {'id': str(uuid4()),
+                         'node_ip': node_ip.result() if node_ip else get_node_ip()}  # may need to add other information
             try:
                 os.makedirs(self.node_dir)
             except OSError as exc:  # Guard against race condition
@@ -437,25 +964,35 @@ class Executor(object):
         self._node_id = node_info.get('id')
         self._node_ip = node_info.get('node_ip')
 
-    def _init_workflow_dir(self):
+    def _register(self, scheduler, job_selector=None):
+        scheduler.register_executor(self.node_id, self.node_ip)
+
+        # update job selector if supplied
+        if job_selector is not None:
+            scheduler.update_executor(action={
+                'job_selector': job_selector
+            })
+
+    def _init_workflow_dir(self, scheduler):
+        workflow_dir = self._workflow_dir(scheduler)
         try:
-            os.makedirs(self.workflow_dir)
+            os.makedirs(workflow_dir)
         except OSError as exc:  # Guard against race condition
             if exc.errno != errno.EEXIST:
                 raise
 
         # detect whether workflow has already been installed
-        workflow_installation_flag_file = os.path.join(self.workflow_dir, 'workflow.installed')
+        workflow_installation_flag_file = os.path.join(workflow_dir, 'workflow.installed')
         if os.path.isfile(workflow_installation_flag_file):
             return
 
         self.logger.info('Installing workflow package ...')
-        workflow = self.scheduler.get_workflow()
+        workflow = scheduler.get_workflow()
 
         git_account = workflow.get('git_account')
         git_repo = workflow.get('git_repo')
-        git_tag = workflow.get('ver:%s' % self.scheduler.workflow_version).get('git_tag')
-        git_path = workflow.get('ver:%s' % self.scheduler.workflow_version).get('git_path')
+        git_tag = workflow.get('ver:%s' % scheduler.workflow_version).get('git_tag')
+        git_path = workflow.get('ver:%s' % scheduler.workflow_version).get('git_path')
 
         # https://github.com/jthub/jtracker-example-workflows/archive/0.2.0.tar.gz
         git_download_url = "https://github.com/%s/%s/archive/%s.zip" % (git_account, git_repo, git_tag)
@@ -471,62 +1008,129 @@ class Executor(object):
             subprocess.check_output(["chmod", "-R", "755", source_tool_path])
 
         # rm first in case exist
-        shutil.rmtree(os.path.join(self.workflow_dir, 'workflow'), ignore_errors=True)
+        shutil.rmtree(os.path.join(workflow_dir, 'workflow'), ignore_errors=True)
 
-        shutil.move(source_workflow_path, self.workflow_dir)
+        shutil.move(source_workflow_path, workflow_dir)
 
         # now create the installation flag file
         open(workflow_installation_flag_file, 'a').close()
         self.logger.info('Workflow package installed')
 
-    def _init_queue_dir(self):
+    def _init_queue_dir(self, scheduler):
         try:
-            os.makedirs(self.queue_dir)
+            os.makedirs(self._queue_dir(scheduler))
         except OSError as exc:  # Guard against race condition
             if exc.errno != errno.EEXIST:
                 raise
 
-    def _init_executor_dir(self):
+    def _init_executor_dir(self, scheduler):
+        executor_dir = self._executor_dir(scheduler)
         try:
-            os.makedirs(self.executor_dir)
+            os.makedirs(executor_dir)
         except OSError as e:  # Guard against race condition
             if e.errno != errno.EEXIST:
                 raise
 
         flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY
         try:
-            os.open(os.path.join(self.executor_dir, '_state.running'), flags)
+            os.open(os.path.join(executor_dir, '_state.running'), flags)
         except OSError as e:
             if e.errno == errno.EEXIST:  # Exit as the executor is running.
                 if not (self.force_restart or self.resume_job):
                     self.logger.info('The executor: %s for queue: %s is running on this node: %s already, not start executor without -f or -r option.'
-                          % (self.id, self.queue_id, self.node_id))
+                          % (scheduler.executor_id, scheduler.queue_id, self.node_id))
                     sys.exit(1)
             else:
                 self.logger.info('Unable to start executor, write permission is needed in JTHome')
                 sys.exit(1)
 
     def _clean_up_running_jobs(self):
-        server_running_jobs = self.scheduler.running_jobs()
+        server_running_jobs = self._server_running_jobs()
         if server_running_jobs:
             if not (self.resume_job or self.force_restart):
                 self.logger.info('Server reports running jobs by the executor on this compute node, not start executor without -f or -r option.')
                 sys.exit(1)
 
-            for j in server_running_jobs:
+            for scheduler, j in server_running_jobs:
                 if self.resume_job:
+                    if self._report_exited_tasks(scheduler, j.get('id')) and \
+                            j.get('id') not in [r.get('id') for r in scheduler.running_jobs()]:
+                        continue  # job ended with tasks just reported
                     self.logger.info('Set previous running job: %s to resume' % j.get('id'))
-                    self.scheduler.resume_job(j.get('id'))
+                    scheduler.resume_job(j.get('id'))
                 elif self.force_restart:
                     self.logger.info('Cancel previous running job: %s' % j.get('id'))
-                    self.scheduler.cancel_job(j.get('id'))
+                    scheduler.cancel_job(j.get('id'))
 
-    def _enough_disk(self):
+        # jobs with tasks interrupted at last shutdown were cancelled then, resume them and pick them up first
+        resumed = set(j.get('id') for _, j in server_running_jobs)
+        for scheduler in self.schedulers:
+            path = os.path.join(self._executor_dir(scheduler), INTERRUPTED_FILE)
+            try:
+                with open(path, 'r') as f:
+                    interrupted = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not (self.resume_job or self.force_restart):
+                continue  # keep the record until told what to do with the jobs
+
+            if self.resume_job:
+                for t in interrupted:
+                    self.logger.info('Resume job: %s, task: %s was interrupted' % (t['job_id'], t['task_name']))
+                    if t['job_id'] not in resumed:
+                        scheduler.resume_job(t['job_id'])
+                        resumed.add(t['job_id'])
+                    if t['job_id'] not in self._resumed_jobs.setdefault(scheduler.queue_id, []):
+                        self._resumed_jobs[scheduler.queue_id].append(t['job_id'])
+            os.remove(path)
+
+    def _report_exited_tasks(self, scheduler, job_id):
+        """
+        Report outcome of tasks of the job that exited after the previous executor stopped watching them,
+        or whose worker was stopped before reporting, so they are not run again when the job resumes
+        :return: number of tasks reported
+        """
+        job_dir = os.path.join(self._executor_dir(scheduler), 'job.%s' % job_id)
+        try:
+            task_dirs = [e.path for e in os.scandir(job_dir) if e.name.startswith('task.') and e.is_dir()]
+        except OSError:
+            return 0
+
+        reported = 0
+        for task_dir in task_dirs:
+            state = read_task_state(task_dir)
+            if not state or state.get('phase') != 'exited' or state.get('state') not in ('completed', 'failed'):
+                continue
+
+            output = task_output(task_dir, state.get('jt'))
+            try:
+                if state['state'] == 'completed':
+                    scheduler.task_completed(job_id=job_id, task_name=state['task_name'], output=output)
+                else:
+                    scheduler.task_failed(job_id=job_id, task_name=state['task_name'], output=output)
+            except Exception as e:
+                self.logger.info('Unable to report task: %s, job: %s, error: %s' % (state['task_name'], job_id, e))
+                continue
+
+            write_task_state(task_dir, 'reported', keep=STAGED_FIELDS + ('job_id', 'task_name', 'state'))
+            self.logger.info('Reported %s task: %s, job: %s that was not reported before restart' %
+                             (state['state'], state['task_name'], job_id))
+            reported += 1
+        return reported
+
+    def _free_disk(self):
         statvfs = os.statvfs(self.executor_dir)
+        return statvfs.f_bavail * statvfs.f_frsize
 
-        if self.min_disk is not None \
-            and self.min_disk != 0 \
-            and statvfs.f_bavail * statvfs.f_frsize < self.min_disk:
-            return False
+    def _enough_disk(self):
+        free_disk = self._free_disk()
+        self.metrics.set('executor_disk_free_bytes', free_disk)
+
+        if self.min_disk is not None and self.min_disk != 0:
+            # space reserved by running jobs on this node is not available even if not used yet
+            if self._disk_ledger:
+                free_disk -= self._disk_ledger.outstanding()
+            if free_disk < self.min_disk:
+                return False
 
         return True
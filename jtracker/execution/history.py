@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+from time import time
+from .ledger import dir_size
+
+
+HISTORY_FILE = 'history.sqlite'
+
+# predictions need at least this many runs, and use at most this many recent runs
+MIN_SAMPLES = 3
+MAX_SAMPLES = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_runs (
+    workflow_id TEXT,
+    workflow_version TEXT,
+    task_name TEXT,
+    job_id TEXT,
+    state TEXT,
+    wall_time REAL,
+    disk_bytes INTEGER,
+    ended_at REAL
+);
+CREATE INDEX IF NOT EXISTS task_runs_task ON task_runs (workflow_id, workflow_version, task_name, ended_at);
+CREATE TABLE IF NOT EXISTS job_runs (
+    workflow_id TEXT,
+    workflow_version TEXT,
+    job_id TEXT,
+    disk_bytes INTEGER,
+    ended_at REAL
+);
+CREATE INDEX IF NOT EXISTS job_runs_workflow ON job_runs (workflow_id, workflow_version, ended_at);
+"""
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[int(round(q * (len(values) - 1)))] if values else None
+
+
+class TaskHistory(object):
+    """
+    Local history of task wall time and disk usage, and of job disk footprint, kept in a SQLite
+    database in queue dir. Worker processes and the executor write to it concurrently, each with
+    its own connection.
+
+    Predictions are a high quantile of the most recent runs of the same task (or job) of the same
+    workflow version, None until there are enough runs.
+    """
+    def __init__(self, path, workflow_id=None, workflow_version=None, quantile=0.9):
+        self._path = path
+        self._workflow_id = workflow_id
+        self._workflow_version = workflow_version
+        self._quantile = quantile
+        self._conn = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def record_task(self, task_name, job_id, state, wall_time, disk_bytes):
+        self.conn.execute('INSERT INTO task_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                          (self._workflow_id, self._workflow_version, task_name, job_id, state,
+                           wall_time, disk_bytes, time()))
+
+    def record_job(self, job_id, disk_bytes):
+        self.conn.execute('INSERT INTO job_runs VALUES (?, ?, ?, ?, ?)',
+                          (self._workflow_id, self._workflow_version, job_id, disk_bytes, time()))
+
+    def _recent(self, sql, *params):
+        try:
+            rows = self.conn.execute(sql + ' ORDER BY ended_at DESC LIMIT ?',
+                                     (self._workflow_id, self._workflow_version) + params + (MAX_SAMPLES,)).fetchall()
+        except sqlite3.Error:
+            return []  # no prediction rather than failing the caller
+        return [r[0] for r in rows if r[0] is not None]
+
+    def predict_task(self, task_name):
+        """
+        :return: dict with predicted 'wall_time' (seconds) and 'disk_bytes' of the task, values are None
+                 when there is not enough history
+        """
+        prediction = {}
+        for column in ('wall_time', 'disk_bytes'):
+            values = self._recent('SELECT %s FROM task_runs WHERE workflow_id = ? AND workflow_version = ? '
+                                  "AND task_name = ? AND state = 'completed'" % column, task_name)
+            prediction[column] = _quantile(values, self._quantile) if len(values) >= MIN_SAMPLES else None
+        return prediction
+
+    def predict_job_disk(self):
+        """
+        :return: predicted disk footprint of a job in bytes, None when there is not enough history
+        """
+        values = self._recent('SELECT disk_bytes FROM job_runs WHERE workflow_id = ? AND workflow_version = ?')
+        return _quantile(values, self._quantile) if len(values) >= MIN_SAMPLES else None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def history_of(queue_dir, scheduler):
+    return TaskHistory(os.path.join(queue_dir, HISTORY_FILE),
+                       workflow_id=scheduler.workflow_id, workflow_version=scheduler.workflow_version)
+
+
+class PeakDirSize(object):
+    """
+    Track peak disk usage of a dir by sampling it in a background thread while the block runs
+    """
+    def __init__(self, path, interval=10):
+        self._path = path
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.peak = 0
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, dir_size(self._path))
+            if self._stop.wait(self._interval):
+                break
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name='dir-size-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, dir_size(self._path))
+        return self.peak
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,163 @@
+import os
+import json
+import fcntl
+from time import time
+from uuid import uuid4
+from contextlib import contextmanager
+
+
+LEDGER_FILE = 'disk_ledger.json'
+
+# a reservation whose job dir does not exist this long after it was made is taken as cleaned up
+CLEANED_GRACE = 600
+
+# seconds disk usage measured of a job dir is used before the dir is walked again
+USED_BYTES_TTL = 30
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def dir_size(path):
+    """
+    Disk usage in bytes of all files under path
+    """
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += dir_size(entry.path)
+            else:
+                total += entry.stat(follow_symlinks=False).st_blocks * 512
+        except OSError:
+            continue
+    return total
+
+
+class DiskLedger(object):
+    """
+    Node wide ledger of disk space promised to jobs, shared by all executors on the node.
+
+    A job reserves its expected footprint before it starts. The part of a reservation not yet
+    used by files in the job dir is outstanding, that is space `statvfs` still reports as free but
+    is already promised. A reservation is released when its job finishes, when its job dir is
+    cleaned, or when the executor that made it is no longer alive.
+
+    The ledger is a JSON file in node dir, every read-modify-write holds an exclusive flock, reads
+    hold a shared one and leave the file as it is. Disk usage of job dirs is measured with no lock
+    held and kept for up to used_bytes_ttl seconds, so the lock is not held while walking job dirs.
+    """
+    def __init__(self, node_dir, used_bytes_ttl=USED_BYTES_TTL):
+        self._path = os.path.join(node_dir, LEDGER_FILE)
+        self._lock_path = self._path + '.lock'
+        self._used_bytes_ttl = used_bytes_ttl
+        self._used_bytes = {}  # job dir => (measured at, bytes)
+
+    @property
+    def path(self):
+        return self._path
+
+    @contextmanager
+    def _locked(self, exclusive=True):
+        with open(self._lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                entries = self._load()
+                yield entries
+                if exclusive:
+                    self._store(entries)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, entries):
+        tmp_path = '%s.%s.tmp' % (self._path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self._path)
+
+    @staticmethod
+    def _prune(entries):
+        for key, e in list(entries.items()):
+            if not _pid_alive(e['pid']):
+                del entries[key]
+            elif e.get('job_dir') and not os.path.isdir(e['job_dir']) and \
+                    time() - e['reserved_at'] > CLEANED_GRACE:
+                del entries[key]
+
+    def _used(self, job_dir):
+        now = time()
+        measured = self._used_bytes.get(job_dir)
+        if measured is None or now - measured[0] > self._used_bytes_ttl:
+            measured = self._used_bytes[job_dir] = (now, dir_size(job_dir))
+        return measured[1]
+
+    def _outstanding(self, entries):
+        job_dirs = set(e['job_dir'] for e in entries.values() if e.get('job_dir'))
+        for job_dir in set(self._used_bytes) - job_dirs:
+            del self._used_bytes[job_dir]
+
+        total = 0
+        for e in entries.values():
+            used = self._used(e['job_dir']) if e.get('job_dir') else 0
+            total += max(e['bytes'] - used, 0)
+        return total
+
+    def _live_entries(self):
+        with self._locked(exclusive=False) as entries:
+            self._prune(entries)  # in memory only, dropped from the file by the next write
+            return entries
+
+    def outstanding(self):
+        """
+        :return: bytes reserved by running jobs and not yet used
+        """
+        return self._outstanding(self._live_entries())
+
+    def reserve(self, nbytes, free_bytes, min_free=0, **info):
+        """
+        Reserve nbytes if free space less outstanding reservations is at least nbytes and min_free
+        :param free_bytes: callable returning currently free bytes on the disk, called with the lock held
+        :return: reservation key, or None when there is not enough space
+        """
+        self._outstanding(self._live_entries())  # measure job dirs before taking the exclusive lock
+
+        with self._locked() as entries:
+            self._prune(entries)
+            if free_bytes() - self._outstanding(entries) < max(nbytes, min_free):
+                return None
+
+            key = str(uuid4())
+            entry = {'bytes': nbytes, 'pid': os.getpid(), 'reserved_at': time()}
+            entry.update(info)
+            entries[key] = entry
+            return key
+
+    def update(self, key, **info):
+        with self._locked() as entries:
+            if key in entries:
+                entries[key].update(info)
+
+    def release(self, key):
+        with self._locked() as entries:
+            entries.pop(key, None)
+
+    def entries(self):
+        return self._live_entries()
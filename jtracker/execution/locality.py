@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import math
+import base64
+import hashlib
+
+
+MANIFEST_FILE = '.jt_manifest'  # in workflow data dir
+MAX_BLOOM_BYTES = 3 * 1024  # 4 KB once base64 encoded, well under the 8 KB request header limit of common servers
+COMPACT_MIN_LINES = 1000  # manifest is rewritten when it has this many lines and at least half are stale
+
+WF_DATA = '${_wf_data}'
+_input_re = re.compile(r"\[(.+)\]((http|https)://.+)")
+
+
+class BloomFilter(object):
+    """
+    Compact set membership with false positives at about error_rate and no false negatives. With max_bytes
+    the filter is kept at that size, false positives then grow above error_rate beyond the capacity it fits.
+    """
+    def __init__(self, capacity, error_rate=0.01, max_bytes=None):
+        capacity = max(capacity, 1)
+        self.m = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        if max_bytes:
+            self.m = min(self.m, max_bytes * 8)
+        self.k = max(int(round(self.m / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.sha1(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.bits[p // 8] |= 1 << (p % 8)
+
+    def __contains__(self, key):
+        return all(self.bits[p // 8] & (1 << (p % 8)) for p in self._positions(key))
+
+    def encode(self):
+        """
+        :return: 'bloom:{k}:{m}:{base64 bits}', positions are (h1 + i * h2) % m for i < k where h1 and h2 are
+                 the first two big endian 64 bit words of sha1 of the key, h2 with its lowest bit set
+        """
+        return 'bloom:%s:%s:%s' % (self.k, self.m, base64.b64encode(bytes(self.bits)).decode())
+
+
+def wf_data_urls(task_file):
+    """
+    :return: URLs of task inputs provisioned to workflow data dir, ie, shared by jobs on the node
+    """
+    try:
+        inputs = json.loads(task_file).get('input', {}) if isinstance(task_file, str) else task_file.get('input', {})
+    except (ValueError, AttributeError):
+        return []
+
+    urls = []
+    for v in inputs.values():
+        for i in (v if isinstance(v, list) else [v]):
+            m = _input_re.match(i) if isinstance(i, str) else None
+            if m and WF_DATA in m.group(1):
+                urls.append(m.group(2))
+    return urls
+
+
+class CacheManifest(object):
+    """
+    URLs of input files provisioned to workflow data dir on this node. Workers append a line
+    '{url}\\t{local path}' when a file is downloaded; entries whose file is gone are dropped on load, and
+    the file is rewritten without them once most of its lines are stale. A line appended while the file
+    is rewritten may be lost, which only costs a locality hint.
+    """
+    def __init__(self, data_dir):
+        self._path = os.path.join(data_dir, MANIFEST_FILE)
+        self._mtime = None
+        self._urls = set()
+        self._bloom = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def add(self, url, local_path):
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, ('%s\t%s\n' % (url, local_path)).encode())
+            finally:
+                os.close(fd)
+        except OSError:
+            pass  # manifest is only a hint
+
+    def urls(self):
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except OSError:
+            return set()
+
+        if mtime != self._mtime:
+            entries = {}
+            lines = 0
+            with open(self._path, 'r') as f:
+                for line in f:
+                    lines += 1
+                    url, _, local_path = line.rstrip('\n').partition('\t')
+                    if url and url not in entries and os.path.isfile(local_path + '.__ready__'):
+                        entries[url] = local_path
+            if lines >= COMPACT_MIN_LINES and lines >= 2 * len(entries):
+                mtime = self._compact(entries)
+            self._urls, self._mtime, self._bloom = set(entries), mtime, None
+        return self._urls
+
+    def _compact(self, entries):
+        """
+        :return: mtime of the rewritten manifest, None when it was not rewritten
+        """
+        tmp_path = '%s.%s.tmp' % (self._path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                for url, local_path in entries.items():
+                    f.write('%s\t%s\n' % (url, local_path))
+            os.replace(tmp_path, self._path)
+            return os.stat(self._path).st_mtime
+        except OSError:
+            return None
+
+    def bloom(self):
+        """
+        :return: encoded Bloom filter of cached URLs to send to the server
+        """
+        urls = self.urls()
+        if self._bloom is None:
+            bloom = BloomFilter(len(urls), max_bytes=MAX_BLOOM_BYTES)
+            for url in urls:
+                bloom.add(url)
+            self._bloom = bloom.encode()
+        return self._bloom
+
+    def hits(self, urls):
+        cached = self.urls()
+        return len([u for u in urls if u in cached])
+
+
+def rank_jobs(jobs, manifest):
+    """
+    Pick the job whose inputs are cached the most, server order breaks ties
+    :return: ID of the best job, None when no job has a cached input
+    """
+    best, best_hits = None, 0
+    for job in jobs:
+        urls = set()
+        for task in (job.get('tasks') or {}).values():
+            urls.update(wf_data_urls(task.get('task_file')))
+        hits = manifest.hits(urls)
+        if hits > best_hits:
+            best, best_hits = job.get('id'), hits
+    return best
@@ -0,0 +1,106 @@
+import os
+import logging
+import threading
+import multiprocessing
+from time import time
+from logging.handlers import QueueHandler, QueueListener
+
+
+TASK_LOG_FILE = 'task.log'  # in task dir
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+STOP_TIMEOUT = 10  # seconds to wait for queued records to be written when the pipeline stops
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through the same message at most once per interval, eg, status lines logged at every poll.
+    The next time it is let through it tells how many times it was suppressed. Only applies to
+    records below WARNING.
+    """
+    MAX_TRACKED = 1000
+
+    def __init__(self, interval=60):
+        super(RateLimitFilter, self).__init__()
+        self._interval = interval
+        self._seen = {}  # message => [last time let through, times suppressed since]
+
+    def filter(self, record):
+        if not self._interval or record.levelno >= logging.WARNING:
+            return True
+
+        now = time()
+        message = record.getMessage()
+        seen = self._seen.get(message)
+        if seen and now - seen[0] < self._interval:
+            seen[1] += 1
+            return False
+
+        if seen and seen[1]:
+            record.msg, record.args = '%s (repeated %s times)' % (message, seen[1]), None
+        self._seen[message] = [now, 0]
+
+        if len(self._seen) > self.MAX_TRACKED:
+            for m, (t, _) in list(self._seen.items()):
+                if now - t >= self._interval:
+                    del self._seen[m]
+        return True
+
+
+class LogPipeline(object):
+    """
+    While running, records of the logger go through a queue to a listener thread writing them with the
+    logger's own handlers, so logging does not block on slow output. Worker processes forked in the
+    meantime inherit the queue and send their records to the same listener, no interleaved lines.
+    """
+    def __init__(self, logger, rate_limit=60):
+        self._logger = logger
+        self._rate_limit = rate_limit
+        self._handlers = []
+        self._listener = None
+
+    def start(self):
+        if not self._logger or not self._logger.handlers or self._listener:
+            return self  # nothing to write to, or started already
+
+        self._handlers = list(self._logger.handlers)
+        queue = multiprocessing.Queue()
+        queue_handler = QueueHandler(queue)
+        queue_handler.addFilter(RateLimitFilter(self._rate_limit))
+
+        self._listener = QueueListener(queue, *self._handlers, respect_handler_level=True)
+        self._listener.start()
+        for h in self._handlers:
+            self._logger.removeHandler(h)
+        self._logger.addHandler(queue_handler)
+        return self
+
+    def stop(self):
+        if not self._listener:
+            return
+
+        for h in list(self._logger.handlers):
+            if isinstance(h, QueueHandler):
+                self._logger.removeHandler(h)
+        # writes what is queued, not waiting forever in case a killed worker left the queue locked
+        stopper = threading.Thread(target=self._listener.stop, daemon=True)
+        stopper.start()
+        stopper.join(STOP_TIMEOUT)
+        self._listener = None
+        for h in self._handlers:
+            self._logger.addHandler(h)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_task_log(logger, task_dir):
+    """
+    Also write records logged in this worker process to the task's own log file
+    """
+    handler = logging.FileHandler(os.path.join(task_dir, TASK_LOG_FILE))
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(handler)
+    return handler
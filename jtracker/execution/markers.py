@@ -0,0 +1,78 @@
+import os
+import json
+import hashlib
+from time import time
+
+
+TASK_STATE_FILE = '_state.json'  # in task dir
+
+# phases of a task run in the order they are reached
+PHASES = ('staged', 'running', 'exited', 'reported')
+
+
+def _checksum(state):
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+def write_task_state(task_dir, phase, keep=(), **fields):
+    """
+    Atomically replace state marker of the task with the given phase and fields
+    :param keep: fields of the current marker carried over, eg, staged inputs
+    """
+    state = {}
+    current = read_task_state(task_dir) if keep else None
+    for k in keep:
+        if current and k in current:
+            state[k] = current[k]
+    state.update(fields)
+    state.update({'phase': phase, 'updated_at': time()})
+    state['checksum'] = _checksum(state)
+
+    path = os.path.join(task_dir, TASK_STATE_FILE)
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return state
+
+
+def read_task_state(task_dir):
+    """
+    :return: state marker of the task, None when there is none or it does not match its checksum
+    """
+    try:
+        with open(os.path.join(task_dir, TASK_STATE_FILE), 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(state, dict):
+        return None
+    checksum = state.pop('checksum', None)
+    if checksum != _checksum(state):
+        return None
+    return state
+
+
+def file_stamps(paths):
+    """
+    :return: dict of path => [size, mtime_ns] of existing files
+    """
+    stamps = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stamps[path] = [st.st_size, st.st_mtime_ns]
+    return stamps
+
+
+def changed_files(stamps):
+    """
+    :return: paths whose file is gone or differs in size or mtime from its stamp
+    """
+    current = file_stamps(stamps)
+    return [path for path, stamp in stamps.items() if current.get(path) != list(stamp)]
@@ -0,0 +1,215 @@
+import os
+import json
+import shutil
+import hashlib
+from time import time
+from uuid import uuid4
+
+
+MEMO_DIR = 'memo'  # in workflow dir
+META_FILE = 'meta.json'
+OUTPUT_FILE = 'output.json'
+FILES_DIR = 'files'
+DIGESTS_DIR = '.digests'  # digests of input files, reused while file size and mtime stay the same
+
+
+def _copy(src, dst):
+    # not hard linked, a task writing to a file in place would change the stored result with it
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy2(src, dst)
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+
+
+def _replace_prefix(value, old, new):
+    if isinstance(value, str):
+        return new + value[len(old):] if value == old or value.startswith(old + os.sep) else value
+    elif isinstance(value, dict):
+        return dict((k, _replace_prefix(v, old, new)) for k, v in value.items())
+    elif isinstance(value, list):
+        return [_replace_prefix(v, old, new) for v in value]
+    return value
+
+
+class MemoCache(object):
+    """
+    Results of completed tasks on this node, keyed by a hash of workflow version, task name, rendered
+    command and digests of input files. An entry holds output.json of the task and files in the task dir
+    that output.json refers to. Files are copied in and out of the cache, so later writes to them in a task
+    dir do not change the stored result.
+
+        {workflow dir}/memo/{key}/meta.json
+                                 /output.json
+                                 /files/{path relative to task dir}
+    """
+    def __init__(self, memo_dir):
+        self._memo_dir = memo_dir
+
+    @property
+    def memo_dir(self):
+        return self._memo_dir
+
+    def file_digest(self, path):
+        """
+        sha256 of file content, cached in memo dir by path, size and mtime
+        """
+        st = os.stat(path)
+        cache = os.path.join(self._memo_dir, DIGESTS_DIR, hashlib.sha1(os.path.realpath(path).encode()).hexdigest())
+        stamp = '%s %s' % (st.st_size, st.st_mtime_ns)
+        try:
+            with open(cache, 'r') as f:
+                cached_stamp, _, digest = f.read().rpartition(' ')
+            if cached_stamp == stamp:
+                return digest
+        except OSError:
+            pass
+
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+
+        try:
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            tmp_path = '%s.%s.tmp' % (cache, os.getpid())
+            with open(tmp_path, 'w') as f:
+                f.write('%s %s' % (stamp, digest))
+            os.replace(tmp_path, cache)
+        except OSError:
+            pass
+        return digest
+
+    def key(self, workflow_id, workflow_version, task_name, command, input_files):
+        """
+        :param command: rendered command with job and task specific dirs replaced by placeholders
+        :param input_files: dict of input file path (as in command) => local path to read it from
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps({
+            'workflow_id': workflow_id,
+            'workflow_version': workflow_version,
+            'task_name': task_name,
+            'command': command,
+            'input_files': dict((k, self.file_digest(v)) for k, v in sorted(input_files.items()))
+        }, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self._memo_dir, key)
+
+    def get(self, key):
+        """
+        :return: meta of the entry, None when there is no such entry
+        """
+        try:
+            with open(os.path.join(self._entry_dir(key), META_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, task_dir, **meta):
+        """
+        Add output.json in task dir and files it refers to as the result of the task, an existing entry
+        is kept as is
+        :return: True when the entry is added
+        """
+        if self.get(key):
+            return False
+
+        try:
+            with open(os.path.join(task_dir, OUTPUT_FILE), 'r') as f:
+                output = json.load(f)
+        except (OSError, ValueError):
+            output = None  # task without output.json
+
+        tmp_dir = os.path.join(self._memo_dir, '.tmp.%s' % uuid4())
+        try:
+            os.makedirs(tmp_dir)
+            files = []
+            task_dir = os.path.realpath(task_dir)
+            for value in _strings(output):
+                path = os.path.realpath(os.path.join(task_dir, value))  # relative paths are in task dir
+                if path.startswith(task_dir + os.sep) and os.path.isfile(path):
+                    rel_path = os.path.relpath(path, task_dir)
+                    if rel_path not in files:
+                        _copy(path, os.path.join(tmp_dir, FILES_DIR, rel_path))
+                        files.append(rel_path)
+
+            if output is not None:
+                with open(os.path.join(tmp_dir, OUTPUT_FILE), 'w') as f:
+                    json.dump(output, f)
+
+            meta.update({'key': key, 'task_dir': task_dir, 'files': files, 'created_at': time()})
+            with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+                json.dump(meta, f)
+
+            os.rename(tmp_dir, self._entry_dir(key))
+            return True
+        except OSError:
+            return False  # added by another worker in the meantime, or unable to write
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def restore(self, key, task_dir):
+        """
+        Put output.json and files of the entry in task dir, paths in output.json that pointed to the task
+        dir of the stored run are changed to point to task_dir
+        :return: True on a hit
+        """
+        meta = self.get(key)
+        if not meta:
+            return False
+
+        entry_dir = self._entry_dir(key)
+        try:
+            for rel_path in meta.get('files', []):
+                dst = os.path.join(task_dir, rel_path)
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                _copy(os.path.join(entry_dir, FILES_DIR, rel_path), dst)
+
+            if os.path.isfile(os.path.join(entry_dir, OUTPUT_FILE)):
+                with open(os.path.join(entry_dir, OUTPUT_FILE), 'r') as f:
+                    output = _replace_prefix(json.load(f), meta['task_dir'], os.path.realpath(task_dir))
+                with open(os.path.join(task_dir, OUTPUT_FILE), 'w') as f:
+                    json.dump(output, f)
+        except (OSError, ValueError):
+            return False  # entry removed while being restored, run the task instead
+        return True
+
+    def entries(self):
+        try:
+            keys = [k for k in os.listdir(self._memo_dir) if not k.startswith('.')]
+        except OSError:
+            return []
+        return [m for m in (self.get(k) for k in keys) if m]
+
+    def invalidate(self, keys=None, task_name=None, job_id=None, before=None):
+        """
+        Remove entries matching all given conditions
+        :param before: remove entries created before this time
+        :return: number of entries removed
+        """
+        removed = 0
+        for meta in self.entries():
+            if keys and meta['key'] not in keys:
+                continue
+            if task_name and meta.get('task_name') != task_name:
+                continue
+            if job_id and meta.get('job_id') != job_id:
+                continue
+            if before and meta.get('created_at', 0) >= before:
+                continue
+            shutil.rmtree(self._entry_dir(meta['key']), ignore_errors=True)
+            removed += 1
+        return removed
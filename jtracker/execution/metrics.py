@@ -0,0 +1,195 @@
+import os
+import threading
+import multiprocessing
+from time import monotonic
+from queue import Empty
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 600, 1800, 3600)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for k, v in labels)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry(object):
+    """
+    Executor metrics: counters, gauges and histograms rendered in Prometheus text format.
+
+    The registry is created in the executor process and inherited by worker processes on fork.
+    Updates made in any other process are sent to the executor through a multiprocessing queue
+    and applied there by a collector thread, so callers do not need to know where they run.
+    """
+    def __init__(self, namespace='jt'):
+        self._namespace = namespace
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._meta = {}  # name => (type, help, buckets)
+        self._values = {}  # (name, labels) => value, list of bucket counts + [sum, count] for histogram
+        self._events = multiprocessing.Queue()
+        self._collector = None
+        self._httpd = None
+
+    def counter(self, name, help_text):
+        self._meta[self._name(name)] = ('counter', help_text, None)
+
+    def gauge(self, name, help_text):
+        self._meta[self._name(name)] = ('gauge', help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._meta[self._name(name)] = ('histogram', help_text, tuple(buckets))
+
+    def inc(self, name, value=1, **labels):
+        self._update('inc', name, value, labels)
+
+    def set(self, name, value, **labels):
+        self._update('set', name, value, labels)
+
+    def observe(self, name, value, **labels):
+        self._update('observe', name, value, labels)
+
+    def _name(self, name):
+        return '%s_%s' % (self._namespace, name)
+
+    def _update(self, op, name, value, labels):
+        key = (self._name(name), tuple(sorted(labels.items())))
+        if os.getpid() != self._pid:
+            self._events.put((op, key, value))
+        else:
+            self._apply(op, key, value)
+
+    def _apply(self, op, key, value):
+        with self._lock:
+            if op == 'inc':
+                self._values[key] = self._values.get(key, 0) + value
+            elif op == 'set':
+                self._values[key] = value
+            else:
+                buckets = self._meta[key[0]][2]
+                counts = self._values.setdefault(key, [0] * (len(buckets) + 2))
+                for i, b in enumerate(buckets):
+                    if value <= b:
+                        counts[i] += 1
+                counts[-2] += value
+                counts[-1] += 1
+
+    def collect(self, timeout=None):
+        """
+        Apply updates sent from worker processes, blocks up to timeout for the first one
+        """
+        try:
+            while True:
+                self._apply(*self._events.get(timeout=timeout))
+                timeout = 0
+        except Empty:
+            pass
+
+    def start_collector(self, textfile=None, textfile_interval=15):
+        """
+        Start background thread applying updates from worker processes, optionally writing
+        metrics to textfile every textfile_interval seconds
+        """
+        def run():
+            last_written = 0
+            while True:
+                self.collect(timeout=1)
+                if textfile and monotonic() - last_written >= textfile_interval:
+                    try:
+                        self.write_textfile(textfile)
+                    except OSError:
+                        pass
+                    last_written = monotonic()
+
+        self._collector = threading.Thread(target=run, name='metrics-collector', daemon=True)
+        self._collector.start()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            values = sorted(self._values.items())
+        for name in sorted(self._meta):
+            type_, help_text, buckets = self._meta[name]
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, type_))
+            for (n, labels), value in values:
+                if n != name:
+                    continue
+                if type_ != 'histogram':
+                    lines.append('%s%s %s' % (name, _format_labels(labels), _format_value(value)))
+                    continue
+                for b, count in zip(buckets + (float('inf'),), value[:-2] + [value[-1]]):
+                    lines.append('%s_bucket%s %s' % (name, _format_labels(labels + (('le', _format_value(b)),)),
+                                                     count))
+                lines.append('%s_sum%s %s' % (name, _format_labels(labels), _format_value(value[-2])))
+                lines.append('%s_count%s %s' % (name, _format_labels(labels), value[-1]))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """
+        Write metrics for node exporter textfile collector, the file is replaced atomically
+        """
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Expose metrics over HTTP at http://{host}:{port}/metrics in a background thread
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                data = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name='metrics-server', daemon=True).start()
+
+    def shutdown(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+
+def executor_metrics():
+    """
+    Registry with all metrics reported by executor and its workers
+    """
+    m = MetricsRegistry()
+    m.gauge('executor_running_jobs', 'Number of jobs running by the executor')
+    m.gauge('executor_running_tasks', 'Number of tasks running by the executor')
+    m.gauge('executor_disk_free_bytes', 'Free disk space available to the executor')
+    m.counter('tasks_started_total', 'Number of tasks started')
+    m.counter('tasks_completed_total', 'Number of tasks completed')
+    m.counter('tasks_failed_total', 'Number of tasks failed')
+    m.counter('tasks_timed_out_total', 'Number of task runs stopped for exceeding a time limit')
+    m.counter('tasks_memo_hits_total', 'Number of tasks completed with result of an identical earlier run')
+    m.histogram('scheduler_rpc_seconds', 'Latency of scheduler calls')
+    m.counter('scheduler_rpc_errors_total', 'Number of failed scheduler calls')
+    m.counter('scheduler_events_total', 'Number of events received from the server event stream')
+    m.counter('payload_bytes_total', 'Bytes of request and response bodies exchanged with the server')
+    m.counter('payload_bytes_saved_total', 'Bytes of request and response bodies saved by compression')
+    m.counter('download_bytes_total', 'Bytes downloaded when provisioning input files')
+    m.counter('download_seconds_total', 'Time spent downloading input files')
+    m.histogram('staging_seconds', 'Time spent staging input files of a task')
+    return m
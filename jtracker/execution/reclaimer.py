@@ -0,0 +1,170 @@
+import os
+import json
+import shutil
+import signal
+import tarfile
+import subprocess
+from time import time, sleep
+
+
+JOB_FINISHED_FILE = '_finished.json'
+ARCHIVE_DIR = 'archive'
+RECLAIMING_PREFIX = '.reclaiming.'  # job dir is renamed to this prefix + its name while it is archived and removed
+
+GC_ACTIONS = ('keep', 'delete', 'compress')
+
+
+def mark_job_finished(job_dir, job_id, state):
+    """
+    Called by executor once a job is no longer running, only job dirs with this marker are reclaimed
+    """
+    path = os.path.join(job_dir, JOB_FINISHED_FILE)
+    tmp_path = '%s.tmp' % path
+    with open(tmp_path, 'w') as f:
+        json.dump({'job_id': job_id, 'state': state, 'finished_at': time()}, f)
+    os.replace(tmp_path, path)
+
+
+def lower_priority():
+    """
+    Lowest CPU priority and idle I/O class for the current process, so running tasks are not disturbed
+    """
+    try:
+        os.nice(19)
+    except OSError:
+        pass
+    try:
+        subprocess.call(['ionice', '-c', '3', '-p', str(os.getpid())],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        pass  # ionice not available
+
+
+class Reclaimer(object):
+    """
+    Remove or archive dirs of finished jobs according to retention policy:
+
+        action: 'delete' removes the job dir, 'compress' archives it without downloaded job data
+                to {executor dir}/archive/job.{id}.tar.gz then removes it, 'keep' does nothing
+        keep_completed_days: days a completed job dir is kept before the action
+        keep_failed_days: days a failed (or not cleanly finished) job dir is kept before the action
+
+    Only job dirs the executor marked finished are considered, outputs are reported to the server by then.
+    An executor resuming a job removes the marker, so a job dir is renamed aside before it is reclaimed,
+    and renamed back when the marker turns out to be gone.
+    """
+    def __init__(self, executor_dirs, action='keep', keep_completed_days=1, keep_failed_days=7, logger=None):
+        self._executor_dirs = executor_dirs
+        self._action = action
+        self._keep = {'completed': keep_completed_days * 86400, 'failed': keep_failed_days * 86400}
+        self._logger = logger
+
+    @property
+    def action(self):
+        return self._action
+
+    @property
+    def executor_dirs(self):
+        return self._executor_dirs
+
+    @staticmethod
+    def _finished(job_dir):
+        try:
+            with open(os.path.join(job_dir, JOB_FINISHED_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def finished_jobs(self):
+        """
+        :return: list of (job dir, finished marker) for finished jobs due for reclaiming
+        """
+        due = []
+        for executor_dir in self._executor_dirs:
+            try:
+                entries = [e for e in os.scandir(executor_dir) if e.name.startswith('job.') and e.is_dir()]
+            except OSError:
+                continue
+            for e in entries:
+                finished = self._finished(e.path)
+                if finished is None:
+                    continue
+                keep = self._keep['completed' if finished.get('state') == 'completed' else 'failed']
+                if time() - finished.get('finished_at', 0) >= keep:
+                    due.append((e.path, finished))
+        return due
+
+    def reclaim(self, job_dir, finished=None):
+        """
+        :param finished: finished marker the job dir was picked by, it is not reclaimed when that changed
+        :return: whether the job dir was reclaimed
+        """
+        current = self._finished(job_dir)
+        if current is None or (finished is not None and current != finished):
+            return False  # job resumed since it was picked
+
+        name = os.path.basename(job_dir)
+        reclaiming_dir = os.path.join(os.path.dirname(job_dir), RECLAIMING_PREFIX + name)
+        os.rename(job_dir, reclaiming_dir)  # executor resuming the job from now on starts with a new job dir
+        if self._finished(reclaiming_dir) is None:  # marker removed just before the rename, job resumed
+            os.rename(reclaiming_dir, job_dir)
+            return False
+
+        if self.action == 'compress':
+            archive_dir = os.path.join(os.path.dirname(job_dir), ARCHIVE_DIR)
+            os.makedirs(archive_dir, exist_ok=True)
+            archive = os.path.join(archive_dir, '%s.tar.gz' % name)
+
+            with tarfile.open(archive + '.tmp', 'w:gz') as tar:
+                tar.add(reclaiming_dir, arcname=name,
+                        filter=lambda info: None if info.name.split('/')[1:2] == ['data'] else info)
+            os.replace(archive + '.tmp', archive)
+            self._log('Archived job dir: %s to: %s, without job data: %s' %
+                      (job_dir, archive, os.path.join(job_dir, 'data')))
+
+        shutil.rmtree(reclaiming_dir, ignore_errors=True)
+        self._log('Removed job dir: %s' % job_dir)
+        return True
+
+    def _remove_leftovers(self):
+        # job dirs renamed aside by a reclaimer that stopped before removing them
+        for executor_dir in self._executor_dirs:
+            try:
+                entries = [e for e in os.scandir(executor_dir) if e.name.startswith(RECLAIMING_PREFIX)]
+            except OSError:
+                continue
+            for e in entries:
+                if self.action == 'compress':
+                    archive = os.path.join(executor_dir, ARCHIVE_DIR, '%s.tar.gz' % e.name[len(RECLAIMING_PREFIX):])
+                    if not os.path.isfile(archive):
+                        continue  # left for a look, archiving did not finish
+                shutil.rmtree(e.path, ignore_errors=True)
+
+    def run_once(self):
+        reclaimed = 0
+        if self.action == 'keep':
+            return reclaimed
+
+        self._remove_leftovers()
+        for job_dir, finished in self.finished_jobs():
+            try:
+                if self.reclaim(job_dir, finished):
+                    reclaimed += 1
+            except (OSError, tarfile.TarError) as e:
+                self._log('Unable to reclaim job dir: %s, error: %s' % (job_dir, e))
+        return reclaimed
+
+    def run_forever(self, interval=300):
+        # run in a process forked from executor, whose signal handlers do not apply here
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for sig in (signal.SIGUSR1, signal.SIGUSR2):
+            signal.signal(sig, signal.SIG_IGN)
+        lower_priority()
+        while True:
+            self.run_once()
+            sleep(interval)
+
+    def _log(self, message):
+        if self._logger:
+            self._logger.info(message)
@@ -17,7 +17,7 @@ class Scheduler(object):
     def has_next_task(self):
         pass
 
-    def running_jobs(self):
+    def running_jobs(self, state='running', stale_ok=False):
         pass
 
     def task_completed(self, job_id, task_name, output):
@@ -25,3 +25,13 @@ class Scheduler(object):
 
     def task_failed(self, job_id, task_name, output):
         pass
+
+    @property
+    def events_connected(self):
+        return False
+
+    def subscribe(self, wake):
+        pass
+
+    def unsubscribe(self):
+        pass
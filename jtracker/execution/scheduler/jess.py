@@ -1,34 +1,115 @@
-from retrying import retry
 import requests
 import json
+import functools
+import threading
+from time import time
 from jtracker.exceptions import JessNotAvailable, WRSNotAvailable, AMSNotAvailable, AccountNameNotFound
+from jtracker.utils import iter_json_array, iter_lines, iter_sse
+from jtracker.retry import RetryPolicy
+from jtracker.compression import ACCEPT_ENCODING, DEFAULT_MIN_SIZE, TransferStats, send_json, record_received
 from .base import Scheduler
 
 
-# We may need better retry mechanism, but this will do for now
+EVENT_TYPES = ('tasks_available', 'job_state_changed')
+WORKFLOW_INFO_FIELDS = ('workflow.id', 'workflow.ver', 'workflow.name', 'workflow_owner.name')  # of the queue
+EVENT_STREAM_TIMEOUT = 90  # seconds without any data on the stream, keepalives included, before reconnecting
+
+
 def retry_if_not_available(exception):
     return isinstance(exception, JessNotAvailable) or \
            isinstance(exception, WRSNotAvailable) or \
            isinstance(exception, AMSNotAvailable)
 
 
+def timed_rpc(fn):
+    """
+    Record latency and errors of each call attempt in scheduler metrics
+    """
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if self.metrics is None:
+            return fn(self, *args, **kwargs)
+
+        start = time()
+        try:
+            return fn(self, *args, **kwargs)
+        except Exception:
+            self.metrics.inc('scheduler_rpc_errors_total', method=fn.__name__)
+            raise
+        finally:
+            self.metrics.observe('scheduler_rpc_seconds', time() - start, method=fn.__name__)
+    return wrapper
+
+
+def resilient_rpc(fallback=None, server='jess_server'):
+    """
+    Call through the scheduler's retry policy: jittered retries while the service is not available and a
+    circuit breaker per server, queue and method, so a queue failing on one server does not hold back others
+    :param fallback: name of scheduler method returning a result to use while the circuit is open
+    :param server: name of the scheduler property holding the server called
+    """
+    def decorator(fn):
+        timed_fn = timed_rpc(fn)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            endpoint = (getattr(self, server), self.queue_id, fn.__name__)
+            return self.retry_policy.call(endpoint, lambda: timed_fn(self, *args, **kwargs),
+                                          retry_if_not_available,
+                                          fallback=(lambda: getattr(self, fallback)(*args, **kwargs))
+                                          if fallback else None)
+        return wrapper
+    return decorator
+
+
 class JessScheduler(Scheduler):
     """
     Scheduler backed by JTracker Job Execution and Scheduling Services
     """
     def __init__(self, jess_server=None, wrs_server=None, ams_server=None, jt_account=None,
-                 queue_id=None):
+                 queue_id=None, response_cache=None, metrics=None, retry_policy=None,
+                 gzip_min_size=DEFAULT_MIN_SIZE,
+                 account_id=None,  # known ID of jt_account, not looked up when given
+                 workflow_info=None):  # known workflow of the queue, as returned by workflow_info, not looked up
 
         super().__init__(mode='sever')
 
+        self._metrics = metrics
+        self._retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self._last_running_jobs = {}  # state => jobs last returned by the server
+        self._gzip_min_size = gzip_min_size  # request bodies of at least this many bytes are gzip'ed, 0 for never
+        self._transfer_stats = TransferStats(metrics)
+        self._response_cache = response_cache  # optional cache for account and queue lookups
         self._jess_server = jess_server
         self._wrs_server = wrs_server
         self._ams_server = ams_server
         self._jt_account = jt_account
-        self._account_id = self._get_owner_id_by_name(jt_account)
         self._queue_id = queue_id
+        self._account_id = account_id if account_id else self._get_owner_id_by_name(jt_account)
         self._executor_id = None
-        self._get_workflow_info()
+        self._locality_applied = False  # whether the server picks jobs by the cache manifest sent to it
+        self._manifest_rejected = False  # whether requests with the cache manifest failed where ones without did not
+        self._events_supported = None  # whether the server provides the event stream, None until known
+        self._events_connected = False
+        self._events_stop = threading.Event()
+        self._event_thread = None
+        self._event_response = None  # response of the event stream being read
+        if workflow_info:
+            self._set_workflow_info(workflow_info)
+        else:
+            self._get_workflow_info()
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def retry_policy(self):
+        return self._retry_policy
+
+    @property
+    def transfer_stats(self):
+        return self._transfer_stats
 
     @property
     def jess_server(self):
@@ -74,12 +155,114 @@ class JessScheduler(Scheduler):
     def workflow_version(self):
         return self._workflow_version
 
+    @property
+    def workflow_info(self):
+        return self._workflow_info
+
+    @property
+    def locality_applied(self):
+        return self._locality_applied
+
+    @property
+    def events_supported(self):
+        return self._events_supported
+
+    @property
+    def events_connected(self):
+        return self._events_connected
+
+    def subscribe(self, wake):
+        """
+        Follow the server's event stream for this queue and executor in a background thread, wake
+        (threading.Event) is set on every 'tasks_available' or 'job_state_changed' event. When the server
+        does not provide the stream, nothing is set and callers keep polling.
+        """
+        if self._event_thread:
+            return
+
+        self._events_stop.clear()
+        self._event_thread = threading.Thread(target=self._follow_events, args=(wake,),
+                                              name='jess-events', daemon=True)
+        self._event_thread.start()
+
+    def unsubscribe(self):
+        """
+        Stop following the event stream. The thread checks for it between reads, and a blocked read is ended
+        right away with urllib3 2.3 or later, otherwise once the server sends something or the read times out.
+        """
+        self._events_stop.set()
+        self._event_thread = None
+
+        r = self._event_response
+        if r is not None and hasattr(r.raw, 'shutdown'):
+            try:
+                r.raw.shutdown()
+            except (ValueError, RuntimeError, OSError):
+                pass  # stream ended, its connection is closed or released already
+
+    def _follow_events(self, wake):
+        # GET /events/owner/{owner_name}/queue/{queue_id}/executor/{executor_id}
+        request_url = "%s/events/owner/%s/queue/%s/executor/%s" % (self.jess_server.strip('/'),
+                                                                   self.jt_account, self.queue_id,
+                                                                   self.executor_id)
+        delay = 1
+        while not self._events_stop.is_set():
+            try:
+                # not compressed, a compressed stream holds events back until a compressed block fills up
+                r = requests.get(url=request_url, stream=True, timeout=(10, EVENT_STREAM_TIMEOUT),
+                                 headers={'Accept': 'text/event-stream', 'Accept-Encoding': 'identity'})
+            except requests.RequestException:
+                r = None  # server not reachable for now, try again later
+
+            if r is not None and (r.status_code in (404, 405, 501) or (r.status_code == 200 and
+                    not r.headers.get('Content-Type', '').startswith('text/event-stream'))):
+                r.close()
+                self._events_supported = False
+                return
+
+            if r is not None and r.status_code == 200:
+                self._events_supported = True
+                self._events_connected = True
+                delay = 1
+                wake.set()  # anything may have happened while not connected
+                self._event_response = r
+                try:
+                    # read1 returns what has arrived, read(n) would hold events back until n bytes are there;
+                    # with older urllib3 lacking read1, lines are read byte by byte
+                    lines = iter_lines(r.raw.read1) if hasattr(r.raw, 'read1') else \
+                        r.iter_lines(chunk_size=1, decode_unicode=True)
+                    for event, _ in iter_sse(lines):
+                        if self._events_stop.is_set():
+                            break
+                        if event not in EVENT_TYPES:
+                            continue
+                        if self.metrics is not None:
+                            self.metrics.inc('scheduler_events_total', type=event)
+                        wake.set()
+                except (requests.RequestException, ValueError, OSError):
+                    pass  # stream broken or shut down by unsubscribe, reconnect unless stopped
+                finally:
+                    self._events_connected = False
+                    self._event_response = None
+                    r.close()
+            elif r is not None:
+                r.close()
+
+            self._events_stop.wait(delay)
+            delay = min(delay * 2, 60)
+
+    def _cached_get(self, url, endpoint):
+        if self._response_cache:
+            return self._response_cache.get(url, endpoint)
+        return requests.get(url=url)
+
+    @timed_rpc
     def _get_workflow_info(self):
         request_url = "%s/queues/owner/%s/queue/%s" % (self.jess_server.strip('/'),
                                                        self.jt_account, self.queue_id)
 
         try:
-            r = requests.get(url=request_url)
+            r = self._cached_get(request_url, 'queues')
         except:
             raise JessNotAvailable('JESS service temporarily unavailable')
 
@@ -94,16 +277,22 @@ class JessScheduler(Scheduler):
         if not isinstance(queue, dict):
             raise Exception('Specified Job Queue does not exist')
 
+        self._set_workflow_info(queue)
+
+    def _set_workflow_info(self, queue):
+        self._workflow_info = dict((k, queue.get(k)) for k in WORKFLOW_INFO_FIELDS)
         self._workflow_id = queue.get('workflow.id')
         self._workflow_version = queue.get('workflow.ver')
         self._workflow_name = "%s.%s:%s" % (queue.get('workflow_owner.name'),
                                             queue.get('workflow.name'),
                                             queue.get('workflow.ver'))
 
-    # wait: 1, 2, 4, 8, 10, 10, 10 ... seconds up to 300 seconds (5 min)
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
-    def running_jobs(self, state='running'):
+    @resilient_rpc(fallback='_last_known_running_jobs')
+    def running_jobs(self, state='running', stale_ok=False):
+        """
+        :param stale_ok: whether the jobs last returned may be used while the server is not reachable, only
+                         for decisions a stale list cannot make go wrong, eg, whether there is room for a new job
+        """
         # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/executor/{executor_id}
         request_url = "%s/jobs/owner/%s/queue/%s/executor/%s" % (self.jess_server.strip('/'),
                                                                  self.jt_account, self.queue_id, self.executor_id)
@@ -112,22 +301,26 @@ class JessScheduler(Scheduler):
             request_url += '?state=%s' % state
 
         try:
-            r = requests.get(url=request_url)
+            r = requests.get(url=request_url, headers={'Accept-Encoding': ACCEPT_ENCODING})
         except:
             raise JessNotAvailable('JESS service temporarily unavailable')
 
         if r.status_code != 200:
             raise JessNotAvailable('JESS service temporarily unavailable')
 
+        record_received(r, self.transfer_stats)
         try:
             jobs = json.loads(r.text)
         except:
             jobs = []
 
+        self._last_running_jobs[state] = jobs
         return jobs
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    def _last_known_running_jobs(self, state='running', stale_ok=False):
+        return self._last_running_jobs.get(state) if stale_ok else None
+
+    @resilient_rpc()
     def has_next_task(self):
         request_url = "%s/tasks/owner/%s/queue/%s/executor/%s/has_next_task" % (
                                                                 self.jess_server.strip('/'),
@@ -148,11 +341,15 @@ class JessScheduler(Scheduler):
         else:
             return False
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
-    def next_task(self, job_id=None, job_state=None):
-        # job_id is ignored for now
-
+    @resilient_rpc()
+    def next_task(self, job_id=None, job_state=None, cache_manifest=None):
+        """
+        :param job_id: preferred job, a hint the server may ignore
+        :param cache_manifest: encoded Bloom filter of input URLs cached on this node, sent in
+                               X-JT-Cache-Manifest header for the server to prefer jobs reusing them. When the
+                               request with it fails with a 4xx, eg, header too large, it is sent again without,
+                               and the manifest is not sent any more if that one succeeds.
+        """
         # GET /tasks/owner/{owner_name}/queue/{queue_id}/next_task
         request_url = "%s/tasks/owner/%s/queue/%s/executor/%s/next_task" % (
                                                                 self.jess_server.strip('/'),
@@ -161,22 +358,68 @@ class JessScheduler(Scheduler):
                                                                 self.executor_id
                                                                 )
 
+        params = {}
         if job_state:
-            request_url += '?job_state=%s' % job_state
+            params['job_state'] = job_state
+        if job_id:
+            params['job_id'] = job_id
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        if cache_manifest and not self._manifest_rejected:
+            headers['X-JT-Cache-Manifest'] = cache_manifest
 
         try:
-            r = requests.get(url=request_url)
+            r = requests.get(url=request_url, params=params, headers=headers)
+            if 'X-JT-Cache-Manifest' in headers and 400 <= r.status_code < 500:
+                del headers['X-JT-Cache-Manifest']
+                r = requests.get(url=request_url, params=params, headers=headers)
+                self._manifest_rejected = not 400 <= r.status_code < 500
         except:
             raise JessNotAvailable('JESS service temporarily unavailable')
 
+        if cache_manifest:
+            self._locality_applied = 'X-JT-Cache-Manifest' in headers and \
+                r.headers.get('X-JT-Cache-Locality') == 'applied'
+
         if r.status_code != 200:  # need a special response for failed job
             return json.loads('{}')  # return an empty task instead of error out, this will keep executor going
 
+        record_received(r, self.transfer_stats)
         rv = r.text if r.text else '{}'
         return json.loads(rv)
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @timed_rpc
+    def queued_jobs(self, limit=20):
+        """
+        :return: up to limit queued jobs in the order the server lists them, the list is streamed and
+                 only the jobs needed are read. Empty list when the server is not available.
+        """
+        request_url = "%s/jobs/owner/%s/queue/%s" % (self.jess_server.strip('/'), self.jt_account, self.queue_id)
+
+        jobs = []
+        try:
+            r = requests.get(url=request_url, params={'state': 'queued'}, stream=True,
+                             headers={'Accept-Encoding': ACCEPT_ENCODING})
+            received = [0]  # decompressed bytes of what was read
+
+            def chunks():
+                for chunk in r.iter_content(chunk_size=65536):
+                    received[0] += len(chunk)
+                    yield chunk
+
+            try:
+                if r.status_code == 200:
+                    for job in iter_json_array(chunks()):
+                        jobs.append(job)
+                        if len(jobs) >= limit:
+                            break
+                    record_received(r, self.transfer_stats, size=received[0])
+            finally:
+                r.close()
+        except (requests.RequestException, ValueError):
+            pass
+        return jobs
+
+    @resilient_rpc()
     def _task_ended(self, job_id, task_name, output=None, success=True):
         if output is None:
             output = dict()
@@ -197,7 +440,7 @@ class JessScheduler(Scheduler):
                                                                 operation
                                                                 )
         try:
-            r = requests.put(url=request_url, json=output)
+            r = send_json('PUT', request_url, output, min_size=self._gzip_min_size, stats=self.transfer_stats)
         except:
             raise JessNotAvailable('JESS service temporarily unavailable')
 
@@ -213,8 +456,7 @@ class JessScheduler(Scheduler):
     def task_failed(self, job_id, task_name, output):
         self._task_ended(job_id, task_name, output=output, success=False)
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @resilient_rpc(server='wrs_server')
     def get_workflow(self):
         request_url = "%s/workflows/id/%s/ver/%s" % (self.wrs_server.strip('/'),
                                                      self.workflow_id, self.workflow_version)
@@ -233,8 +475,7 @@ class JessScheduler(Scheduler):
 
         return workflow
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @resilient_rpc()
     def register_executor(self, node_id, node_ip=None):
         # JESS endpoint: /executors/owner/{owner_name}/queue/{queue_id}/node/{node_id}
 
@@ -255,8 +496,7 @@ class JessScheduler(Scheduler):
         self._executor_id = json.loads(r.text).get('id')  # executor id from the server
         return self.executor_id
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @resilient_rpc()
     def update_executor(self, action=None):
         if not action:
             return
@@ -275,12 +515,11 @@ class JessScheduler(Scheduler):
         else:
             return r.text
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @resilient_rpc(server='ams_server')
     def _get_owner_id_by_name(self, owner_name):
         request_url = '%s/accounts/%s' % (self.ams_server.strip('/'), owner_name)
         try:
-            r = requests.get(request_url)
+            r = self._cached_get(request_url, 'accounts')
         except:
             raise AMSNotAvailable('AMS service temporarily unavailable')
 
@@ -289,8 +528,7 @@ class JessScheduler(Scheduler):
 
         return json.loads(r.text).get('id')
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @resilient_rpc()
     def cancel_job(self, job_id=None):
         # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/job/{job_id}/action
         request_body = {
@@ -308,8 +546,7 @@ class JessScheduler(Scheduler):
 
         print('Job: %s cancelled' % job_id)
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @resilient_rpc()
     def suspend_job(self, job_id=None):
         # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/job/{job_id}/action
         request_body = {
@@ -327,8 +564,7 @@ class JessScheduler(Scheduler):
 
         print('Job: %s suspended' % job_id)
 
-    @retry(retry_on_exception=retry_if_not_available, wait_exponential_multiplier=1000,
-           wait_exponential_max=10000, stop_max_delay=300000)
+    @resilient_rpc()
     def resume_job(self, job_id=None):
         # call JESS endpoint: /jobs/owner/{owner_name}/queue/{queue_id}/job/{job_id}/action
         request_body = {
@@ -0,0 +1,105 @@
+import os
+import json
+from time import time
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+TRACE_FILE = 'trace.jsonl'
+
+# span covering the whole task run, other spans are phases within it
+TASK_SPAN = 'task'
+
+
+class Tracer(object):
+    """
+    Record timed spans as JSON lines appended to a trace file shared by workers of an executor.
+    Each line is written with a single append, so lines from concurrent workers do not interleave.
+    """
+    def __init__(self, path, **context):
+        self._path = path
+        self._context = context
+
+    @property
+    def path(self):
+        return self._path
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time the enclosed block, attributes may be added to the yielded dict inside the block
+        """
+        start = time()
+        attrs = dict(attrs)
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            end = time()
+            attrs['duration'] = end - start
+            self.record(name, start, end, **attrs)
+
+    def record(self, name, start, end, **attrs):
+        span = dict(self._context)
+        span.update(attrs)
+        span.update({'span': name, 'start': start, 'end': end, 'duration': end - start})
+        try:
+            fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(span) + '\n').encode())
+            finally:
+                os.close(fd)
+        except OSError:
+            pass  # tracing must never fail a task
+
+
+def iter_spans(paths):
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # partially written line
+        except OSError:
+            continue
+
+
+def summarize(spans, by_task=False):
+    """
+    Summarize where task wall time goes
+    :return: dict with 'tasks', 'jobs', 'wall_time' and 'phases', phases maps
+             (task_name, phase) when by_task else phase to count, total, mean, max and share of wall time
+    """
+    jobs = set()
+    tasks = 0
+    wall_time = defaultdict(float)
+    phases = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0})
+
+    for s in spans:
+        group = s.get('task_name') if by_task else None
+        if s.get('span') == TASK_SPAN:
+            tasks += 1
+            jobs.add(s.get('job_id'))
+            wall_time[group] += s.get('duration', 0)
+            continue
+
+        p = phases[(group, s.get('span')) if by_task else s.get('span')]
+        p['count'] += 1
+        p['total'] += s.get('duration', 0)
+        p['max'] = max(p['max'], s.get('duration', 0))
+
+    for key, p in phases.items():
+        total_wall = wall_time[key[0] if by_task else None]
+        p['mean'] = p['total'] / p['count']
+        p['share'] = p['total'] / total_wall if total_wall else None
+
+    return {
+        'tasks': tasks,
+        'jobs': len(jobs),
+        'wall_time': sum(wall_time.values()),
+        'phases': dict(phases)
+    }
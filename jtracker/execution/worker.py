@@ -3,14 +3,25 @@ import re
 import errno
 import subprocess
 import json
+import hashlib
+import sqlite3
+import signal
+import multiprocessing
 import requests
 from time import sleep, time
 from uuid import uuid4
 from random import random
 from .. import __version__ as ver
+from .tracing import Tracer, TRACE_FILE, TASK_SPAN
+from .history import history_of, PeakDirSize
+from .locality import CacheManifest
+from .memo import MemoCache, MEMO_DIR
+from .logs import add_task_log
+from .markers import write_task_state, read_task_state, file_stamps, changed_files
+from ..utils import parse_duration
 
 
-def download_file(local_path, url, logger):
+def download_file(local_path, url, logger, metrics=None):
     logger.debug('File provisioner, local_path: %s, url: %s' % (local_path, url))
 
     wait_time = 0
@@ -57,6 +68,8 @@ def download_file(local_path, url, logger):
 
         # now actual download
         logger.debug('Downloading from: %s' % url)
+        downloaded = 0
+        download_start = time()
         try:
             r = requests.get(url, stream=True)
             if r.status_code >= 400:
@@ -66,6 +79,7 @@ def download_file(local_path, url, logger):
                 for chunk in r.iter_content(chunk_size=1024):
                     if chunk:
                         f.write(chunk)
+                        downloaded += len(chunk)
         except Exception as e:
             if os.path.isfile(local_path):
                 os.remove(local_path)  # remove unfinished file
@@ -73,6 +87,10 @@ def download_file(local_path, url, logger):
                 os.remove(local_path + '.__downloading__')  # remove flag
             raise Exception(e)
 
+        if metrics:
+            metrics.inc('download_bytes_total', downloaded)
+            metrics.inc('download_seconds_total', time() - download_start)
+
         # update the flag to indicate file is ready
         os.rename(local_path + '.__downloading__', local_path + '.__ready__')
         logger.debug('Download completed for: %s' % url)
@@ -84,9 +102,61 @@ def download_file(local_path, url, logger):
     return False
 
 
+WATCH_INTERVAL = 5  # seconds between checks on a running command with time limits
+STOP_GRACE = 10  # seconds a timed out command has to exit on SIGTERM before SIGKILL
+STAGED_FIELDS = ('source', 'staged_input', 'inputs')  # kept in task state marker through later phases
+
+
+def task_output(task_dir, jt=None):
+    """
+    :return: output.json in task dir with the '_jt_' block added, as reported to the server
+    """
+    try:
+        with open(os.path.join(task_dir, 'output.json'), 'r') as f:
+            output = json.load(f)
+    except:
+        output = dict()  # when there is no output.json file
+
+    if jt is not None:
+        output.update({'_jt_': jt})
+    return output
+
+
+def command_cpu_ticks(pid):
+    """
+    CPU time in clock ticks used by live processes of a command: those in its process group and its
+    descendants, which may have moved to groups of their own. Includes their waited-for children.
+    :return: ticks, None when /proc is not available
+    """
+    try:
+        pids = [int(p) for p in os.listdir('/proc') if p.isdigit()]
+    except OSError:
+        return None
+
+    procs = {}  # pid => (ppid, pgrp, ticks)
+    for p in pids:
+        try:
+            with open('/proc/%s/stat' % p, 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue  # exited
+        fields = stat[stat.rindex(')') + 2:].split()  # from 'state', command name may contain spaces
+        procs[p] = (int(fields[1]), int(fields[2]), sum(int(t) for t in fields[11:15]))  # utime to cstime
+
+    ticks = 0
+    for p, (ppid, pgrp, t) in procs.items():
+        ancestor = p
+        while ancestor not in (pid, 0, 1) and ancestor in procs and procs[ancestor][1] != pid:
+            ancestor = procs[ancestor][0]
+        if ancestor == pid or procs.get(ancestor, (0, 0))[1] == pid:
+            ticks += t
+    return ticks
+
+
 class Worker(object):
     def __init__(self, jt_home=None, account_id=None, retries=2,
-                 scheduler=None, node_id=None, node_ip=None, logger=None):
+                 scheduler=None, node_id=None, node_ip=None, metrics=None, logger=None,
+                 task_timeout=None, idle_timeout=None, memo=False):
         self._id = str(uuid4())
         self._jt_home = jt_home
         self._account_id = account_id
@@ -95,12 +165,24 @@ class Worker(object):
         self._retries = retries
         self._scheduler = scheduler
         self._task = None
+        self._metrics = metrics
         self._logger = logger
+        self._interrupted = False  # set by the SIGTERM handler, which must not take locks or log
+        self._task_timeout = task_timeout  # default for tasks not setting 'timeout' in runtime
+        self._idle_timeout = idle_timeout  # default for tasks not setting 'idle_timeout' in runtime
+        self._memo = memo  # reuse results of identical earlier runs of tasks on this node
+        self._memo_cache = None
+        self._command = None
+        self._command_pgid = multiprocessing.RawValue('i', 0)  # shared with executor to stop the command
 
     @property
     def id(self):
         return self._id
 
+    @property
+    def metrics(self):
+        return self._metrics
+
     @property
     def logger(self):
         return self._logger
@@ -179,8 +261,46 @@ class Worker(object):
     def task(self):
         return self._task
 
-    def next_task(self, job_state=None):
-        self._task = self.scheduler.next_task(job_state=job_state)
+    @property
+    def interrupted(self):
+        return self._interrupted
+
+    @property
+    def memo(self):
+        """
+        MemoCache of the workflow on this node, None when memoization is off
+        """
+        if self._memo and self._memo_cache is None:
+            self._memo_cache = MemoCache(os.path.join(self.workflow_dir, MEMO_DIR))
+        return self._memo_cache
+
+    @property
+    def command_pgid(self):
+        """
+        Process group of the running task command, 0 when no command is running
+        """
+        return self._command_pgid.value
+
+    def interrupt(self, signum=None, frame=None):
+        """
+        SIGTERM handler in worker process, the signal is passed on to the process group of the running
+        command. The task ends as cancelled without further retries, which is logged by run.
+        """
+        self._interrupted = True
+        if self._command:
+            try:
+                os.killpg(self._command.pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def _pause(self, seconds):
+        # sleep in short steps to notice interruption, sleep itself resumes after the signal handler returns
+        end = time() + seconds
+        while not self.interrupted and time() < end:
+            sleep(min(1, end - time()))
+
+    def next_task(self, job_state=None, job_id=None, cache_manifest=None):
+        self._task = self.scheduler.next_task(job_id=job_id, job_state=job_state, cache_manifest=cache_manifest)
         return self.task
 
     def run(self):
@@ -188,15 +308,36 @@ class Worker(object):
         if not self.task:
             raise Exception("Must first get a task before calling 'run'")
 
-        self._init_task_dir()
+        task_start = time()
+        tracer = Tracer(os.path.join(self.executor_dir, TRACE_FILE),
+                        job_id=self.task.get('job.id'), task_name=self.task.get('name'), worker_id=self.id)
+
+        with tracer.span('init_task_dir'):
+            self._init_task_dir()
+        try:
+            add_task_log(self.logger, self.task_dir)
+        except OSError as e:
+            self.logger.debug('Unable to open task log, error: %s' % e)
 
         time_start = int(time())
 
         self.logger.info('Worker starts to work on task: %s in job: %s' % (self.task.get('name'), self.task.get('job.id')))
 
         file_provision_error = None
+        peak_disk = None
+        timed_out = None
+        memo_key = None
+        memo_hit = False
         try:
-            self._stage_input_files()
+            with tracer.span('stage_input_files') as span:
+                source = self._task_source()
+                if self._reuse_staged_input(source):
+                    span['reused'] = True
+                else:
+                    self._stage_input_files()
+                    self._mark_staged(source)
+            if self.metrics:
+                self.metrics.observe('staging_seconds', span['duration'])
         except Exception as e:
             file_provision_error = 'File provisioning error: %s' % str(e)
             self.logger.debug("File provisioning failed, error: %s" % e)
@@ -208,38 +349,79 @@ class Worker(object):
         else:
             command = self._task_command_builder()
             self.logger.debug("Task command is: %s" % command)
-
-            for n in range(self.retries + 1):
-                success = True  # assume task complete
-                if n > 0:
-                    pause = 100 * 2 ** n
-                    self.logger.info('Task: %s failed, retry in %s seconds; job: %s' %
-                          (self.task.get('name'), pause, self.task.get('job.id')))
-                    sleep(pause)  # pause before retrying
-                    self.logger.info('No %s retry on task: %s; job: %s' %
-                          (n, self.task.get('name'), self.task.get('job.id')))
-                try:
-                    p = subprocess.Popen([command], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-                    stdout, stderr = p.communicate()
-                except Exception as e:
-                    success = False
-
-                # log the stdout/stderr
-                with open(os.path.join(self.task_dir, 'stdout.txt'), 'a') as o:
-                    o.write("Run no: %s, STDOUT at: %s\n" % (n + 1, int(time())))
-                    o.write(stdout.decode("utf-8"))
-                with open(os.path.join(self.task_dir, 'stderr.txt'), 'a') as e:
-                    e.write("Run no: %s, STDERR at: %s\n" % (n + 1, int(time())))
-                    e.write(stderr.decode("utf-8"))
-
-                if p.returncode != 0 or success is False:
-                    if 'KeyboardInterrupt' in stderr.decode("utf-8"):
+            timeout, idle_timeout = self._task_time_limits()
+
+            memo_key = self._memo_key(command) if self.memo else None
+            if memo_key and self.memo.restore(memo_key, self.task_dir):
+                self.logger.info('Task: %s in job: %s has result from an identical earlier run, memo key: %s' %
+                                 (self.task.get('name'), self.task.get('job.id'), memo_key))
+                success = memo_hit = True
+                if self.metrics:
+                    self.metrics.inc('tasks_memo_hits_total')
+            else:
+                peak_disk = PeakDirSize(self.task_dir).start()
+                for n in range(self.retries + 1):
+                    success = True  # assume task complete
+                    timed_out = None
+                    if n > 0:
+                        pause = 100 * 2 ** n
+                        self.logger.info('Task: %s failed, retry in %s seconds; job: %s' %
+                              (self.task.get('name'), pause, self.task.get('job.id')))
+                        with tracer.span('retry_wait', run=n + 1):
+                            self._pause(pause)  # pause before retrying
+                    if self.interrupted:
+                        success = None  # task cancelled
+                        break
+                    if n > 0:
+                        self.logger.info('No %s retry on task: %s; job: %s' %
+                              (n, self.task.get('name'), self.task.get('job.id')))
+                    # stdout/stderr go to the log files as they are written, the watchdog tells progress by them
+                    with open(os.path.join(self.task_dir, 'stdout.txt'), 'a') as o, \
+                            open(os.path.join(self.task_dir, 'stderr.txt'), 'a') as e, \
+                            tracer.span('command', run=n + 1) as span:
+                        o.write("Run no: %s, STDOUT at: %s\n" % (n + 1, int(time())))
+                        e.write("Run no: %s, STDERR at: %s\n" % (n + 1, int(time())))
+                        o.flush()
+                        e.flush()
+                        stderr_offset = e.tell()
+                        try:
+                            # own process group, so the command and all it starts can be stopped together
+                            p = subprocess.Popen([command], stdout=o, stderr=e, shell=True, start_new_session=True)
+                            self._command = p
+                            self._command_pgid.value = p.pid
+                            write_task_state(self.task_dir, 'running', keep=STAGED_FIELDS, run=n + 1, pid=p.pid)
+                            timed_out = self._watch_command(p, timeout, idle_timeout)
+                            if self.interrupted:
+                                self._stop_command(p)  # processes of the command that outlived its shell
+                            span['returncode'] = p.returncode
+                        except Exception as ex:
+                            success = False
+                        finally:
+                            self._command = None
+                            self._command_pgid.value = 0
+
+                    with open(os.path.join(self.task_dir, 'stderr.txt'), 'rb') as e:
+                        e.seek(stderr_offset)
+                        stderr = e.read()
+
+                    if self.interrupted:
                         success = None  # task cancelled
                         break
+                    elif timed_out:
+                        success = False  # task failed, retried like any other failure
+                    elif success is False or p.returncode != 0:
+                        if 'KeyboardInterrupt' in stderr.decode("utf-8"):
+                            success = None  # task cancelled
+                            break
+                        else:
+                            success = False  # task failed
                     else:
-                        success = False  # task failed
-                else:
-                    break  # success
+                        break  # success
+                peak_disk.stop()
+                if success and memo_key:
+                    self.memo.store(memo_key, self.task_dir, task_name=self.task.get('name'),
+                                    job_id=self.task.get('job.id'), workflow_id=self.workflow_id,
+                                    workflow_version=self.workflow_version)
 
         time_end = int(time())
 
@@ -249,11 +431,8 @@ class Worker(object):
         """
 
         # get output.json
-        try:
-            with open(os.path.join(self.task_dir, 'output.json'), 'r') as f:
-                output = json.load(f)
-        except:
-            output = dict()  # when there is no output.json file
+        with tracer.span('read_output'):
+            output = task_output(self.task_dir)
 
         _jt_ = {
             'jtcli_version': ver,
@@ -271,26 +450,210 @@ class Worker(object):
             }
         }
 
+        if timed_out:
+            _jt_['timeout'] = timed_out  # time limit the last run was stopped for
+        if memo_key:
+            _jt_['memo'] = {'key': memo_key, 'hit': memo_hit}
+
         output.update({'_jt_': _jt_})
 
         job_id = self.task.get('job.id')
         task_name = self.task.get('name')
-        if success:
-            self.logger.info('Task completed, task: %s, job: %s' % (task_name, job_id))
-            self.scheduler.task_completed(job_id=job_id,
-                                          task_name=task_name,
-                                          output=output)
-            exit(0)
-        elif success is None:
-            self.logger.info('Task cancelled, task: %s, job: %s' % (task_name, job_id))
-            exit(2)
-        else:
-            self.logger.info('Task failed, task: %s, job: %s' % (task_name, job_id))
-            self.logger.info('STDERR: %s' % file_provision_error if file_provision_error else stderr.decode("utf-8"))
-            self.scheduler.task_failed(job_id=job_id,
-                                       task_name=task_name,
-                                       output=output)
-            exit(1)
+        # outcome is kept until reported, a resumed executor reports it if this worker does not get to,
+        # output.json is read from the task dir again then, so only the '_jt_' block goes in the marker
+        write_task_state(self.task_dir, 'exited', keep=STAGED_FIELDS, job_id=job_id, task_name=task_name,
+                         state=_jt_['state'], jt=_jt_)
+        if success is not None and peak_disk:
+            self._record_history(_jt_['state'], time() - task_start, peak_disk.peak)
+        if self.metrics and success is not None:
+            self.metrics.inc('tasks_completed_total' if success else 'tasks_failed_total', task=task_name)
+
+        try:
+            if success:
+                self.logger.info('Task completed, task: %s, job: %s' % (task_name, job_id))
+                with tracer.span('task_ended'):
+                    self.scheduler.task_completed(job_id=job_id,
+                                                  task_name=task_name,
+                                                  output=output)
+                rc = 0
+            elif success is None:
+                self.logger.info('Task cancelled, task: %s, job: %s' % (task_name, job_id))
+                rc = 2
+            else:
+                self.logger.info('Task failed, task: %s, job: %s' % (task_name, job_id))
+                self.logger.info('STDERR: %s' % file_provision_error if file_provision_error else stderr.decode("utf-8"))
+                with tracer.span('task_ended'):
+                    self.scheduler.task_failed(job_id=job_id,
+                                               task_name=task_name,
+                                               output=output)
+                rc = 1
+            if rc != 2:
+                write_task_state(self.task_dir, 'reported', keep=STAGED_FIELDS, job_id=job_id, task_name=task_name,
+                                 state=_jt_['state'])
+        finally:
+            tracer.record(TASK_SPAN, task_start, time(), state=_jt_['state'])
+
+        exit(rc)
+
+    def _memo_key(self, command):
+        """
+        Key of the task result in memo cache, dirs of the job and the task are left out so identical
+        runs in other jobs match
+        :return: key, None when the task opts out with 'memo: false' in runtime
+        """
+        task = json.loads(self.task.get('task_file'))
+        if (task.get('runtime') or {}).get('memo') is False:
+            return None
+
+        def normalize(value):
+            return value.replace(self.task_dir, '${_task_dir}').replace(self.job_dir, '${_job_dir}')
+
+        input_files = {}
+        for v in task.get('input', {}).values():
+            for i in (v if isinstance(v, list) else [v]):
+                if isinstance(i, str) and i and os.path.isfile(os.path.join(self.task_dir, i)):
+                    input_files[normalize(i)] = os.path.join(self.task_dir, i)
+
+        try:
+            return self.memo.key(self.workflow_id, self.workflow_version, self.task.get('name'),
+                                 normalize(command), input_files)
+        except OSError as e:
+            self.logger.debug('Unable to compute memo key, error: %s' % e)
+            return None
+
+    def _task_time_limits(self):
+        """
+        :return: wall clock timeout and idle timeout in seconds of the task, from task runtime or worker
+                 defaults, None for no limit
+        """
+        runtime = json.loads(self.task.get('task_file')).get('runtime') or {}
+        limits = []
+        for key, default in (('timeout', self._task_timeout), ('idle_timeout', self._idle_timeout)):
+            try:
+                limits.append(parse_duration(runtime.get(key)) if runtime.get(key) is not None else default)
+            except ValueError as e:
+                self.logger.info('Ignored %s in runtime of task: %s, %s' % (key, self.task.get('name'), e))
+                limits.append(default)
+        return limits
+
+    def _watch_command(self, p, timeout=None, idle_timeout=None):
+        """
+        Wait for the command to finish. It is stopped when it runs longer than timeout, or when for
+        idle_timeout it neither writes to stdout/stderr nor uses CPU
+        :return: None, or dict of the time limit hit by the command
+        """
+        if not (timeout or idle_timeout):
+            p.wait()
+            return None
+
+        interval = min(t for t in (WATCH_INTERVAL, timeout, idle_timeout) if t)
+        start = last_progress = time()
+        last_mark = None
+        while True:
+            try:
+                p.wait(timeout=interval)
+                return None
+            except subprocess.TimeoutExpired:
+                pass
+
+            now = time()
+            if timeout and now - start >= timeout:
+                timed_out = {'type': 'wall_clock', 'seconds': timeout}
+            elif idle_timeout:
+                mark = (command_cpu_ticks(p.pid),
+                        os.path.getsize(os.path.join(self.task_dir, 'stdout.txt')),
+                        os.path.getsize(os.path.join(self.task_dir, 'stderr.txt')))
+                if mark != last_mark:
+                    last_mark, last_progress = mark, now
+                    continue
+                if now - last_progress < idle_timeout:
+                    continue
+                timed_out = {'type': 'idle', 'seconds': idle_timeout}
+            else:
+                continue
+
+            self.logger.info('Task: %s in job: %s hit %s timeout of %s seconds, stopping it' %
+                             (self.task.get('name'), self.task.get('job.id'), timed_out['type'], timed_out['seconds']))
+            self._stop_command(p)
+            if self.metrics:
+                self.metrics.inc('tasks_timed_out_total', type=timed_out['type'])
+            return timed_out
+
+    @staticmethod
+    def _stop_command(p, grace=STOP_GRACE):
+        """
+        SIGTERM to the process group of the command, SIGKILL to whatever is left of it after grace seconds
+        """
+        try:
+            os.killpg(p.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+        deadline = time() + grace
+        while time() < deadline:
+            p.poll()  # reap the shell, group is gone once all its processes exited
+            try:
+                os.killpg(p.pid, 0)
+            except OSError:
+                break
+            sleep(0.1)
+
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        p.wait()
+
+    def _task_source(self):
+        """
+        :return: digest of task command and input as received from the server, before staging
+        """
+        task = json.loads(self.task.get('task_file'))
+        return hashlib.sha256(json.dumps([task.get('command'), task.get('input')], sort_keys=True).encode()).hexdigest()
+
+    def _mark_staged(self, source):
+        task = json.loads(self.task.get('task_file'))
+        paths = []
+        for v in task.get('input', {}).values():
+            for i in (v if isinstance(v, list) else [v]):
+                if isinstance(i, str) and i and os.path.isfile(os.path.join(self.task_dir, i)):
+                    paths.append(os.path.join(self.task_dir, i))
+        write_task_state(self.task_dir, 'staged', source=source, staged_input=task.get('input', {}),
+                         inputs=file_stamps(paths))
+
+    def _reuse_staged_input(self, source):
+        """
+        Use input staged by an earlier run of the same task, eg, before the executor was restarted, when the
+        task is unchanged and the staged files are as they were left
+        :return: True when staged input is reused
+        """
+        state = read_task_state(self.task_dir)
+        if not state or state.get('source') != source or 'staged_input' not in state:
+            return False
+
+        changed = changed_files(state.get('inputs', {}))
+        if changed:
+            for path in changed:
+                try:
+                    os.remove(path + '.__ready__')  # provision it again
+                except OSError:
+                    pass
+            return False
+
+        task = json.loads(self.task.get('task_file'))
+        task['input'] = state['staged_input']
+        self._task['task_file'] = json.dumps(task)
+        self.logger.info('Reuse input staged earlier for task: %s, job: %s' %
+                         (self.task.get('name'), self.task.get('job.id')))
+        return True
+
+    def _record_history(self, state, wall_time, disk_bytes):
+        try:
+            history = history_of(self.queue_dir, self.scheduler)
+            history.record_task(self.task.get('name'), self.task.get('job.id'), state, wall_time, disk_bytes)
+            history.close()
+        except sqlite3.Error as e:
+            self.logger.debug('Unable to record task history: %s' % e)  # history must never fail a task
 
     def _init_task_dir(self):
         try:
@@ -384,11 +747,13 @@ class Worker(object):
     def _provision_file(self, file_url):
         m = re.match("\[(.+)\]((http|https)://.+)", file_url)
         local_path, url = None, None
+        shared = False
 
         if m:
             local_path, url = m.group(1), m.group(2)
             if '${_wf_data}' in local_path:
                 local_path = local_path.replace('${_wf_data}', os.path.join(self.workflow_dir, 'data'))
+                shared = not os.path.isfile(local_path + '.__ready__')  # to be added to the manifest
             else:
                 local_path = os.path.join(self.job_dir, 'data', local_path)  # job level data
 
@@ -405,7 +770,9 @@ class Worker(object):
                 local_path = os.path.join(self.task_dir, local_path)
 
         if url:  # perform the actual file previsioning
-            if not download_file(local_path, url, self.logger):
+            if not download_file(local_path, url, self.logger, metrics=self.metrics):
                 raise('File provisioning failed, url: %s' % url)
+            if shared:  # let the executor prefer jobs reusing files provisioned for workflow
+                CacheManifest(os.path.join(self.workflow_dir, 'data')).add(url, local_path)
 
         return local_path
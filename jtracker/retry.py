@@ -0,0 +1,203 @@
+import bisect
+import random
+import threading
+from time import time, sleep
+
+
+class CircuitBreaker(object):
+    """
+    Circuit of one server endpoint. After `failures` consecutive failed calls the circuit opens and calls
+    are not sent; once it has been open for about `reset_after` seconds (jittered, so clients do not all
+    come back at once) one trial call is let through, closing the circuit on success or opening it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failures=5, reset_after=30, rand=None):
+        self._failures = failures
+        self._reset_after = reset_after
+        self._random = rand or random.Random()
+        self._state = self.CLOSED
+        self._failed = 0
+        self._open_until = 0
+        self._trial_at = 0
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def is_open(self):
+        return self._state != self.CLOSED
+
+    @property
+    def last_error(self):
+        return self._last_error
+
+    def allow(self):
+        """
+        :return: whether a call may be sent now
+        """
+        with self._lock:
+            now = time()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and now < self._open_until:
+                return False
+            if self._state == self.HALF_OPEN and now - self._trial_at < self._reset_after:
+                return False  # trial call in flight
+
+            self._state = self.HALF_OPEN
+            self._trial_at = now
+            return True
+
+    def retry_in(self):
+        """
+        :return: seconds until a call may be sent
+        """
+        with self._lock:
+            if self._state == self.OPEN:
+                return max(0, self._open_until - time())
+            if self._state == self.HALF_OPEN:
+                return max(0, self._trial_at + self._reset_after - time())
+            return 0
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failed = 0
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._last_error = error
+            self._failed += 1
+            if self._state == self.HALF_OPEN or self._failed >= self._failures:
+                self._state = self.OPEN
+                self._open_until = time() + self._reset_after * (0.5 + self._random.random())
+
+
+class RetryPolicy(object):
+    """
+    Retries of failed server calls with exponential backoff and full jitter, ie, a random wait between
+    0 and min(max_delay, base_delay * 2 ** attempt) seconds, so a fleet of executors does not retry in
+    lockstep. Calls are given up after give_up_after seconds.
+
+    Every endpoint has its own CircuitBreaker, and retries of all endpoints share a budget of `budget`
+    retries per `budget_window` seconds; when it is spent, retries wait for the window to move on. A retry
+    takes its slot in the budget before it waits, so concurrent callers do not all wait for the same slot.
+    """
+    def __init__(self, base_delay=1, max_delay=10, give_up_after=300, budget=30, budget_window=60,
+                 breaker_failures=5, breaker_reset=30, seed=None):
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._give_up_after = give_up_after
+        self._budget = budget
+        self._budget_window = budget_window
+        self._breaker_failures = breaker_failures
+        self._breaker_reset = breaker_reset
+        self._random = random.Random(seed)
+        self._breakers = {}  # endpoint => CircuitBreaker
+        self._retry_times = []  # sorted times of retries in the budget window, including ones waiting to be sent
+        self._lock = threading.Lock()
+
+    @property
+    def give_up_after(self):
+        return self._give_up_after
+
+    def breaker(self, endpoint):
+        """
+        :param endpoint: any hashable identifying what fails together, eg, (server, queue, method)
+        """
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self._breaker_failures, self._breaker_reset,
+                                                          rand=self._random)
+            return self._breakers[endpoint]
+
+    def backoff(self, attempt):
+        return self._random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+    def _reserve_retry(self, delay, give_up_at):
+        """
+        Take a slot in the retry budget for a retry sent in delay seconds, or later when the budget is spent
+        :return: seconds to wait before the retry, None when no slot is free before give_up_at
+        """
+        now = time()
+        if not self._budget:
+            return delay
+
+        with self._lock:
+            times = self._retry_times
+            del times[:bisect.bisect_right(times, now - self._budget_window)]
+
+            at = now + delay
+            if len(times) - bisect.bisect_right(times, at - self._budget_window) >= self._budget:
+                # the window is full at the wished time, wait until the budget-th latest retry leaves it
+                at = max(at, times[-self._budget] + self._budget_window +
+                         self._random.uniform(0, self._base_delay))
+            if at > give_up_at:
+                return None
+            bisect.insort(times, at)
+            return at - now
+
+    def call(self, endpoint, fn, retry_on, fallback=None):
+        """
+        Call fn until it succeeds, retrying on exceptions for which retry_on returns True
+        :param fallback: function returning a result to use while the circuit of the endpoint is open, eg,
+                         the last known good one, retries go on when it returns None
+        :return: result of fn, or of fallback
+        """
+        breaker = self.breaker(endpoint)
+        give_up_at = time() + self._give_up_after
+        attempt = 0
+        while True:
+            if breaker.allow():
+                try:
+                    rv = fn()
+                except Exception as e:
+                    if not retry_on(e):
+                        raise  # not a sign of the endpoint's health either way, the breaker is left as it is
+                    breaker.record_failure(e)
+                else:
+                    breaker.record_success()
+                    return rv
+
+                attempt += 1
+
+            if fallback is not None and breaker.is_open:
+                rv = fallback()
+                if rv is not None:
+                    return rv
+
+            delay = max(self.backoff(attempt), breaker.retry_in())
+            if time() + delay <= give_up_at and attempt:
+                delay = self._reserve_retry(delay, give_up_at)
+            if delay is None or time() + delay > give_up_at:
+                if breaker.last_error is not None:
+                    raise breaker.last_error
+                raise TimeoutError('Gave up calling: %s, circuit open' % (endpoint,))
+            sleep(delay)
+
+
+def retry_policy_from_config(jt_config):
+    """
+    Create retry policy for server calls as configured in JTracker config, eg,
+
+        retry:
+          base_delay: 1
+          max_delay: 10
+          give_up_after: 300
+          budget: 30
+          budget_window: 60
+          breaker_failures: 5
+          breaker_reset: 30
+
+    :return: RetryPolicy, with defaults for settings not given
+    """
+    conf = jt_config.get('retry') or {}
+    keys = ('base_delay', 'max_delay', 'give_up_after', 'budget', 'budget_window', 'breaker_failures',
+            'breaker_reset')
+    return RetryPolicy(**dict((k, conf[k]) for k in keys if conf.get(k) is not None))
@@ -0,0 +1,140 @@
+import re
+import json
+import codecs
+import itertools
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally decode a JSON array from an iterable of byte chunks, yielding its elements
+    one by one without holding the whole document in memory. ValueError is raised when the
+    chunks end before the closing ']', so a truncated response is not taken as a shorter array.
+
+    An element split across chunks is decoded again only once the data buffered for it has doubled,
+    so an element much larger than a chunk is not decoded again with every chunk.
+    """
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    started = False
+    expect = 'first'  # 'first' element or ']', 'element' after ',', 'separator' after an element
+    retry_at = 0  # size of the incomplete element at pos once it is worth decoding again
+
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            chunk = b''
+            retry_at = 0  # no more data, decode what is left
+        buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buf) or len(buf) - pos < retry_at:
+                break
+
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError('JSON array expected')
+                started = True
+                pos += 1
+                continue
+
+            if expect == 'separator':
+                if buf[pos] == ',':
+                    expect = 'element'
+                    pos += 1
+                    continue
+                if buf[pos] == ']':
+                    return
+                raise ValueError('Expecting "," or "]" in JSON array: %r' % buf[pos:pos + 20])
+            if expect == 'first' and buf[pos] == ']':
+                return
+
+            try:
+                obj, end = _decoder.raw_decode(buf, pos)
+            except ValueError:
+                retry_at = 2 * (len(buf) - pos)  # incomplete element, need more data
+                break
+            if end == len(buf) and not isinstance(obj, (dict, list, str)):
+                break  # a number may continue in the next chunk
+            pos = end
+            expect = 'separator'
+            retry_at = 0
+            yield obj
+
+    if not started:
+        raise ValueError('JSON array expected')
+    raise ValueError('JSON array truncated, closing "]" not found')
+
+
+def iter_lines(read, size=8192):
+    """
+    Split text lines out of a byte stream as its data arrives: read(size) returns whatever is available,
+    up to size bytes, and b'' at the end of the stream. Lines end with '\\n' or '\\r\\n', which are stripped.
+    """
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    while True:
+        chunk = read(size)
+        if not chunk:
+            break
+        lines = (buf + text_decoder.decode(chunk)).split('\n')
+        buf = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith('\r') else line
+
+    buf += text_decoder.decode(b'', final=True)
+    if buf:
+        yield buf
+
+
+def iter_sse(lines):
+    """
+    Decode server-sent events from an iterable of text lines, yielding (event type, data) of each
+    event as it completes. Comment lines, eg, keepalives, are skipped.
+    """
+    event, data = None, []
+    for line in lines:
+        if line is None:
+            continue
+        if not line:
+            if data or event:
+                yield event or 'message', '\n'.join(data)
+            event, data = None, []
+            continue
+        if line.startswith(':'):
+            continue
+
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data.append(value)
+
+
+_DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value):
+    """
+    Parse duration given as seconds, or as string with unit suffix: s, m, h or d, eg, '90', '30m', '1.5h'
+    :return: seconds (float), None when value is None or empty
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        m = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$', str(value))
+        if not m:
+            raise ValueError("Invalid duration: '%s'" % value)
+        seconds = float(m.group(1)) * _DURATION_UNITS[m.group(2)]
+    if seconds < 0:
+        raise ValueError("Invalid duration: '%s'" % value)
+    return seconds
@@ -46,7 +46,7 @@ setup(
     url='https://github.com/jtracker-io/jt-cli',
     author='Junjun Zhang',
     author_email='junjun.ca@gmail.com',
-    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
+    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests", "benchmarks", "benchmarks.*"]),
     data_files=[(home_dir, ['.jtconfig'])],
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -0,0 +1,61 @@
+import os
+import json
+from jtracker.execution import bootstrap
+from jtracker.execution.bootstrap import load_bootstrap, save_bootstrap, BOOTSTRAP_FILE
+
+
+class Scheduler(object):
+    def __init__(self, queue_id, workflow):
+        self.queue_id = queue_id
+        self.workflow_info = {'workflow.id': workflow, 'workflow.ver': '1'}
+
+
+def node_dir(jt_home, account_id='a1'):
+    path = os.path.join(jt_home, 'account.%s' % account_id, 'node')
+    os.makedirs(path)
+    return path
+
+
+def test_round_trip(tmp_path):
+    jt_home = str(tmp_path)
+    save_bootstrap(node_dir(jt_home), 'user1', 'http://ams', 'http://jess', 'a1',
+                   [Scheduler('q1', 'wf1'), Scheduler('q2', 'wf2')])
+
+    cached = load_bootstrap(jt_home, 'user1', 'http://ams', 'http://jess')
+    assert cached['account_id'] == 'a1'
+    assert sorted(cached['queues']) == ['q1', 'q2']
+    assert cached['queues']['q2']['workflow.id'] == 'wf2'
+
+    assert load_bootstrap(jt_home, 'user2', 'http://ams', 'http://jess') == {}
+    assert load_bootstrap(jt_home, 'user1', 'http://ams', 'http://other-jess') == {}
+
+
+def test_cached_queues_keep_their_entries(tmp_path, monkeypatch):
+    jt_home = str(tmp_path)
+    path = node_dir(jt_home)
+    monkeypatch.setattr(bootstrap, 'time', lambda: 1000)
+    save_bootstrap(path, 'user1', 'http://ams', 'http://jess', 'a1', [Scheduler('q1', 'wf1')])
+
+    monkeypatch.setattr(bootstrap, 'time', lambda: 2000)
+    save_bootstrap(path, 'user1', 'http://ams', 'http://jess', 'a1', [Scheduler('q1', 'wf1'), Scheduler('q2', 'wf2')],
+                   cached_queues=('q1', 'q2'))
+
+    queues = load_bootstrap(jt_home, 'user1', 'http://ams', 'http://jess')['queues']
+    assert (queues['q1']['cached_at'], queues['q2']['cached_at']) == (1000, 2000)  # q2 was not in the file
+
+
+def test_expired_and_broken_entries(tmp_path, monkeypatch):
+    jt_home = str(tmp_path)
+    path = node_dir(jt_home)
+    save_bootstrap(path, 'user1', 'http://ams', 'http://jess', 'a1', [Scheduler('q1', 'wf1')])
+
+    monkeypatch.setattr(bootstrap, 'time', lambda: 10 ** 12)
+    assert load_bootstrap(jt_home, 'user1', 'http://ams', 'http://jess') == {'account_id': 'a1', 'queues': {}}
+
+    with open(os.path.join(path, BOOTSTRAP_FILE), 'w') as f:
+        f.write('{"account_')
+    assert load_bootstrap(jt_home, 'user1', 'http://ams', 'http://jess') == {}
+    save_bootstrap(path, 'user1', 'http://ams', 'http://jess', 'a1', [Scheduler('q1', 'wf1')])
+    with open(os.path.join(path, BOOTSTRAP_FILE)) as f:
+        assert list(json.load(f)['queues']) == ['q1']
+    assert os.listdir(path) == [BOOTSTRAP_FILE]
@@ -0,0 +1,58 @@
+import io
+import json
+from unittest import mock
+import requests
+from jtracker.cli.job.bulk import BulkEnqueuer, bulk_enqueue, iter_ndjson, iter_batches
+
+
+class Response(object):
+    def __init__(self, status_code, body=''):
+        self.status_code = status_code
+        self.text = body if isinstance(body, str) else json.dumps(body)
+
+
+def enqueuer(*responses):
+    session = mock.Mock()
+    session.post.side_effect = list(responses)
+    return BulkEnqueuer('http://jess', 'owner', 'queue', session=session, batch_size=10), session
+
+
+def test_batch_results_per_job():
+    e, session = enqueuer(Response(200, [{}, {'error': 'invalid job'}]))
+    assert e.enqueue([(1, {'a': 1}), (2, {'a': 2})]) == [(1, {'a': 1}, None), (2, {'a': 2}, 'invalid job')]
+    assert session.post.call_count == 1
+
+
+def test_falls_back_to_single_posts_without_batch_endpoint():
+    e, session = enqueuer(Response(404), Response(200), Response(500, 'boom'), Response(200), Response(200))
+    assert e.enqueue([(1, {}), (2, {})]) == [(1, {}, None), (2, {}, 'boom')]
+    assert not e.batch_supported
+    assert e.enqueue([(3, {}), (4, {})])[0] == (3, {}, None)  # no batch request any more
+    assert session.post.call_count == 5
+
+
+def test_failed_batch_is_not_resent():
+    for response in (requests.Timeout('timed out'), Response(503, 'busy'), Response(200, 'not json'),
+                     Response(200, [{}])):
+        e, session = enqueuer(response)
+        results = e.enqueue([(1, {}), (2, {})])
+        assert session.post.call_count == 1
+        assert [(line, bool(error)) for line, _, error in results] == [(1, True), (2, True)]
+        assert e.batch_supported
+
+
+def test_bulk_enqueue_reports_rejects_by_line():
+    stream = io.StringIO('{"a": 1}\nnot json\n\n[1]\n{"a": 2}\n')
+    reject = io.StringIO()
+    with mock.patch('jtracker.cli.job.bulk.make_session') as make_session:
+        make_session.return_value.post.return_value = Response(200, [{}, {}])
+        assert bulk_enqueue('http://jess', 'o', 'q', stream, concurrency=2, batch_size=10, reject=reject) == (2, 2)
+
+    assert [json.loads(l)['line'] for l in reject.getvalue().splitlines()] == [2, 4]
+
+
+def test_iter_ndjson_and_batches():
+    items = list(iter_ndjson(io.StringIO('{"a": 1}\n\n"x"\n')))
+    assert items[0] == (1, {'a': 1}, None)
+    assert items[1][0] == 3 and items[1][2]
+    assert list(iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
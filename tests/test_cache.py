@@ -0,0 +1,70 @@
+import os
+import json
+from unittest import mock
+from jtracker.cache import ResponseCache
+
+
+class Response(object):
+    def __init__(self, status_code, body='', headers=None):
+        self.status_code = status_code
+        self.text = body if isinstance(body, str) else json.dumps(body)
+        self.headers = headers or {}
+
+
+def cache(tmp_path, *responses, **kwargs):
+    session = mock.Mock()
+    session.get.side_effect = list(responses)
+    return ResponseCache(str(tmp_path / 'cache'), session=session, **kwargs), session
+
+
+def test_fresh_entry_is_served_from_cache(tmp_path):
+    c, session = cache(tmp_path, Response(200, {'id': 'q1'}))
+
+    assert c.get('http://jess/queues/q1', 'queues').text == '{"id": "q1"}'
+    r = c.get('http://jess/queues/q1', 'queues')
+    assert r.from_cache and r.status_code == 200 and r.text == '{"id": "q1"}'
+    assert session.get.call_count == 1
+
+
+def test_stale_entry_is_revalidated(tmp_path):
+    c, session = cache(tmp_path, Response(200, 'v1', {'ETag': '"e1"'}), Response(304),
+                       Response(200, 'v2', {'ETag': '"e2"'}), ttls={'queues': 0})
+
+    c.get('http://jess/q', 'queues')
+    assert c.get('http://jess/q', 'queues').text == 'v1'
+    assert session.get.call_args[1]['headers'] == {'If-None-Match': '"e1"'}
+    assert c.get('http://jess/q', 'queues').text == 'v2'
+
+
+def test_errors_are_not_cached(tmp_path):
+    c, session = cache(tmp_path, Response(500, 'boom'), Response(200, 'ok'))
+
+    assert c.get('http://jess/q', 'queues').status_code == 500
+    assert c.get('http://jess/q', 'queues').text == 'ok'
+    assert session.get.call_count == 2
+
+
+def test_invalidate(tmp_path):
+    c, session = cache(tmp_path, Response(200, 'q'), Response(200, 'a'), Response(200, 'q2'), Response(200, 'a2'))
+    c.get('http://jess/q', 'queues')
+    c.get('http://ams/a', 'accounts')
+
+    c.invalidate('queues')
+    assert c.get('http://jess/q', 'queues').text == 'q2'
+    assert c.get('http://ams/a', 'accounts').from_cache
+
+    c.invalidate()
+    assert os.listdir(c.cache_dir) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    c, session = cache(tmp_path, *[Response(200, 'x' * 100) for _ in range(3)], max_size=500)
+    paths = [c._entry_path('http://jess/q%s' % i, 'queues') for i in range(3)]
+    for i in range(2):
+        c.get('http://jess/q%s' % i, 'queues')
+        os.utime(paths[i], (i, i))
+
+    c.get('http://jess/q0', 'queues')  # served from cache, now more recently used than q1
+    c.get('http://jess/q2', 'queues')  # too big for three entries
+    assert [os.path.exists(p) for p in paths] == [True, False, True]
+    assert session.get.call_count == 3
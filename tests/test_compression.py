@@ -0,0 +1,64 @@
+import gzip
+import json
+from unittest import mock
+import pytest
+from jtracker import compression
+from jtracker.compression import TransferStats, send_json, record_received
+
+
+class Response(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def no_rejecting_servers():
+    compression._rejecting_servers.clear()
+    yield
+    compression._rejecting_servers.clear()
+
+
+def sent_bodies(request):
+    return [(c[1]['headers'].get('Content-Encoding'), c[1]['data']) for c in request.call_args_list]
+
+
+def test_large_body_is_gzipped():
+    obj = {'output': 'x' * 10000}
+    stats = TransferStats()
+    with mock.patch('jtracker.compression.requests.request', return_value=Response(200)) as request:
+        assert send_json('PUT', 'http://jess/api/task', obj, min_size=1000, stats=stats).status_code == 200
+        send_json('PUT', 'http://jess/api/task', {'a': 1}, min_size=1000, stats=stats)
+
+    (encoding, body), small = sent_bodies(request)
+    assert encoding == 'gzip' and json.loads(gzip.decompress(body)) == obj
+    assert small == (None, b'{"a": 1}')
+    assert request.call_args[1]['headers']['Content-Type'] == 'application/json'
+    assert stats.saved('sent') == len(json.dumps(obj)) - len(body)
+
+
+def test_resent_uncompressed_after_415():
+    obj = {'output': 'x' * 10000}
+    with mock.patch('jtracker.compression.requests.request',
+                    side_effect=[Response(415), Response(200), Response(200), Response(200)]) as request:
+        assert send_json('PUT', 'http://jess/api/task', obj, min_size=1000).status_code == 200
+        send_json('POST', 'http://jess/api/other', obj, min_size=1000)  # same server, not compressed any more
+        send_json('POST', 'http://wrs/api/x', obj, min_size=1000)
+
+    assert [encoding for encoding, _ in sent_bodies(request)] == ['gzip', None, None, 'gzip']
+    assert json.loads(sent_bodies(request)[1][1]) == obj
+
+
+def test_never_compressed_with_min_size_0():
+    with mock.patch('jtracker.compression.requests.request', return_value=Response(200)) as request:
+        send_json('PUT', 'http://jess/api/task', {'output': 'x' * 100000}, min_size=0)
+    assert sent_bodies(request)[0][0] is None
+
+
+def test_record_received():
+    stats = TransferStats(metrics=mock.Mock())
+    r = mock.Mock(content=b'x' * 1000)
+    r.raw.tell.return_value = 100
+    record_received(r, stats)
+    assert stats.saved('received') == 900
+    stats._metrics.inc.assert_any_call('payload_bytes_saved_total', 900, direction='received')
+    assert stats.summary() == 'received: 100 bytes (1000 uncompressed)'
@@ -0,0 +1,17 @@
+import click
+import pytest
+from jtracker.cli.exec.commands import parse_queues
+
+
+def test_parse_queues():
+    assert parse_queues(('a', 'b:2', 'c:0.5')) == (['a', 'b', 'c'], {'b': 2, 'c': 0.5})
+
+
+def test_parse_queues_serves_repeated_queue_once():
+    assert parse_queues(('a', 'b:2', 'a', 'b:2', 'a:1')) == (['a', 'b'], {'b': 2})
+
+
+@pytest.mark.parametrize('queue_ids', [('a', 'a:2'), ('a:2', 'a:3'), ('a:2', 'a'), ('a:0',), ('a:x',)])
+def test_parse_queues_invalid(queue_ids):
+    with pytest.raises(click.BadParameter):
+        parse_queues(queue_ids)
@@ -0,0 +1,224 @@
+import os
+import json
+import signal
+import logging
+import subprocess
+import multiprocessing
+from time import sleep, time
+from unittest import mock
+import pytest
+from jtracker.execution import Executor
+from jtracker.execution.executor import INTERRUPTED_FILE
+from jtracker.execution.markers import write_task_state, read_task_state
+from benchmarks.executor import install_workflow
+from benchmarks.stand_in import StandInServer
+
+
+@pytest.fixture
+def jt_home(tmp_path):
+    # executor installs its own signal handlers and workers chdir into task dirs, both are put back
+    handlers = dict((s, signal.getsignal(s)) for s in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1, signal.SIGUSR2))
+    cwd = os.getcwd()
+    install_workflow(str(tmp_path))
+    yield str(tmp_path)
+    os.chdir(cwd)
+    for s, handler in handlers.items():
+        signal.signal(s, handler)
+
+
+def run_executor(server, jt_home, **kwargs):
+    executor = Executor(jt_home=jt_home, jt_account='user1',
+                        ams_server=server.url, wrs_server=server.url, jess_server=server.url,
+                        queue_id='q', polling_interval=0.05, continuous_run=False, retries=0,
+                        logger=logging.getLogger('jtracker.test'), **kwargs)
+    executor.run()
+    return executor
+
+
+def test_runs_all_jobs(jt_home):
+    with StandInServer() as server:
+        server.add_queue('q', tasks={'a': {'command': 'true', 'depends_on': []},
+                                     'b': {'command': 'true', 'depends_on': ['a']}})
+        server.add_jobs('q', 3)
+
+        executor = run_executor(server, jt_home, parallel_jobs=2, parallel_workers=2)
+
+        assert executor.ran_jobs == 3
+        assert [j['state'] for j in server.jobs.values()] == ['completed'] * 3
+        for job in server.jobs.values():
+            for task in job['tasks'].values():
+                assert task['state'] == 'completed'
+                assert json.loads(task['task_file'])['output'][-1]['_jt_']['executor_id'] == executor.id
+
+
+def test_failed_task_fails_job(jt_home):
+    with StandInServer() as server:
+        server.add_queue('q', tasks={'a': {'command': 'exit ${code}', 'depends_on': []}})
+        server.add_jobs('q', 2, inputs=lambda i: {'code': i})
+
+        run_executor(server, jt_home, parallel_jobs=2, parallel_workers=2)
+
+        assert sorted(j['state'] for j in server.jobs.values()) == ['completed', 'failed']
+
+
+class Process(object):
+    def __init__(self, alive=True):
+        self._alive = alive
+
+    def is_alive(self):
+        return self._alive
+
+
+class Scheduler(object):
+    def __init__(self, queue_id):
+        self.queue_id = queue_id
+
+
+def executor_serving(queue_weights, running, predicted, policy='fair'):
+    # executor with only what queue ordering looks at, running: job_id => (queue_id, processes)
+    executor = Executor.__new__(Executor)
+    executor._queue_policy = policy
+    executor._queue_weights = queue_weights
+    executor._schedulers = [Scheduler(q) for q in ('a', 'b', 'c')]
+    executor._job_queues = dict((job_id, q) for job_id, (q, _) in running.items())
+    executor._worker_processes = dict((job_id, processes) for job_id, (_, processes) in running.items())
+    executor._predicted_wall_time = predicted
+    return executor
+
+
+def test_queue_load_uses_predicted_wall_time():
+    p1, p2, p3, p4 = Process(), Process(), Process(), Process(alive=False)
+    executor = executor_serving({}, {'j1': ('a', [p1, p4]), 'j2': ('b', [p2]), 'j3': ('b', [p3])},
+                                {p1: 100, p2: 10, p4: 1000})
+    assert executor._queue_load() == {'a': 100, 'b': 10 + 100}  # p3 without prediction counts as the median
+
+
+def test_queue_order_by_weighted_load():
+    p1, p2 = Process(), Process()
+    running = {'j1': ('a', [p1]), 'j2': ('b', [p2])}
+    predicted = {p1: 100, p2: 60}
+
+    assert [s.queue_id for s in executor_serving({}, running, predicted)._queue_order()] == ['c', 'b', 'a']
+    assert [s.queue_id for s in executor_serving({'a': 4}, running, predicted)._queue_order()] == ['c', 'a', 'b']
+    assert [s.queue_id for s in executor_serving({}, running, predicted, policy='priority')._queue_order()] == \
+        ['a', 'b', 'c']
+
+
+class Worker(object):
+    def __init__(self, task_dir, job_id, task_name, command_pgid=None):
+        self.task_dir = task_dir
+        self.task = {'job.id': job_id, 'name': task_name}
+        self.scheduler = None
+        self.command_pgid = command_pgid
+
+
+def executor_with_workers(executor_dir, workers):
+    # executor with only what stopping workers looks at, workers: process => Worker
+    executor = Executor.__new__(Executor)
+    executor._logger = logging.getLogger('jtracker.test')
+    executor._shutdown_grace = 0.5
+    executor._workers = workers
+    executor._worker_processes = {'j1': list(workers)}
+    executor._executor_dir = lambda scheduler: executor_dir
+    return executor
+
+
+def is_running(pid):
+    try:
+        with open('/proc/%s/stat' % pid) as f:
+            return f.read().split(')')[-1].split()[0] != 'Z'
+    except OSError:
+        return False
+
+
+def start_worker(target, *args):
+    p = multiprocessing.get_context('fork').Process(target=target, args=args)
+    p.start()
+    os.setpgid(p.pid, p.pid)
+    return p
+
+
+def run_in_group(pid_file, ignore_term):
+    # worker starting a command in its process group, both ignoring SIGTERM when asked to
+    os.setpgid(0, 0)  # as workers do, before the executor sets it too
+    if ignore_term:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    trap = 'trap "" TERM; ' if ignore_term else ''
+    subprocess.Popen(['sh', '-c', '%secho $$ > %s.tmp; mv %s.tmp %s; exec sleep 60' %
+                      (trap, pid_file, pid_file, pid_file)]).wait()
+
+
+def read_pid(pid_file):
+    deadline = time() + 5
+    while not os.path.exists(pid_file) and time() < deadline:
+        sleep(0.01)
+    with open(pid_file) as f:
+        return int(f.read())
+
+
+def test_stop_workers_kills_process_groups(tmp_path):
+    pid_files = [str(tmp_path / 'term.pid'), str(tmp_path / 'ignore.pid')]
+    processes = [start_worker(run_in_group, pid_files[0], False), start_worker(run_in_group, pid_files[1], True)]
+    commands = [read_pid(f) for f in pid_files]
+    executor = executor_with_workers(str(tmp_path), dict((p, None) for p in processes))
+
+    start = time()
+    executor._stop_workers()
+
+    assert not [p for p in processes if p.is_alive()]
+    assert 0.5 <= time() - start < 5  # the worker ignoring SIGTERM is killed after the grace period
+    deadline = time() + 5
+    while [pid for pid in commands if is_running(pid)] and time() < deadline:
+        sleep(0.01)  # signals are delivered asynchronously
+
+
+def test_signal_group_reaches_command_in_its_own_group(tmp_path):
+    command = subprocess.Popen(['sleep', '60'], start_new_session=True)
+    p = start_worker(sleep, 60)
+    executor = executor_with_workers(str(tmp_path), {p: Worker(str(tmp_path), 'j1', 'a', command_pgid=command.pid)})
+
+    executor._signal_group(p, signal.SIGKILL)
+
+    assert command.wait(5) == -signal.SIGKILL
+    p.join(5)
+    assert not p.is_alive()
+
+
+def test_record_interrupted_skips_reported_tasks(tmp_path):
+    executor_dir = tmp_path / 'executor'
+    executor_dir.mkdir()
+    (executor_dir / INTERRUPTED_FILE).write_text(json.dumps([{'job_id': 'j0', 'task_name': 'x'}]))
+
+    workers = {}
+    for task_name, phase in (('a', 'running'), ('b', 'reported'), ('c', None)):
+        task_dir = tmp_path / ('task.%s' % task_name)
+        task_dir.mkdir()
+        if phase:
+            write_task_state(str(task_dir), phase)
+        workers[object()] = Worker(str(task_dir), 'j1', task_name)
+    executor = executor_with_workers(str(executor_dir), workers)
+
+    executor._record_interrupted(list(workers))
+
+    recorded = json.loads((executor_dir / INTERRUPTED_FILE).read_text())
+    assert [(t['job_id'], t['task_name']) for t in recorded] == [('j0', 'x'), ('j1', 'a'), ('j1', 'c')]
+
+
+def test_report_exited_tasks_reads_output_from_task_dir(tmp_path):
+    job_dir = tmp_path / 'job.j1'
+    for task_name, phase, state in (('a', 'exited', 'completed'), ('b', 'exited', 'failed'),
+                                    ('c', 'running', None), ('d', 'reported', 'completed')):
+        task_dir = job_dir / ('task.%s' % task_name)
+        task_dir.mkdir(parents=True)
+        (task_dir / 'output.json').write_text(json.dumps({'result': task_name}))
+        write_task_state(str(task_dir), phase, job_id='j1', task_name=task_name, state=state,
+                         jt={'state': state})
+    executor = executor_with_workers(str(tmp_path), {})
+    scheduler = mock.Mock()
+
+    assert executor._report_exited_tasks(scheduler, 'j1') == 2
+    scheduler.task_completed.assert_called_once_with(
+        job_id='j1', task_name='a', output={'result': 'a', '_jt_': {'state': 'completed'}})
+    scheduler.task_failed.assert_called_once_with(
+        job_id='j1', task_name='b', output={'result': 'b', '_jt_': {'state': 'failed'}})
+    assert read_task_state(str(job_dir / 'task.a'))['phase'] == 'reported'
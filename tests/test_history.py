@@ -0,0 +1,43 @@
+from time import sleep, time
+from jtracker.execution.history import TaskHistory, PeakDirSize, MIN_SAMPLES
+
+
+def test_predictions_need_enough_completed_runs(tmp_path):
+    history = TaskHistory(str(tmp_path / 'history.sqlite'), workflow_id='wf', workflow_version='1')
+    assert history.predict_task('a') == {'wall_time': None, 'disk_bytes': None}
+
+    for i in range(MIN_SAMPLES - 1):
+        history.record_task('a', 'j%s' % i, 'completed', 10 * (i + 1), 100)
+    history.record_task('a', 'jf', 'failed', 1000, 10 ** 9)
+    assert history.predict_task('a')['wall_time'] is None
+
+    for i in range(8):
+        history.record_task('a', 'k%s' % i, 'completed', 10 * (i + MIN_SAMPLES), 100 * i)
+    prediction = history.predict_task('a')
+    assert prediction['wall_time'] == 90  # high quantile of completed runs, the failed one is left out
+    assert prediction['disk_bytes'] == 600
+
+
+def test_history_is_per_workflow_version(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    v1 = TaskHistory(path, workflow_id='wf', workflow_version='1')
+    for i in range(MIN_SAMPLES):
+        v1.record_task('a', 'j%s' % i, 'completed', 10, 100)
+        v1.record_job('j%s' % i, 1000 * (i + 1))
+
+    v2 = TaskHistory(path, workflow_id='wf', workflow_version='2')
+    assert v2.predict_task('a')['wall_time'] is None
+    assert v2.predict_job_disk() is None
+    assert v1.predict_job_disk() == 3000
+    v1.close()
+    v2.close()
+
+
+def test_peak_dir_size(tmp_path):
+    with PeakDirSize(str(tmp_path), interval=0.01) as peak:
+        (tmp_path / 'f').write_bytes(b'x' * 10000)
+        deadline = time() + 5
+        while peak.peak < 10000 and time() < deadline:
+            sleep(0.01)
+        (tmp_path / 'f').unlink()
+    assert peak.peak >= 10000
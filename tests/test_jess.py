@@ -0,0 +1,91 @@
+import logging
+import threading
+from time import sleep, time
+import pytest
+from jtracker.execution import Executor
+from jtracker.execution.scheduler.jess import JessScheduler
+from benchmarks.stand_in import StandInServer
+
+
+def scheduler(server):
+    s = JessScheduler(jess_server=server.url, wrs_server=server.url, ams_server=server.url, jt_account='user1',
+                      queue_id='q')
+    s._executor_id = 'e1'
+    return s
+
+
+def wait_for(condition, timeout=5):
+    deadline = time() + timeout
+    while not condition() and time() < deadline:
+        sleep(0.01)
+    return condition()
+
+
+def test_subscribe_wakes_on_events():
+    with StandInServer() as server:
+        server.add_queue('q')
+        s = scheduler(server)
+        wake = threading.Event()
+        s.subscribe(wake)
+        thread = s._event_thread
+
+        assert wait_for(lambda: s.events_connected)
+        assert wake.wait(5)  # set on connect, anything may have happened before
+        wake.clear()
+
+        server.add_jobs('q', 1)
+        assert wake.wait(5)
+        assert s.events_supported
+
+        s.unsubscribe()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert not s.events_connected
+
+
+def test_server_without_event_stream():
+    with StandInServer(events=False) as server:
+        server.add_queue('q')
+        s = scheduler(server)
+        wake = threading.Event()
+        s.subscribe(wake)
+
+        s._event_thread.join(5)
+        assert s.events_supported is False
+        assert not s.events_connected
+        assert not wake.is_set()
+
+
+class Scheduler(object):
+    def __init__(self, queue_id, events_supported, events_connected):
+        self.queue_id = queue_id
+        self.events_supported = events_supported
+        self.events_connected = events_connected
+
+
+def executor_following(*schedulers):
+    executor = Executor.__new__(Executor)
+    executor._logger = logging.getLogger('jtracker.test')
+    executor._killer = type('Killer', (), {'kill_now': False})()
+    executor._polling_interval = 0.2
+    executor._server_events = True
+    executor._polling_queues = set()
+    executor._schedulers = list(schedulers)
+    executor._workers = {}
+    executor._wake = threading.Event()
+    return executor
+
+
+@pytest.mark.parametrize('schedulers, polls', [
+    ([Scheduler('a', True, True), Scheduler('b', True, True)], False),
+    ([Scheduler('a', True, True), Scheduler('b', True, False)], True),  # stream of b broken, reconnecting
+    ([Scheduler('a', True, True), Scheduler('b', False, False)], True),
+])
+def test_wait_falls_back_to_polling(schedulers, polls):
+    executor = executor_following(*schedulers)
+    threading.Timer(1, executor._wake.set).start()
+
+    start = time()
+    executor._wait()
+    assert (time() - start < 0.8) == polls
+    assert executor._polling_queues == set(s.queue_id for s in schedulers if s.events_supported is False)
@@ -0,0 +1,31 @@
+import io
+import json
+from unittest import mock
+from jtracker.cli.job.bulk import bulk_job_action
+from jtracker.cli.job.commands import select_job_ids
+
+
+class Response(object):
+    def __init__(self, status_code, body=''):
+        self.status_code = status_code
+        self.text = body if isinstance(body, str) else json.dumps(body)
+
+
+def test_selected_job_ids_are_deduplicated():
+    with mock.patch('jtracker.cli.job.commands.requests.get') as get:
+        get.return_value = Response(200, [{'id': 'b'}, {'id': 'd'}])
+        ids = list(select_job_ids('http://jess', 'o', 'q', ('a', 'b', 'a'), io.StringIO('c\n# comment\nb\n'),
+                                  'failed'))
+    assert ids == ['a', 'b', 'c', 'd']
+
+
+def test_bulk_job_action_reports_failed_jobs():
+    with mock.patch('jtracker.cli.job.bulk.make_session') as make_session:
+        session = make_session.return_value
+        session.put.side_effect = lambda url, json: Response(404 if '/job/b/' in url else 200, 'no job b')
+        assert bulk_job_action('http://jess', 'o', 'q', ['a', 'b', 'c'], 'resume', concurrency=2) == \
+            (2, [('b', 'no job b')])
+        assert session.put.call_args[1] == {'json': {'action': 'resume'}}
+
+        session.delete.return_value = Response(200)
+        assert bulk_job_action('http://jess', 'o', 'q', iter(['a']), 'delete') == (1, [])
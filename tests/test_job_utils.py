@@ -0,0 +1,66 @@
+import io
+import json
+import pytest
+from jtracker.cli.job.utils import last_task_run, parse_columns, job_report_rows, ReportWriter, JOB_COLUMNS
+
+
+def task_file(runs, **task):
+    task['output'] = runs
+    return json.dumps(task)
+
+
+def test_last_task_run():
+    runs = [{'_jt_': {'node_id': 'n1', 'wall_time': {'start': 1, 'end': 2}}},
+            {'x': 1, '_jt_': {'node_id': 'n2', 'wall_time': {'start': 5, 'end': 9}}}]
+    assert last_task_run(task_file(runs)) == (2, runs[1]['_jt_'])
+
+
+def test_last_task_run_ignores_jt_in_strings():
+    tf = task_file([{'log': 'contains "_jt_": here', '_jt_': {'node_id': 'n1'}}],
+                   input={'note': '"_jt_": {"node_id": "fake"}'})
+    assert last_task_run(tf) == (1, {'node_id': 'n1'})
+
+
+def test_last_task_run_ignores_jt_outside_runs():
+    runs = [{'tag': '_jt_', '_jt_': {'node_id': 'n1'}}, {'log': 'ends with "_jt_', '_jt_': {'node_id': 'n2'}}]
+    tf = task_file(runs, input={'note': '{"_jt_": {"node_id": "fake"}}'})
+    assert last_task_run(tf) == (2, {'node_id': 'n2'})
+    assert last_task_run(tf, count_runs=False) == (1, {'node_id': 'n2'})
+
+
+@pytest.mark.parametrize('tf', [None, '', 'not json', '[]', task_file([]), task_file([{'x': 1}]), '{"output": 5}'])
+def test_last_task_run_without_runs(tf):
+    run_num, jt = last_task_run(tf)
+    assert jt is None
+
+
+def test_parse_columns():
+    assert parse_columns(None) == JOB_COLUMNS
+    assert parse_columns('job_id, task_len', with_task=True) == ('job_id', 'task_len')
+    with pytest.raises(ValueError):
+        parse_columns('nope')
+    with pytest.raises(ValueError):
+        parse_columns('task_len')
+
+
+def test_report_rows_and_writer():
+    job = {'id': 'j1', 'name': 'job 1', 'state': 'completed',
+           'tasks': {'a': {'state': 'completed',
+                           'task_file': task_file([{'_jt_': {'node_id': 'n1', 'wall_time': {'start': 0, 'end': 60}}}])}}}
+    rows = list(job_report_rows(job, columns=('job_id', 'task_name', 'task_len', 'node_ip'), with_task=True))
+    assert rows == [('j1', 'a', 60, None)]
+
+    out = io.StringIO()
+    writer = ReportWriter(out, fmt='tsv', columns=('job_id', 'task_name', 'task_len', 'node_ip'), header=True)
+    writer.write(rows)
+    writer.close()
+    assert out.getvalue() == 'job_id\ttask_name\ttask_len\tnode_ip\nj1\ta\t60\t_null_\n'
+
+
+@pytest.mark.parametrize('jt', [{'node_id': 'n1'}, {'node_id': 'n1', 'wall_time': {'start': 10}}])
+def test_report_rows_without_end_time(jt):
+    job = {'id': 'j1', 'name': 'job 1', 'state': 'running',
+           'tasks': {'a': {'state': 'running', 'task_file': task_file([{'_jt_': jt}])}}}
+    rows = list(job_report_rows(job, columns=('task_name', 'task_run_num', 'task_end_at', 'task_len', 'node_id'),
+                                with_task=True))
+    assert rows == [('a', 1, None, None, 'n1')]
@@ -0,0 +1,54 @@
+import json
+from unittest import mock
+from jtracker.cli.job.watch import JobWatcher
+
+
+class Response(object):
+    def __init__(self, status_code, body='', headers=None):
+        self.status_code = status_code
+        self.text = body if isinstance(body, str) else json.dumps(body)
+        self.headers = headers or {}
+
+
+def jobs(*states):
+    return [{'id': 'j%s' % i, 'name': 'job %s' % i, 'state': s} for i, s in enumerate(states)]
+
+
+def watcher(*responses, **kwargs):
+    session = mock.Mock()
+    session.get.side_effect = list(responses)
+    return JobWatcher('http://jess', 'o', 'q', session=session, **kwargs), session
+
+
+def test_conditional_requests_with_etag():
+    w, session = watcher(Response(200, jobs('queued', 'running'), {'ETag': '"v1"'}),
+                         Response(304),
+                         Response(200, jobs('running'), {'ETag': '"v2"'}))
+
+    assert w.poll() == [('j0', 'job 0', None, 'queued'), ('j1', 'job 1', None, 'running')]
+    assert w.poll() == []
+    assert session.get.call_args[1]['headers'] == {'If-None-Match': '"v1"'}
+    assert w.poll() == [('j0', 'job 0', 'queued', 'running'), ('j1', 'job 1', 'running', None)]
+    assert w.counters() == {'running': 1}
+
+
+def test_changes_since_last_poll_without_etag():
+    w, session = watcher(Response(200, jobs('queued', 'queued'), {'Date': 'Mon, 19 Oct 2026 10:00:00 GMT'}),
+                         Response(200, [{'id': 'j1', 'name': 'job 1', 'state': 'running'}]),
+                         Response(200, jobs('queued')), full_every=2)
+
+    w.poll()
+    assert w.poll() == [('j1', 'job 1', 'queued', 'running')]
+    assert session.get.call_args[1]['params'] == {'since': 1792404000 - 1}
+    assert w.poll() == [('j1', 'job 1', 'running', None)]  # full listing, removed job is seen
+    assert session.get.call_args[1]['params'] == {}
+
+
+def test_server_without_since():
+    w, session = watcher(Response(200, jobs('queued')), Response(400, 'unknown parameter'),
+                         Response(200, jobs('completed')), Response(200, jobs('completed')))
+
+    w.poll()
+    assert w.poll() == [('j0', 'job 0', 'queued', 'completed')]
+    assert w.poll() == []
+    assert [c[1]['params'] for c in session.get.call_args_list] == [{}, {'since': mock.ANY}, {}, {}]
@@ -0,0 +1,53 @@
+import os
+from jtracker.execution.ledger import DiskLedger, dir_size
+
+
+def test_dir_size(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'f').write_bytes(b'x' * 100000)
+    assert dir_size(str(tmp_path)) >= 100000
+    assert dir_size(str(tmp_path / 'missing')) == 0
+
+
+def test_reserve_and_release(tmp_path):
+    ledger = DiskLedger(str(tmp_path))
+    free = lambda: 1000
+
+    key = ledger.reserve(600, free)
+    assert key
+    assert ledger.outstanding() == 600
+    assert ledger.reserve(600, free) is None  # 1000 free less 600 promised is not enough
+    assert ledger.reserve(300, free, min_free=500) is None
+
+    ledger.release(key)
+    assert ledger.outstanding() == 0
+    assert ledger.reserve(600, free)
+
+
+def test_used_part_of_reservation_is_not_outstanding(tmp_path):
+    job_dir = tmp_path / 'job'
+    job_dir.mkdir()
+    (job_dir / 'f').write_bytes(b'x' * 100000)
+
+    ledger = DiskLedger(str(tmp_path), used_bytes_ttl=0)
+    ledger.reserve(10 ** 6, lambda: 10 ** 9, job_dir=str(job_dir))
+    assert ledger.outstanding() == 10 ** 6 - dir_size(str(job_dir))
+
+
+def test_reservation_of_dead_process_is_dropped(tmp_path):
+    ledger = DiskLedger(str(tmp_path))
+    key = ledger.reserve(100, lambda: 1000)
+    ledger.update(key, pid=2 ** 22 + 1)  # above pid_max, never alive
+
+    assert ledger.outstanding() == 0
+    assert key not in ledger.entries()
+
+
+def test_reads_do_not_rewrite_ledger(tmp_path):
+    ledger = DiskLedger(str(tmp_path))
+    ledger.reserve(100, lambda: 1000)
+    mtime = os.stat(ledger.path).st_mtime_ns
+
+    ledger.outstanding()
+    ledger.entries()
+    assert os.stat(ledger.path).st_mtime_ns == mtime
@@ -0,0 +1,72 @@
+import os
+from jtracker.execution.locality import BloomFilter, CacheManifest, MAX_BLOOM_BYTES, MANIFEST_FILE, \
+    COMPACT_MIN_LINES, rank_jobs, wf_data_urls
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    for i in range(1000):
+        bloom.add('http://data/%s' % i)
+
+    assert all('http://data/%s' % i in bloom for i in range(1000))
+    false_positives = sum('http://other/%s' % i in bloom for i in range(10000))
+    assert false_positives < 300  # about 1% expected
+
+
+def test_bloom_filter_size_is_capped():
+    bloom = BloomFilter(10 ** 6, max_bytes=MAX_BLOOM_BYTES)
+    assert len(bloom.bits) == MAX_BLOOM_BYTES
+    for i in range(5000):
+        bloom.add('http://data/%s' % i)
+    assert all('http://data/%s' % i in bloom for i in range(5000))
+
+
+def test_bloom_filter_encode():
+    bloom = BloomFilter(10)
+    bloom.add('a')
+    prefix, k, m, bits = bloom.encode().split(':')
+    assert prefix == 'bloom' and int(k) == bloom.k and int(m) == bloom.m and bits
+
+
+def provision(data_dir, manifest, name, url):
+    path = os.path.join(data_dir, name)
+    open(path, 'w').close()
+    open(path + '.__ready__', 'w').close()
+    manifest.add(url, path)
+
+
+def test_manifest_drops_missing_files(tmp_path):
+    manifest = CacheManifest(str(tmp_path))
+    provision(str(tmp_path), manifest, 'a', 'http://data/a')
+    provision(str(tmp_path), manifest, 'b', 'http://data/b')
+    assert manifest.urls() == {'http://data/a', 'http://data/b'}
+
+    os.remove(str(tmp_path / 'b.__ready__'))
+    manifest.add('http://data/c', str(tmp_path / 'never-ready'))
+    manifest = CacheManifest(str(tmp_path))  # loaded again, mtime may not have moved on
+    assert manifest.urls() == {'http://data/a'}
+    assert manifest.hits(['http://data/a', 'http://data/b']) == 1
+
+
+def test_manifest_is_compacted(tmp_path):
+    manifest = CacheManifest(str(tmp_path))
+    provision(str(tmp_path), manifest, 'a', 'http://data/a')
+    for i in range(COMPACT_MIN_LINES):
+        manifest.add('http://data/gone/%s' % i, str(tmp_path / 'gone'))
+
+    assert manifest.urls() == {'http://data/a'}
+    with open(str(tmp_path / MANIFEST_FILE)) as f:
+        assert f.read() == 'http://data/a\t%s\n' % (tmp_path / 'a')
+
+
+def test_rank_jobs(tmp_path):
+    manifest = CacheManifest(str(tmp_path))
+    provision(str(tmp_path), manifest, 'ref', 'http://data/ref')
+
+    def job(job_id, url):
+        return {'id': job_id, 'tasks': {'a': {'task_file': {'input': {'ref': '[${_wf_data}/ref]%s' % url}}}}}
+
+    assert wf_data_urls({'input': {'ref': '[${_wf_data}/ref]http://data/ref', 'x': '[/tmp/x]http://data/x'}}) == \
+        ['http://data/ref']
+    assert rank_jobs([job('j1', 'http://data/other'), job('j2', 'http://data/ref')], manifest) == 'j2'
+    assert rank_jobs([job('j1', 'http://data/other')], manifest) is None
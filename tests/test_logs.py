@@ -0,0 +1,33 @@
+import logging
+from jtracker.execution import logs
+from jtracker.execution.logs import RateLimitFilter
+
+
+def record(msg, level=logging.INFO):
+    return logging.LogRecord('x', level, __file__, 1, msg, None, None)
+
+
+def test_repeated_messages_are_suppressed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logs, 'time', lambda: now[0])
+    f = RateLimitFilter(interval=60)
+
+    assert f.filter(record('Running job: 1'))
+    assert not f.filter(record('Running job: 1'))
+    assert not f.filter(record('Running job: 1'))
+    assert f.filter(record('Running job: 2'))
+
+    now[0] += 61
+    r = record('Running job: 1')
+    assert f.filter(r)
+    assert r.getMessage() == 'Running job: 1 (repeated 2 times)'
+
+
+def test_warnings_and_disabled_filter_pass():
+    f = RateLimitFilter(interval=60)
+    assert f.filter(record('disk full', logging.WARNING))
+    assert f.filter(record('disk full', logging.WARNING))
+
+    f = RateLimitFilter(interval=0)
+    assert f.filter(record('status'))
+    assert f.filter(record('status'))
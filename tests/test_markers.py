@@ -0,0 +1,49 @@
+import os
+import json
+import pytest
+from jtracker.execution.markers import write_task_state, read_task_state, file_stamps, changed_files, \
+    TASK_STATE_FILE
+
+
+def test_write_and_read(tmp_path):
+    task_dir = str(tmp_path)
+    write_task_state(task_dir, 'staged', inputs={'a': 1}, source='x')
+    write_task_state(task_dir, 'running', keep=('inputs',), run=1)
+
+    state = read_task_state(task_dir)
+    assert state['phase'] == 'running'
+    assert state['inputs'] == {'a': 1} and state['run'] == 1
+    assert 'source' not in state
+
+
+def test_checksum_mismatch(tmp_path):
+    task_dir = str(tmp_path)
+    write_task_state(task_dir, 'exited', state='completed')
+    path = os.path.join(task_dir, TASK_STATE_FILE)
+    with open(path) as f:
+        state = json.load(f)
+    state['state'] = 'failed'
+    with open(path, 'w') as f:
+        json.dump(state, f)
+
+    assert read_task_state(task_dir) is None
+    assert read_task_state(str(tmp_path / 'missing')) is None
+
+
+def test_changed_files(tmp_path):
+    a, b = tmp_path / 'a', tmp_path / 'b'
+    a.write_text('1')
+    b.write_text('1')
+    stamps = file_stamps([str(a), str(b), str(tmp_path / 'missing')])
+    assert sorted(stamps) == [str(a), str(b)]
+    assert changed_files(stamps) == []
+
+    b.write_text('22')
+    os.remove(str(a))
+    assert sorted(changed_files(stamps)) == [str(a), str(b)]
+
+
+@pytest.mark.parametrize('content', ['[1, 2]', '"exited"', '5', 'null'])
+def test_marker_not_an_object(tmp_path, content):
+    (tmp_path / TASK_STATE_FILE).write_text(content)
+    assert read_task_state(str(tmp_path)) is None
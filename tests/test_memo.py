@@ -0,0 +1,76 @@
+import os
+import json
+from jtracker.execution.memo import MemoCache
+
+
+def make_task_dir(path, content=b'result'):
+    os.makedirs(path)
+    with open(os.path.join(path, 'out.txt'), 'wb') as f:
+        f.write(content)
+    with open(os.path.join(path, 'output.json'), 'w') as f:
+        json.dump({'out': 'out.txt', 'abs': os.path.join(os.path.realpath(path), 'out.txt'), 'n': 1}, f)
+    return path
+
+
+def test_key_depends_on_command_and_input_content(tmp_path):
+    memo = MemoCache(str(tmp_path / 'memo'))
+    data = tmp_path / 'in.txt'
+    data.write_text('a')
+
+    key = memo.key('wf', '1.0', 'task', 'cmd ${in}', {'in': str(data)})
+    assert key == memo.key('wf', '1.0', 'task', 'cmd ${in}', {'in': str(data)})
+    assert key != memo.key('wf', '1.0', 'task', 'other ${in}', {'in': str(data)})
+    assert key != memo.key('wf', '1.1', 'task', 'cmd ${in}', {'in': str(data)})
+
+    data.write_text('bb')
+    assert key != memo.key('wf', '1.0', 'task', 'cmd ${in}', {'in': str(data)})
+
+
+def test_store_and_restore(tmp_path):
+    memo = MemoCache(str(tmp_path / 'memo'))
+    task_dir = make_task_dir(str(tmp_path / 'run1'))
+
+    assert memo.store('k1', task_dir, task_name='task', job_id='j1')
+    assert not memo.store('k1', task_dir)  # kept as is
+    assert memo.get('k1')['files'] == ['out.txt']
+    assert memo.get('missing') is None
+
+    restored = str(tmp_path / 'run2')
+    os.makedirs(restored)
+    assert memo.restore('k1', restored)
+    with open(os.path.join(restored, 'out.txt'), 'rb') as f:
+        assert f.read() == b'result'
+    with open(os.path.join(restored, 'output.json')) as f:
+        output = json.load(f)
+    assert output['abs'] == os.path.join(os.path.realpath(restored), 'out.txt')  # points to the new task dir
+    assert output['out'] == 'out.txt' and output['n'] == 1
+
+    assert not memo.restore('missing', restored)
+
+
+def test_writes_to_restored_files_do_not_change_entry(tmp_path):
+    memo = MemoCache(str(tmp_path / 'memo'))
+    task_dir = make_task_dir(str(tmp_path / 'run1'))
+    memo.store('k1', task_dir)
+    with open(os.path.join(task_dir, 'out.txt'), 'ab') as f:
+        f.write(b' changed in run1')
+
+    for run in ('run2', 'run3'):
+        restored = str(tmp_path / run)
+        os.makedirs(restored)
+        memo.restore('k1', restored)
+        with open(os.path.join(restored, 'out.txt'), 'rb') as f:
+            assert f.read() == b'result'
+        with open(os.path.join(restored, 'out.txt'), 'ab') as f:
+            f.write(b' changed in place')
+
+
+def test_invalidate(tmp_path):
+    memo = MemoCache(str(tmp_path / 'memo'))
+    memo.store('k1', make_task_dir(str(tmp_path / 'run1')), task_name='a', job_id='j1')
+    memo.store('k2', make_task_dir(str(tmp_path / 'run2')), task_name='b', job_id='j2')
+
+    assert memo.invalidate(task_name='a') == 1
+    assert [m['key'] for m in memo.entries()] == ['k2']
+    assert memo.invalidate() == 1
+    assert memo.entries() == []
@@ -0,0 +1,59 @@
+import os
+import multiprocessing
+from jtracker.execution.metrics import MetricsRegistry
+
+
+def registry():
+    m = MetricsRegistry()
+    m.counter('tasks_total', 'Number of tasks')
+    m.gauge('running', 'Running "things"')
+    m.histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+    return m
+
+
+def test_render():
+    m = registry()
+    m.inc('tasks_total', queue='q1')
+    m.inc('tasks_total', 2, queue='q1')
+    m.inc('tasks_total', queue='a"b\\c')
+    m.set('running', 1.5)
+    for v in (0.05, 0.5, 5):
+        m.observe('latency_seconds', v, method='get')
+
+    assert m.render() == '\n'.join([
+        '# HELP jt_latency_seconds Latency',
+        '# TYPE jt_latency_seconds histogram',
+        'jt_latency_seconds_bucket{method="get",le="0.1"} 1',
+        'jt_latency_seconds_bucket{method="get",le="1"} 2',
+        'jt_latency_seconds_bucket{method="get",le="+Inf"} 3',
+        'jt_latency_seconds_sum{method="get"} 5.55',
+        'jt_latency_seconds_count{method="get"} 3',
+        '# HELP jt_running Running "things"',
+        '# TYPE jt_running gauge',
+        'jt_running 1.5',
+        '# HELP jt_tasks_total Number of tasks',
+        '# TYPE jt_tasks_total counter',
+        'jt_tasks_total{queue="a\\"b\\\\c"} 1',
+        'jt_tasks_total{queue="q1"} 3',
+    ]) + '\n'
+
+
+def test_updates_from_other_processes_are_collected():
+    m = registry()
+    p = multiprocessing.get_context('fork').Process(target=lambda: m.inc('tasks_total', 5))
+    p.start()
+    p.join()
+
+    assert 'jt_tasks_total 5' not in m.render()
+    m.collect(timeout=5)
+    assert 'jt_tasks_total 5\n' in m.render()
+
+
+def test_write_textfile(tmp_path):
+    m = registry()
+    m.set('running', 2)
+    path = str(tmp_path / 'jt.prom')
+    m.write_textfile(path)
+    with open(path) as f:
+        assert 'jt_running 2\n' in f.read()
+    assert os.listdir(str(tmp_path)) == ['jt.prom']
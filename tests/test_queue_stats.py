@@ -0,0 +1,60 @@
+import json
+import random
+from jtracker.cli.queue.stats import QuantileSketch, QueueStats
+
+
+def test_quantiles_within_relative_accuracy():
+    rand = random.Random(1)
+    values = [rand.lognormvariate(3, 1.5) for _ in range(20000)]
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.02 * exact
+    assert sketch.count == len(values)
+    assert sketch.min == values[0] and sketch.max == values[-1]
+
+
+def test_zeros_and_empty():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.mean is None
+
+    for v in (0, 0, 0, 10):
+        sketch.add(v)
+    assert sketch.quantile(0.5) == 0
+    assert sketch.quantile(1) == 10
+    assert sketch.mean == 2.5
+
+
+def test_bucket_count_is_bounded():
+    sketch = QuantileSketch(max_buckets=50)
+    for i in range(1, 100000, 7):
+        sketch.add(i)
+    assert len(sketch._buckets) <= 50
+    assert abs(sketch.quantile(0.99) - 99000) <= 0.02 * 99000
+
+
+def task(state, *runs):
+    return {'state': state, 'task_file': json.dumps({'output': [{'_jt_': jt} for jt in runs]})}
+
+
+def test_queue_stats_skips_tasks_without_end_time():
+    stats = QueueStats()
+    stats.add({'state': 'completed', 'submitted_at': 900, 'tasks': {
+        'a': task('completed', {'node_id': 'n1', 'state': 'failed', 'wall_time': {'start': 950, 'end': 990}},
+                  {'node_id': 'n1', 'state': 'completed', 'wall_time': {'start': 1000, 'end': 1060}})}})
+    stats.add({'state': 'running', 'submitted_at': 1000, 'tasks': {
+        'a': task('running', {'node_id': 'n2', 'state': 'running', 'wall_time': {'start': 1100}}),
+        'b': task('queued')}})
+
+    summary = stats.summary()
+    assert summary['job_states'] == {'completed': 1, 'running': 1}
+    assert summary['tasks']['a']['count'] == 1
+    assert summary['tasks']['a']['reruns'] == 1
+    assert summary['tasks']['a']['mean'] == 60
+    assert list(summary['nodes']) == ['n1']
+    assert summary['queue_wait']['count'] == 1
@@ -0,0 +1,52 @@
+import os
+import tarfile
+from jtracker.execution.reclaimer import Reclaimer, mark_job_finished, ARCHIVE_DIR, RECLAIMING_PREFIX
+
+
+def job_dir(executor_dir, job_id, state=None):
+    path = os.path.join(executor_dir, 'job.%s' % job_id)
+    os.makedirs(os.path.join(path, 'data'))
+    open(os.path.join(path, 'data', 'input.bam'), 'w').close()
+    open(os.path.join(path, 'stdout.txt'), 'w').close()
+    if state:
+        mark_job_finished(path, job_id, state)
+    return path
+
+
+def test_only_finished_jobs_past_retention_are_reclaimed(tmp_path):
+    d = str(tmp_path)
+    job_dir(d, 'running')
+    job_dir(d, 'completed', 'completed')
+    job_dir(d, 'failed', 'failed')
+
+    assert Reclaimer([d], action='delete').run_once() == 0  # completed kept a day, failed a week by default
+    assert Reclaimer([d], action='delete', keep_completed_days=0).run_once() == 1
+    assert sorted(os.listdir(d)) == ['job.failed', 'job.running']
+
+
+def test_compress_leaves_out_job_data(tmp_path):
+    d = str(tmp_path)
+    job_dir(d, 'j1', 'failed')
+
+    assert Reclaimer([d], action='compress', keep_failed_days=0).run_once() == 1
+    with tarfile.open(os.path.join(d, ARCHIVE_DIR, 'job.j1.tar.gz')) as tar:
+        assert sorted(tar.getnames()) == ['job.j1', 'job.j1/_finished.json', 'job.j1/stdout.txt']
+    assert sorted(os.listdir(d)) == [ARCHIVE_DIR]
+
+
+def test_resumed_job_is_not_reclaimed(tmp_path):
+    d = str(tmp_path)
+    path = job_dir(d, 'j1', 'failed')
+    reclaimer = Reclaimer([d], action='delete', keep_failed_days=0)
+    due = reclaimer.finished_jobs()
+    os.remove(os.path.join(path, '_finished.json'))  # executor resumes the job
+
+    assert [reclaimer.reclaim(p, finished) for p, finished in due] == [False]
+    assert os.listdir(d) == ['job.j1']
+
+
+def test_leftovers_are_removed(tmp_path):
+    d = str(tmp_path)
+    os.makedirs(os.path.join(d, RECLAIMING_PREFIX + 'job.j1'))
+    Reclaimer([d], action='delete').run_once()
+    assert os.listdir(d) == []
@@ -0,0 +1,112 @@
+import time
+import pytest
+from jtracker.retry import CircuitBreaker, RetryPolicy, retry_policy_from_config
+from jtracker.exceptions import JessNotAvailable
+
+
+def retry_if_not_available(e):
+    return isinstance(e, JessNotAvailable)
+
+
+def failing(times, calls, result='ok'):
+    def fn():
+        calls.append(time.time())
+        if len(calls) <= times:
+            raise JessNotAvailable('down')
+        return result
+    return fn
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, reset_after=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() > 0
+
+
+def test_breaker_half_open_trial():
+    breaker = CircuitBreaker(failures=1, reset_after=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+
+    assert breaker.allow()  # trial call
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # only one trial at a time
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.1)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_retries_until_success():
+    policy = RetryPolicy(base_delay=0.01, max_delay=0.02, give_up_after=5, seed=1)
+    calls = []
+    assert policy.call('ep', failing(2, calls), retry_if_not_available) == 'ok'
+    assert len(calls) == 3
+
+
+def test_gives_up_with_last_error():
+    policy = RetryPolicy(base_delay=0.01, max_delay=0.02, give_up_after=0.2, breaker_failures=100, seed=1)
+    calls = []
+    with pytest.raises(JessNotAvailable):
+        policy.call('ep', failing(1000, calls), retry_if_not_available)
+    assert len(calls) > 1
+
+
+def test_non_retryable_error_leaves_breaker_unchanged():
+    policy = RetryPolicy(base_delay=0.01, breaker_failures=2, seed=1)
+    breaker = policy.breaker('ep')
+    breaker.record_failure()
+
+    calls = []
+
+    def wrong():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        policy.call('ep', wrong, retry_if_not_available)
+    assert len(calls) == 1
+
+    breaker.record_failure()  # counts on from the failure before
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_fallback_while_circuit_open():
+    policy = RetryPolicy(base_delay=0.01, breaker_failures=1, breaker_reset=60, give_up_after=5, seed=1)
+    calls = []
+    assert policy.call('ep', failing(1000, calls), retry_if_not_available, fallback=lambda: ['cached']) == ['cached']
+    assert len(calls) == 1
+
+
+def test_breakers_are_per_endpoint():
+    policy = RetryPolicy()
+    assert policy.breaker(('jess', 'q1', 'next_task')) is not policy.breaker(('jess', 'q2', 'next_task'))
+    assert policy.breaker(('jess', 'q1', 'next_task')) is policy.breaker(('jess', 'q1', 'next_task'))
+
+
+def test_retry_budget_is_reserved_before_waiting():
+    policy = RetryPolicy(base_delay=0.01, max_delay=0.01, budget=2, budget_window=10, seed=1)
+    give_up_at = time.time() + 60
+
+    assert policy._reserve_retry(0, give_up_at) == 0
+    assert policy._reserve_retry(0, give_up_at) == 0
+    wait = policy._reserve_retry(0, give_up_at)
+    assert 9 < wait <= 10.1  # third retry waits for the first to leave the window
+    assert policy._reserve_retry(0, time.time() + 1) is None  # no slot before giving up
+
+
+def test_retry_policy_from_config():
+    policy = retry_policy_from_config({'retry': {'give_up_after': 42}})
+    assert policy.give_up_after == 42
+    assert retry_policy_from_config({}).give_up_after == 300
@@ -0,0 +1,45 @@
+import pytest
+from jtracker.execution.tracing import Tracer, iter_spans, summarize, TASK_SPAN
+
+
+def spans():
+    return [
+        {'span': TASK_SPAN, 'job_id': 'j1', 'task_name': 'a', 'duration': 10},
+        {'span': 'stage', 'task_name': 'a', 'duration': 2},
+        {'span': 'run', 'task_name': 'a', 'duration': 7},
+        {'span': TASK_SPAN, 'job_id': 'j1', 'task_name': 'b', 'duration': 30},
+        {'span': 'stage', 'task_name': 'b', 'duration': 6},
+        {'span': TASK_SPAN, 'job_id': 'j2', 'task_name': 'a', 'duration': 10},
+        {'span': 'stage', 'task_name': 'a', 'duration': 4},
+    ]
+
+
+def test_summarize():
+    summary = summarize(spans())
+    assert (summary['tasks'], summary['jobs'], summary['wall_time']) == (3, 2, 50)
+    assert summary['phases']['stage'] == {'count': 3, 'total': 12, 'max': 6, 'mean': 4, 'share': 12 / 50}
+    assert summary['phases']['run']['share'] == 7 / 50
+
+
+def test_summarize_by_task():
+    phases = summarize(spans(), by_task=True)['phases']
+    assert phases[('a', 'stage')]['share'] == 6 / 20
+    assert phases[('b', 'stage')]['share'] == 6 / 30
+    assert phases[('a', 'run')]['mean'] == 7
+
+
+def test_tracer_records_spans(tmp_path):
+    path = str(tmp_path / 'trace.jsonl')
+    tracer = Tracer(path, job_id='j1', task_name='a')
+    with tracer.span('stage', files=2) as attrs:
+        attrs['bytes'] = 10
+    with pytest.raises(KeyError):
+        with tracer.span('run'):
+            raise KeyError('x')
+    with open(path, 'a') as f:
+        f.write('{"span": "partial')
+
+    recorded = list(iter_spans([path, str(tmp_path / 'missing.jsonl')]))
+    assert [(s['span'], s['job_id'], s.get('files'), s.get('bytes'), s.get('error')) for s in recorded] == \
+        [('stage', 'j1', 2, 10, None), ('run', 'j1', None, None, 'KeyError')]
+    assert summarize(recorded)['phases']['stage']['count'] == 1
@@ -0,0 +1,77 @@
+import io
+import json
+import pytest
+from unittest import mock
+from jtracker import utils
+from jtracker.utils import iter_json_array, iter_lines, iter_sse, parse_duration
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 1024])
+def test_iter_json_array(size):
+    items = [{'id': i, 'name': 'job é %s' % i, 'tasks': {'a': [1, 2]}} for i in range(20)] + [12345, 'x', None]
+    data = json.dumps(items).encode()
+    assert list(iter_json_array(chunked(data, size))) == items
+
+
+def test_iter_json_array_number_split_across_chunks():
+    assert list(iter_json_array([b'[12', b'34, 5', b'6]'])) == [1234, 56]
+
+
+def test_iter_json_array_empty():
+    assert list(iter_json_array([b' [ ', b'] '])) == []
+
+
+@pytest.mark.parametrize('chunks', [[b'[1, 2'], [b'[{"a": 1}, {"a":'], [b'[']])
+def test_iter_json_array_truncated(chunks):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunks))
+
+
+def test_iter_json_array_large_element_is_not_decoded_with_every_chunk():
+    items = [{'log': 'x\\"y' * 50000, 'n': list(range(1000))}, 'é' * 10000, [[1], {'a': '[{'}]]
+    data = json.dumps(items).encode()
+    with mock.patch.object(utils, '_decoder', wraps=utils._decoder) as decoder:
+        assert list(iter_json_array(chunked(data, 1000))) == items
+    assert len(data) // 1000 > 300
+    assert decoder.raw_decode.call_count < 30
+
+
+@pytest.mark.parametrize('chunks', [[b'[1 2]'], [b'[{"a": 1}', b' {"a": 2}]'], [b'[1,]'], [b'[,1]'], [b'[tru', b'x]'],
+                                    [b'["a" "b"]']])
+def test_iter_json_array_invalid(chunks):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunks))
+
+
+@pytest.mark.parametrize('chunks', [[b'{"a": 1}'], []])
+def test_iter_json_array_not_an_array(chunks):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunks))
+
+
+def test_iter_sse():
+    lines = [': keepalive', '', 'event: tasks_available', 'data: {"n": 1}', '',
+             'data: line 1', 'data:line 2', '', 'event: job_state_changed', '']
+    assert list(iter_sse(lines)) == [('tasks_available', '{"n": 1}'), ('message', 'line 1\nline 2'),
+                                     ('job_state_changed', '')]
+
+
+def test_iter_lines():
+    stream = io.BytesIO('event: a\r\ndata: é\n\n: k\nlast'.encode())
+    assert list(iter_lines(lambda n: stream.read(3), size=3)) == ['event: a', 'data: é', '', ': k', 'last']
+
+
+@pytest.mark.parametrize('value, seconds', [('90', 90), (90, 90), ('30m', 1800), ('1.5h', 5400), ('2d', 172800),
+                                            (' 10 s ', 10), (None, None), ('', None)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+@pytest.mark.parametrize('value', ['abc', '10w', '-5', -5])
+def test_parse_duration_invalid(value):
+    with pytest.raises(ValueError):
+        parse_duration(value)
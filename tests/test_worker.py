@@ -0,0 +1,60 @@
+import os
+import signal
+import logging
+import subprocess
+from time import time
+from unittest import mock
+import pytest
+from jtracker.execution.worker import Worker
+
+
+@pytest.fixture
+def worker(tmp_path):
+    w = Worker.__new__(Worker)
+    w._task = {'name': 'a', 'job.id': 'j1'}
+    w._logger = logging.getLogger('jtracker.test')
+    w._metrics = mock.Mock()
+    with mock.patch.object(Worker, 'task_dir', new_callable=mock.PropertyMock, return_value=str(tmp_path)):
+        yield w
+
+
+def start_command(worker, command):
+    # as the worker runs task commands
+    with open(os.path.join(worker.task_dir, 'stdout.txt'), 'ab') as o, \
+            open(os.path.join(worker.task_dir, 'stderr.txt'), 'ab') as e:
+        return subprocess.Popen([command], stdout=o, stderr=e, shell=True, start_new_session=True)
+
+
+def test_command_finishing_in_time(worker):
+    p = start_command(worker, 'exit 3')
+    assert worker._watch_command(p, timeout=5, idle_timeout=5) is None
+    assert p.returncode == 3
+
+
+def test_wall_clock_timeout(worker):
+    p = start_command(worker, 'sleep 30 & wait')
+    start = time()
+    assert worker._watch_command(p, timeout=0.3) == {'type': 'wall_clock', 'seconds': 0.3}
+    assert time() - start < 5
+    assert p.returncode == -signal.SIGTERM
+    with pytest.raises(ProcessLookupError):
+        os.killpg(p.pid, 0)  # what the command started is stopped too
+    worker.metrics.inc.assert_called_once_with('tasks_timed_out_total', type='wall_clock')
+
+
+def test_idle_command_is_stopped(worker):
+    p = start_command(worker, 'echo started; sleep 30')
+    assert worker._watch_command(p, idle_timeout=0.3) == {'type': 'idle', 'seconds': 0.3}
+    assert p.returncode is not None
+
+
+def test_command_writing_output_is_not_idle(worker):
+    p = start_command(worker, 'for i in 1 2 3 4 5 6 7 8 9 10; do echo $i; sleep 0.1; done')
+    assert worker._watch_command(p, idle_timeout=0.5) is None
+    assert p.returncode == 0
+
+
+def test_busy_command_is_not_idle(worker):
+    p = start_command(worker, 'end=$(($(date +%s) + 2)); while [ $(date +%s) -lt $end ]; do :; done')
+    assert worker._watch_command(p, idle_timeout=0.5) is None
+    assert p.returncode == 0